@@ -0,0 +1,56 @@
+"""Cubo pré-agregado competência x direção x UF x alíquota usado pelos relatórios fiscais.
+
+O cubo soma em centavos (esquema compacto de ingestao); por_uf e por_aliquota devolvem reais.
+"""
+import pandas as pd
+
+DIRECOES = {
+    "Entrada": 'UF do Emitente',
+    "Saída": 'UF do Destinatário',
+}
+
+
+def aliquota_percentual(df):
+    # Pontos-base -> percentual inteiro (1900 -> 19), em aritmética inteira
+    return (df['Alíquota ICMS'].astype('int32') + 50) // 100
+
+def montar_cubo(entradas, saidas):
+    partes = []
+    for direcao, df in (("Entrada", entradas), ("Saída", saidas)):
+        chaves = [
+            df['Mês'].dt.to_period('M').rename('Competência'),
+            df[DIRECOES[direcao]].rename('UF'),
+            aliquota_percentual(df).rename('Aliquota'),
+        ]
+        # dropna=False mantém notas sem UF nos totais por alíquota; notas sem competência ficam de fora
+        parte = df.groupby(chaves, dropna=False, observed=True).agg(
+            **{'Valor Total': ('Valor Total', 'sum'), 'Valor ICMS': ('Valor ICMS', 'sum'), 'Notas': ('Valor Total', 'size')}
+        ).reset_index()
+        parte.insert(1, 'Direção', direcao)
+        partes.append(parte[parte['Competência'].notna()])
+    return pd.concat(partes, ignore_index=True)
+
+def filtrar_cubo(cubo, inicio, fim):
+    # inicio/fim: Periods mensais, inclusive
+    return cubo[cubo['Competência'].between(inicio, fim)]
+
+def por_uf(cubo, direcao):
+    coluna_uf = DIRECOES[direcao]
+    celulas = cubo[cubo['Direção'] == direcao]
+    totais = celulas.groupby('UF', observed=True)['Valor Total'].sum() / 100
+    return totais.rename_axis(coluna_uf).reset_index()
+
+def por_aliquota(cubo):
+    entradas = cubo[cubo['Direção'] == "Entrada"]
+    saidas = cubo[cubo['Direção'] == "Saída"]
+    total_compras = entradas.groupby('Aliquota').agg(
+        **{'Valor Total': ('Valor Total', 'sum'), 'Crédito ICMS Estimado': ('Valor ICMS', 'sum')}
+    ).reset_index()
+    total_debitos = saidas.groupby('Aliquota')['Valor ICMS'].sum().reset_index(name='Débito ICMS')
+    resultado = pd.merge(total_compras, total_debitos, on='Aliquota', how='outer').fillna(0)
+    colunas = ['Valor Total', 'Crédito ICMS Estimado', 'Débito ICMS']
+    resultado[colunas] = resultado[colunas] / 100
+    return resultado
+
+def ufs_presentes(cubo):
+    return sorted(cubo['UF'].dropna().unique().tolist())
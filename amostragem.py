@@ -0,0 +1,38 @@
+"""Redução de séries longas antes de irem para o gráfico de linha (LTTB)."""
+import numpy as np
+
+LIMITE_PONTOS = 1500
+
+
+def indices_lttb(x, y, limite):
+    """Largest-Triangle-Three-Buckets: em cada faixa, o ponto que forma o maior triângulo com os vizinhos."""
+    n = len(y)
+    if limite < 3:
+        return np.array([0, n - 1])
+    bordas = np.linspace(1, n - 1, limite - 1).astype(np.int64)
+    escolhidos = np.empty(limite, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for k in range(limite - 2):
+        a, b = bordas[k], max(bordas[k + 1], bordas[k] + 1)
+        # Vértice seguinte: média da próxima faixa (ou o último ponto)
+        c, d = b, (bordas[k + 2] if k + 2 < len(bordas) else n)
+        mx, my = (x[c:d].mean(), y[c:d].mean()) if d > c else (x[-1], y[-1])
+        area = np.abs((x[anterior] - mx) * (y[a:b] - y[anterior]) - (x[anterior] - x[a:b]) * (my - y[anterior]))
+        anterior = a + int(np.argmax(area))
+        escolhidos[k + 1] = anterior
+    return np.unique(escolhidos)
+
+
+def reduzir_serie(df, x, y, limite=LIMITE_PONTOS):
+    """No máximo `limite` linhas de df escolhidas por LTTB, que mantém a forma da linha (picos e vales);
+    séries menores voltam inteiras.
+
+    x pode ser datas, números ou None (posição da linha). O corte é sobre a série já restrita ao
+    período escolhido, então períodos curtos mostram todos os pontos e os longos ficam limitados.
+    """
+    if len(df) <= limite:
+        return df
+    valores = df[y].to_numpy(dtype=float)
+    eixo = np.arange(len(df), dtype=float) if x is None else df[x].to_numpy().astype('int64').astype(float)
+    return df.iloc[indices_lttb(eixo, valores, limite)]
@@ -0,0 +1,121 @@
+"""Apuração do ICMS com crédito acumulado, vetorizada por empresa e competência."""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+COLUNAS_APURACAO = ['ICMS Crédito', 'ICMS Débito', 'Crédito Acumulado', 'ICMS Apurado Corrigido']
+
+
+def _chaves(df, chave):
+    competencia = df['Mês'].dt.to_period('M')
+    return [df[chave], competencia] if chave else [competencia]
+
+def totais_mensais(entradas, saidas, chave=None):
+    # Crédito (entradas) e débito (saídas) de ICMS por empresa x competência. As notas vêm em
+    # centavos (int64): a soma é exata e só o total do mês é convertido para reais.
+    creditos = entradas.groupby(_chaves(entradas, chave), observed=True)['Valor ICMS'].sum().rename('ICMS Crédito') / 100
+    debitos = saidas.groupby(_chaves(saidas, chave), observed=True)['Valor ICMS'].sum().rename('ICMS Débito') / 100
+    totais = pd.concat([creditos, debitos], axis=1).fillna(0).sort_index()
+    return totais.reset_index()
+
+def acumular_credito(totais, chave=None, credito_inicial=0.0):
+    """Preenche 'Crédito Acumulado' e 'ICMS Apurado Corrigido' em totais ordenados por competência.
+
+    O crédito que entra em cada mês segue a recorrência
+    acumulado[t+1] = max(0, acumulado[t] + crédito[t] - débito[t]), cuja forma fechada é
+    acumulado[t] = P[t] - min(-acumulado[0], min(P[0..t])), com P a soma exclusiva de crédito - débito.
+    credito_inicial pode ser escalar ou uma Series alinhada às linhas (um valor por empresa).
+    """
+    totais = totais.copy()
+    saldo = totais['ICMS Crédito'] - totais['ICMS Débito']
+    if chave:
+        anterior = saldo.groupby(totais[chave], sort=False).cumsum() - saldo
+        minimo = anterior.groupby(totais[chave], sort=False).cummin()
+    else:
+        anterior = saldo.cumsum() - saldo
+        minimo = anterior.cummin()
+    totais['Crédito Acumulado'] = anterior - np.minimum(minimo, -credito_inicial)
+    totais['ICMS Apurado Corrigido'] = totais['ICMS Débito'] - (totais['ICMS Crédito'] + totais['Crédito Acumulado'])
+    return totais
+
+def apurar_icms(entradas, saidas, chave=None):
+    """Apuração mensal para uma ou várias empresas (coluna `chave` presente nas entradas e saídas)."""
+    return acumular_credito(totais_mensais(entradas, saidas, chave), chave)
+
+
+# =========================
+# CHECKPOINTS E REAPURAÇÃO INCREMENTAL
+# =========================
+# Cada linha da apuração já é um checkpoint: crédito acumulado de abertura + totais do mês.
+# Uma correção em um mês só invalida esse mês e os seguintes da mesma empresa.
+def salvar_checkpoints(apuracao, caminho, metadados=None):
+    """Grava a apuração; `metadados` (JSON) vai no próprio arquivo, para dizer de quais notas ela saiu."""
+    df = apuracao.copy()
+    df['Mês'] = df['Mês'].astype(str)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tabela = tabela.replace_schema_metadata({**tabela.schema.metadata, b"checkpoints": json.dumps(metadados).encode()})
+    temporario = Path(caminho).with_name(f"{Path(caminho).name}.{os.getpid()}.tmp")
+    pq.write_table(tabela, temporario)
+    os.replace(temporario, caminho)
+
+def carregar_checkpoints(caminho):
+    """(apuração, metadados) gravados por salvar_checkpoints."""
+    tabela = pq.read_table(caminho)
+    metadados = json.loads(tabela.schema.metadata.get(b"checkpoints", b"null"))
+    df = tabela.to_pandas()
+    df['Mês'] = pd.PeriodIndex(df['Mês'], freq='M')
+    return df, metadados
+
+def reapurar(checkpoints, entradas, saidas, alterados, chave=None):
+    """Recalcula a apuração a partir do primeiro mês alterado de cada empresa.
+
+    `alterados` tem as colunas [chave,] 'Mês' (Period) dos meses cujas notas mudaram; `entradas` e
+    `saidas` precisam conter ao menos todas as notas desses meses. Meses anteriores são reaproveitados.
+    """
+    colunas = ([chave] if chave else []) + ['Mês']
+    alterados = alterados[colunas].drop_duplicates()
+    if alterados.empty:
+        return checkpoints
+
+    def _somente_alterados(df):
+        pares = pd.MultiIndex.from_frame(pd.concat(_chaves(df, chave), axis=1, keys=colunas))
+        return df[pares.isin(pd.MultiIndex.from_frame(alterados))]
+    novos = totais_mensais(_somente_alterados(entradas), _somente_alterados(saidas), chave)
+
+    if chave:
+        inicio = checkpoints[chave].map(alterados.groupby(chave)['Mês'].min())
+    else:
+        inicio = pd.Series(alterados['Mês'].min(), index=checkpoints.index)
+    na_cauda = inicio.notna() & (checkpoints['Mês'] >= inicio)
+    mantidos = checkpoints[~na_cauda]
+    abertura = _abertura(checkpoints, na_cauda, mantidos, alterados, chave)
+
+    # Cauda = meses posteriores não alterados (totais reaproveitados) + meses alterados recalculados
+    cauda = checkpoints.loc[na_cauda, colunas + ['ICMS Crédito', 'ICMS Débito']]
+    cauda_idx = pd.MultiIndex.from_frame(cauda[colunas])
+    cauda = cauda[~cauda_idx.isin(pd.MultiIndex.from_frame(alterados))]
+    cauda = pd.concat([cauda, novos], ignore_index=True).sort_values(colunas, ignore_index=True)
+    if chave:
+        credito_inicial = cauda[chave].map(abertura).fillna(0)
+    else:
+        credito_inicial = abertura
+    recalculada = acumular_credito(cauda, chave, credito_inicial)
+    return pd.concat([mantidos, recalculada], ignore_index=True).sort_values(colunas, ignore_index=True)
+
+def _abertura(checkpoints, na_cauda, mantidos, alterados, chave):
+    # Crédito de abertura do primeiro mês alterado: o checkpoint do primeiro mês já existente a partir
+    # dele guarda esse valor; se a alteração é depois do último mês, vem do saldo credor do último mês.
+    credor = (-mantidos['ICMS Apurado Corrigido']).clip(lower=0)
+    if not chave:
+        cauda = checkpoints.loc[na_cauda, 'Crédito Acumulado']
+        if not cauda.empty:
+            return cauda.iloc[0]
+        return credor.iloc[-1] if not credor.empty else 0.0
+    da_cauda = checkpoints[na_cauda].groupby(chave)['Crédito Acumulado'].first()
+    do_ultimo_mantido = credor.groupby(mantidos[chave]).last()
+    return da_cauda.combine_first(do_ultimo_mantido).reindex(alterados[chave].unique()).fillna(0)
@@ -0,0 +1,170 @@
+"""Benchmark das etapas do dashboard sobre dados sintéticos de 10k / 100k / 1M linhas.
+
+    python benchmark.py --linhas 10000 100000 --atualizar-baseline   # grava a referência
+    python benchmark.py --linhas 10000 100000                        # compara com a referência
+
+Cada etapa é medida (melhor de N repetições) e seus resultados viram somas de verificação.
+Sai com código 1 se alguma etapa ficar mais lenta que `--fator` x a referência, se os resultados divergirem
+ou se faltar referência para algum tamanho; sem o arquivo de referência, sai com código 2.
+
+A referência versionada (benchmarks/baseline.json) traz, por tamanho, os tempos de cada etapa, a tolerância
+(`fator`) e as somas de verificação dos dados gerados com a seed padrão. Os tempos foram medidos na máquina de
+referência; em outra máquina, regrave com --atualizar-baseline ou ajuste a tolerância com --fator.
+O cache de planilhas do benchmark fica numa pasta temporária, separada do .cache_dados do usuário.
+"""
+import argparse
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+import ingestao
+from agregacoes import montar_cubo, por_aliquota, por_uf
+from apuracao import apurar_icms
+from caixa import IndiceCaixa, pontos_saldo_mensal, resumo_mensal
+from exportacao import gerar_parquet_zip, gerar_xlsx
+from gerador_dados import gravar_planilhas, rotulo_linhas
+
+COMPETENCIAS = list(pd.period_range("2025-01", periods=3, freq="M"))
+# Diferenças abaixo disso são ruído de medição, não regressão
+RUIDO_SEGUNDOS = 0.05
+# Lentidão tolerada quando nem a referência nem --fator dizem outra
+FATOR_PADRAO = 1.5
+BASELINE = Path(__file__).resolve().parent / "benchmarks" / "baseline.json"
+
+
+def medir(funcao, repeticoes):
+    melhor, resultado = math.inf, None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+@contextmanager
+def _cache_temporario():
+    temporario = Path(tempfile.mkdtemp(prefix="bench_cache_"))
+    original = ingestao.PASTA_CACHE
+    ingestao.PASTA_CACHE = temporario
+    try:
+        yield temporario
+    finally:
+        ingestao.PASTA_CACHE = original
+        shutil.rmtree(temporario, ignore_errors=True)
+
+def _ingestao(pasta):
+    return ingestao.ler_notas(pasta / "notas_processadas1.xlsx") + ingestao.ler_contabilidade(pasta / "Contabilidade.xlsx")
+
+def _ingestao_fria(pasta):
+    # Cache vazio a cada execução: mede o parse das planilhas + gravação do Parquet
+    with _cache_temporario():
+        return _ingestao(pasta)
+
+def medir_tamanho(pasta, repeticoes=3, repeticoes_lentas=1):
+    tempos, verificacao = {}, {}
+    tempos["ingestão (sem cache)"], _ = medir(lambda: _ingestao_fria(pasta), repeticoes_lentas)
+    with _cache_temporario():
+        _ingestao(pasta)
+        tempos["ingestão (cache)"], (entradas, saidas, caixa_df, _, _) = medir(lambda: _ingestao(pasta), repeticoes)
+    verificacao["linhas"] = len(entradas) + len(saidas)
+
+    tempos["apuração"], apuracao = medir(lambda: apurar_icms(entradas, saidas), repeticoes)
+    for col in ['ICMS Crédito', 'ICMS Débito', 'Crédito Acumulado', 'ICMS Apurado Corrigido']:
+        verificacao[f"apuração: {col}"] = float(apuracao[col].sum())
+
+    def agregacoes():
+        cubo = montar_cubo(entradas, saidas)
+        return por_uf(cubo, "Entrada"), por_uf(cubo, "Saída"), por_aliquota(cubo)
+    tempos["UF / alíquota"], (uf_compras, uf_vendas, aliquotas) = medir(agregacoes, repeticoes)
+    verificacao["UF: compras"] = float(uf_compras['Valor Total'].sum())
+    verificacao["UF: vendas"] = float(uf_vendas['Valor Total'].sum())
+    verificacao["alíquota: débito"] = float(aliquotas['Débito ICMS'].sum())
+
+    def saldo_caixa():
+        indice = IndiceCaixa(caixa_df)
+        return resumo_mensal(indice, COMPETENCIAS), pontos_saldo_mensal(indice, COMPETENCIAS)
+    tempos["saldo de caixa"], (resumo, _) = medir(saldo_caixa, repeticoes)
+    verificacao["caixa: saldo final"] = float(resumo['Saldo Final'].iloc[-1])
+
+    abas = {"Entradas": ingestao.notas_para_exibicao(entradas), "Saídas": ingestao.notas_para_exibicao(saidas),
+            "Apuracao": apuracao}
+    tempos["exportação xlsx"], _ = medir(lambda: gerar_xlsx(abas), repeticoes_lentas)
+    tempos["exportação parquet"], _ = medir(lambda: gerar_parquet_zip(abas), repeticoes_lentas)
+    return tempos, verificacao
+
+def comparar(atual, referencia, fator=None):
+    # `fator` (do --fator) vale para todos os tamanhos; sem ele, vale o gravado em cada referência
+    problemas = []
+    for rotulo, medicao in atual.items():
+        base = referencia.get(rotulo)
+        if base is None:
+            problemas.append(f"{rotulo}: sem referência (rode com --atualizar-baseline)")
+            continue
+        tolerancia = fator or base.get("fator", FATOR_PADRAO)
+        for etapa, tempo in medicao["tempos"].items():
+            anterior = base.get("tempos", {}).get(etapa)
+            if anterior is None:
+                problemas.append(f"{rotulo} / {etapa}: sem tempo de referência (rode com --atualizar-baseline)")
+            elif tempo > anterior * tolerancia and tempo - anterior > RUIDO_SEGUNDOS:
+                problemas.append(f"{rotulo} / {etapa}: {tempo:.3f}s (referência {anterior:.3f}s, tolerância {tolerancia}x)")
+        # Somas de outra seed não são comparáveis
+        if base.get("seed", medicao["seed"]) != medicao["seed"]:
+            continue
+        for nome, valor in medicao["verificacao"].items():
+            esperado = base["verificacao"].get(nome)
+            if esperado is not None and not math.isclose(valor, esperado, rel_tol=1e-9, abs_tol=1e-6):
+                problemas.append(f"{rotulo} / {nome}: resultado {valor!r} difere da referência {esperado!r}")
+    return problemas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do dashboard.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dados", default=".bench_dados", help="pasta dos dados sintéticos (gerados se faltarem)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--fator", type=float, help="lentidão tolerada em relação à referência "
+                        f"(padrão: o gravado na referência, ou {FATOR_PADRAO})")
+    parser.add_argument("--atualizar-baseline", "--gravar-baseline", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    atual = {}
+    for linhas in args.linhas:
+        rotulo = rotulo_linhas(linhas)
+        pasta = Path(args.dados) / rotulo
+        if not (pasta / "notas_processadas1.xlsx").exists():
+            print(f"Gerando {rotulo} em {pasta}...", flush=True)
+            gravar_planilhas(pasta, linhas, COMPETENCIAS, args.seed)
+        tempos, verificacao = medir_tamanho(pasta, args.repeticoes)
+        atual[rotulo] = {"seed": args.seed, "fator": args.fator or FATOR_PADRAO, "tempos": tempos,
+                         "verificacao": verificacao}
+        print(f"\n{rotulo} ({verificacao['linhas']} notas)")
+        for etapa, tempo in tempos.items():
+            print(f"  {etapa:<22} {tempo * 1000:10.1f} ms")
+
+    caminho = Path(args.baseline)
+    if args.atualizar_baseline:
+        referencia = json.loads(caminho.read_text(encoding="utf-8")) if caminho.exists() else {}
+        referencia.update(atual)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        caminho.write_text(json.dumps(referencia, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nReferência gravada em {caminho}")
+        return 0
+    if not caminho.exists():
+        print(f"\nSem referência em {caminho}; rode com --atualizar-baseline para criá-la.")
+        return 2
+    problemas = comparar(atual, json.loads(caminho.read_text(encoding="utf-8")), args.fator)
+    for problema in problemas:
+        print(f"REGRESSÃO: {problema}")
+    if not problemas:
+        print("\nSem regressões em relação à referência.")
+    return 1 if problemas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Índice de somas prefixadas do livro caixa para consultas de saldo por data."""
+import numpy as np
+import pandas as pd
+
+
+class IndiceCaixa:
+    # Lançamentos ordenados por data com somas acumuladas de entradas e saídas.
+    # Saldo em uma data e movimento entre duas datas saem de busca binária (O(log n)).
+    def __init__(self, caixa_df):
+        df = caixa_df.dropna(subset=['Data']).sort_values('Data', kind='stable')
+        self.datas = df['Data'].to_numpy(dtype='datetime64[ns]')
+        self.entradas = np.concatenate([[0.0], np.cumsum(df['Entradas'].to_numpy(dtype=float))])
+        self.saidas = np.concatenate([[0.0], np.cumsum(df['Saídas'].to_numpy(dtype=float))])
+
+    def __len__(self):
+        return len(self.datas)
+
+    def _posicao(self, data, inclusive=False):
+        # Quantidade de lançamentos antes de `data` (ou até ela, se inclusive)
+        return int(np.searchsorted(self.datas, np.datetime64(pd.Timestamp(data), 'ns'), side='right' if inclusive else 'left'))
+
+    def saldo_antes(self, data):
+        i = self._posicao(data)
+        return self.entradas[i] - self.saidas[i]
+
+    def saldo_ate(self, data):
+        i = self._posicao(data, inclusive=True)
+        return self.entradas[i] - self.saidas[i]
+
+    def saldo_no_dia(self, dia):
+        return self.saldo_antes(pd.Timestamp(dia).normalize() + pd.Timedelta(days=1))
+
+    def movimento(self, inicio, fim):
+        # Entradas e saídas com inicio <= Data < fim
+        i, j = self._posicao(inicio), self._posicao(fim)
+        return self.entradas[j] - self.entradas[i], self.saidas[j] - self.saidas[i]
+
+    def competencias(self):
+        """Competências com algum lançamento."""
+        meses = np.unique(self.datas.astype('datetime64[M]').astype(np.int64))
+        return list(pd.PeriodIndex.from_ordinals(meses, freq='M'))
+
+    def quantidade(self, inicio, fim):
+        return self._posicao(fim) - self._posicao(inicio)
+
+    def ultima_data_antes(self, data):
+        i = self._posicao(data)
+        return pd.Timestamp(self.datas[i - 1]) if i > 0 else None
+
+    def ultima_data_ate(self, data):
+        i = self._posicao(data, inclusive=True)
+        return pd.Timestamp(self.datas[i - 1]) if i > 0 else None
+
+    def saldo_diario(self, inicio, fim):
+        # Saldo no fim de cada dia com lançamentos em [inicio, fim)
+        i, j = self._posicao(inicio), self._posicao(fim)
+        dias = self.datas[i:j].astype('datetime64[D]')
+        if len(dias) == 0:
+            return pd.DataFrame({'Data': pd.Series(dtype='datetime64[ns]'), 'Saldo Acumulado': pd.Series(dtype=float)})
+        ultimo_do_dia = np.flatnonzero(np.append(dias[1:] != dias[:-1], True)) + i + 1
+        return pd.DataFrame({
+            'Data': pd.to_datetime(dias[ultimo_do_dia - i - 1]),
+            'Saldo Acumulado': self.entradas[ultimo_do_dia] - self.saidas[ultimo_do_dia],
+        })
+
+
+def pontos_saldo_mensal(indice, competencias):
+    # Um ponto por mês (fim do mês) ou, com um único mês, início / dia 15 / fim
+    pontos = []
+    for competencia in competencias:
+        inicio = competencia.start_time
+        fim = (competencia + 1).start_time
+        if indice.quantidade(inicio, fim) == 0:
+            continue
+        saldo_fim = indice.saldo_antes(fim)
+        data_fim = indice.ultima_data_antes(fim)
+        if len(competencias) == 1:
+            data_ant = indice.ultima_data_antes(inicio) or (inicio - pd.Timedelta(days=1))
+            pontos.append({'Data': data_ant, 'Saldo Acumulado': indice.saldo_antes(inicio), 'Mês': competencia.month})
+            data_15 = inicio + pd.Timedelta(days=14)
+            if indice.quantidade(inicio, data_15 + pd.Timedelta(1, 'ns')) > 0:
+                pontos.append({'Data': data_15, 'Saldo Acumulado': indice.saldo_ate(data_15), 'Mês': competencia.month})
+        pontos.append({'Data': data_fim, 'Saldo Acumulado': saldo_fim, 'Mês': competencia.month})
+    return pd.DataFrame(pontos)
+
+def competencias_do_caixa(indice):
+    if len(indice) == 0:
+        return []
+    inicio = pd.Timestamp(indice.datas[0]).to_period('M')
+    fim = pd.Timestamp(indice.datas[-1]).to_period('M')
+    return list(pd.period_range(inicio, fim, freq='M'))
+
+def resumo_mensal(indice, competencias=None):
+    # Entradas, saídas e saldo no fim de cada competência
+    linhas = []
+    for competencia in competencias if competencias is not None else competencias_do_caixa(indice):
+        inicio, fim = competencia.start_time, (competencia + 1).start_time
+        entradas, saidas = indice.movimento(inicio, fim)
+        linhas.append({'Competência': competencia, 'Entradas': entradas, 'Saídas': saidas, 'Saldo Final': indice.saldo_antes(fim)})
+    return pd.DataFrame(linhas, columns=['Competência', 'Entradas', 'Saídas', 'Saldo Final'])
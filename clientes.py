@@ -0,0 +1,164 @@
+"""Pool de clientes: dados de cada cliente carregados sob demanda, os mais recentes em memória dentro de um orçamento de RAM."""
+import itertools
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from incremental import NotasIncrementais
+from ingestao import impressao_digital, ler_contabilidade, pasta_notas, sincronizar_notas
+from nfe import COLUNAS_NOTAS
+
+ARQUIVO_NOTAS = "notas_processadas1.xlsx"
+ARQUIVO_CONTABILIDADE = "Contabilidade.xlsx"
+PASTA_XML = "nfe"
+LIMITE_PADRAO_MB = 2048
+
+
+def listar_clientes(pasta):
+    """Subpastas com planilha de notas ou armazenamento de XMLs, uma por cliente."""
+    pasta = Path(pasta)
+    if not pasta.is_dir():
+        return []
+    return sorted(item.name for item in pasta.iterdir()
+                  if item.is_dir() and ((item / ARQUIVO_NOTAS).is_file() or (item / PASTA_XML).is_dir()))
+
+def arquivos_cliente(pasta):
+    """(planilha de notas, contabilidade, pasta de XMLs ou None) de uma subpasta de cliente."""
+    pasta = Path(pasta)
+    pasta_xml = pasta / PASTA_XML
+    return pasta / ARQUIVO_NOTAS, pasta / ARQUIVO_CONTABILIDADE, pasta_xml if pasta_xml.is_dir() else None
+
+def _bytes(objeto, vistos):
+    # Tabelas e arrays, também dentro de objetos, listas e dicionários; cada objeto conta uma vez
+    if objeto is None or id(objeto) in vistos:
+        return 0
+    vistos.add(id(objeto))
+    if isinstance(objeto, pd.DataFrame):
+        return int(objeto.memory_usage(index=True, deep=True).sum())
+    if isinstance(objeto, pd.Series):
+        return int(objeto.memory_usage(index=True, deep=True))
+    if isinstance(objeto, pd.Index):
+        return int(objeto.memory_usage(deep=True))
+    if isinstance(objeto, np.ndarray):
+        return objeto.nbytes
+    if isinstance(objeto, dict):
+        return sum(_bytes(item, vistos) for item in objeto.values())
+    if isinstance(objeto, (list, tuple)):
+        return sum(_bytes(item, vistos) for item in objeto)
+    if hasattr(objeto, '__dict__') and not isinstance(objeto, type):
+        return _bytes(vars(objeto), vistos)
+    return 0
+
+
+class DadosCliente:
+    # Tudo o que o dashboard lê de um cliente: notas (atualizadas por acréscimo), contabilidade e os
+    # objetos calculados deles (índices, cubo, validação), que saem da memória junto com o cliente.
+    # `carga` distingue cargas sucessivas do mesmo cliente depois de um descarte, para que caches
+    # por versão não confundam uma carga nova com uma antiga.
+    def __init__(self, nome, caminho_notas, caminho_contabilidade, pasta_nfe=None, carga=0):
+        self.nome = nome
+        self.carga = carga
+        self.caminho_notas = caminho_notas
+        self.caminho_contabilidade = caminho_contabilidade
+        self.pasta_nfe = pasta_nfe
+        if pasta_nfe:
+            self.notas = NotasIncrementais(pasta_nfe, colunas=COLUNAS_NOTAS)
+        else:
+            self.notas = NotasIncrementais(pasta_notas(caminho_notas), lambda: sincronizar_notas(caminho_notas))
+        self._contabilidade = (None, (None, None, None))
+        self._derivados = {}
+        self._travas_derivados = {}
+        self._geracao = 0
+        self._trava = threading.Lock()
+
+    def versao_notas(self, versao):
+        return f"{self.nome}#{self.carga}:v{versao}"
+
+    def contabilidade(self):
+        """(versão, (caixa, piscofins, dre)); relê a planilha só quando o conteúdo muda."""
+        with self._trava:
+            if not Path(self.caminho_contabilidade).is_file():
+                return "", (None, None, None)
+            versao = impressao_digital(self.caminho_contabilidade)[:16]
+            if self._contabilidade[0] != versao:
+                self._contabilidade = (versao, ler_contabilidade(self.caminho_contabilidade))
+            return self._contabilidade
+
+    def derivado(self, nome, versao, construir):
+        """Objeto calculado dos dados do cliente; refeito só quando `versao` muda."""
+        with self._trava:
+            trava = self._travas_derivados.setdefault(nome, threading.Lock())
+        # Uma trava por objeto: sessões que pedem o mesmo esperam uma única construção
+        with trava:
+            atual = self._derivados.get(nome)
+            if atual is None or atual[0] != versao:
+                atual = (versao, construir())
+                with self._trava:
+                    self._derivados[nome] = atual
+                    self._geracao += 1
+            return atual[1]
+
+    def versoes(self):
+        return self.notas.versao, self._contabilidade[0], self._geracao
+
+    def tamanho(self):
+        _, entradas, saidas, apuracao = self.notas.instantaneo()
+        with self._trava:
+            derivados = [valor for _, valor in self._derivados.values()]
+        return _bytes([entradas, saidas, apuracao, *self._contabilidade[1], derivados], set())
+
+
+class PoolClientes:
+    # Um por processo, compartilhado pelas sessões. O tamanho de cada cliente (dados e derivados) é
+    # medido com memory_usage(deep=True) depois de carregado e sempre que algo nele muda; ao passar do
+    # limite, saem os menos usados recentemente (nunca o que acabou de ser pedido).
+    def __init__(self, abrir, limite_bytes=LIMITE_PADRAO_MB * 2**20):
+        self.abrir = abrir
+        self.limite_bytes = limite_bytes
+        self.acertos = self.faltas = self.descartes = 0
+        self._itens = OrderedDict()
+        self._tamanhos = {}
+        self._cargas = itertools.count(1)
+        self._trava = threading.Lock()
+
+    def obter(self, nome):
+        with self._trava:
+            if nome in self._itens:
+                self._itens.move_to_end(nome)
+                self.acertos += 1
+            else:
+                self.faltas += 1
+                self._itens[nome] = self.abrir(nome, next(self._cargas))
+            self._descartar(nome)
+            return self._itens[nome]
+
+    def medir(self, nome):
+        """Atualiza o tamanho do cliente (depois de carregar ou atualizar dados) e descarta os excedentes."""
+        with self._trava:
+            dados = self._itens.get(nome)
+            if dados is None:
+                return
+            chave = dados.versoes()
+            if self._tamanhos.get(nome, (None,))[0] != chave:
+                self._tamanhos[nome] = (chave, dados.tamanho())
+            self._descartar(nome)
+
+    def _descartar(self, manter):
+        while self._total() > self.limite_bytes and len(self._itens) > 1:
+            antigo = next(iter(self._itens))
+            if antigo == manter:
+                break
+            del self._itens[antigo]
+            self._tamanhos.pop(antigo, None)
+            self.descartes += 1
+
+    def _total(self):
+        return sum(tamanho for _, tamanho in self._tamanhos.values())
+
+    def estatisticas(self):
+        with self._trava:
+            return {'clientes': list(self._itens), 'bytes': self._total(), 'limite': self.limite_bytes,
+                    'acertos': self.acertos, 'faltas': self.faltas, 'descartes': self.descartes}
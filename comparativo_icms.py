@@ -2,9 +2,28 @@ import pandas as pd
 import streamlit as st
 import plotly.express as px
 import plotly.colors as pc
-from io import BytesIO
 import base64
-import unicodedata
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from amostragem import reduzir_serie
+from agregacoes import DIRECOES, filtrar_cubo, montar_cubo, por_aliquota, por_uf, ufs_presentes
+from caixa import IndiceCaixa, pontos_saldo_mensal
+from clientes import LIMITE_PADRAO_MB, DadosCliente, PoolClientes, arquivos_cliente, listar_clientes
+import consulta
+from competencias import IndiceCompetencias, opcoes_periodo, rotulo_mes
+from dre import LINHAS_DRE, IndiceDRE, formatar_moeda
+from exportacao import FORMATOS, exportar
+from figuras import LIMITE_PADRAO, CacheFiguras
+from grafo import Grafo
+from navegador import filtrar_notas, opcoes_filtro, ordenar_posicoes, pagina
+from incremental import Observador, Vigia
+from ingestao import PASTA_CACHE, notas_para_exibicao
+from nfe import ingerir_xml, pasta_padrao
+from perfil import Perfil, resumo_percentis
+from piscofins import REGIMES_PIS_COFINS, apurar_piscofins
+from validacao import validar_armazem, validar_planilha
 
 # =========================
 # 1. FONT AWESOME & CSS GLOBAL
@@ -15,6 +34,8 @@ st.set_page_config(
     page_icon="📊",
     initial_sidebar_state="expanded"
 )
+pd.set_option("mode.copy_on_write", True)
+perfil = Perfil(medir_memoria=st.session_state.get("perfil_memoria", False))
 
 st.markdown("""
 <!-- Font Awesome -->
@@ -74,11 +95,12 @@ button[kind="primary"], .stButton>button {
 # =========================
 # 2. FUNÇÃO DE PLANO DE FUNDO
 # =========================
-def set_background(path):
+# O CSS com a logo em base64 é montado uma vez por arquivo (e data de modificação) no processo
+@st.cache_resource
+def css_plano_de_fundo(path, modificado):
     with open(path, "rb") as f:
         encoded = base64.b64encode(f.read()).decode()
-    st.markdown(
-        f"""
+    return f"""
         <style>
         .stApp {{
             background-image: url("data:image/png;base64,{encoded}");
@@ -89,10 +111,12 @@ def set_background(path):
             background-color: #1E2B3D;
         }}
         </style>
-        """,
-        unsafe_allow_html=True
-    )
-set_background("logo.png")
+        """
+
+def set_background(path):
+    st.markdown(css_plano_de_fundo(path, os.path.getmtime(path)), unsafe_allow_html=True)
+with perfil.etapa("plano de fundo (logo.png)"):
+    set_background("logo.png")
 
 # =========================
 # 3. SIDEBAR: LOGO E IDENTIDADE
@@ -130,163 +154,353 @@ def bloco_visual(titulo, icone, descricao):
 # =========================
 # 6. LEITURA DE DADOS
 # =========================
-caminho_planilha = "notas_processadas1.xlsx"
-entradas = pd.read_excel(caminho_planilha, sheet_name="Todas Entradas", skiprows=1)
-entradas = entradas.loc[:, ~entradas.columns.to_series().isna()]
-entradas.columns = [str(col).strip() for col in entradas.columns]
-entradas = entradas.loc[:, ~entradas.columns.str.contains("Unnamed|^\\d+$", na=False)]
-saidas = pd.read_excel(caminho_planilha, sheet_name="Todas Saídas")
-entradas.columns = entradas.columns.str.strip()
-saidas.columns = saidas.columns.str.strip()
-entradas['Mês'] = pd.to_datetime(entradas['Mês'], errors='coerce')
-saidas['Mês'] = pd.to_datetime(saidas['Mês'], errors='coerce')
-for df in [entradas, saidas]:
-    for col in ['Valor ICMS', 'Valor Total', 'Alíquota ICMS']:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-with pd.ExcelFile("Contabilidade.xlsx") as xls:
-    if "Caixa" in xls.sheet_names:
-        caixa_df = pd.read_excel(xls, sheet_name="Caixa")
-    else:
+CAMINHO_NOTAS = "notas_processadas1.xlsx"
+CAMINHO_CONTABILIDADE = "Contabilidade.xlsx"
+# Com ANALISE_NFE apontando para um armazenamento gerado por nfe.py, as notas vêm dos XMLs e não da planilha.
+# ANALISE_ENTRADA é uma pasta observada: XMLs e .zip que chegarem nela entram nesse armazenamento.
+# ANALISE_CNPJ é o CNPJ da empresa: notas emitidas por ela são saídas, as demais entradas (sem ele,
+# vale o tpNF, que é a visão do emitente e põe as compras de fornecedores nas saídas).
+PASTA_NFE = os.environ.get("ANALISE_NFE")
+PASTA_ENTRADA = os.environ.get("ANALISE_ENTRADA")
+CNPJ_EMPRESA = os.environ.get("ANALISE_CNPJ")
+if PASTA_ENTRADA and not PASTA_NFE:
+    PASTA_NFE = str(pasta_padrao())
+INTERVALO_ATUALIZACAO = 1.0
+# Com ANALISE_CLIENTES apontando para uma pasta com uma subpasta por cliente (as duas planilhas e/ou
+# uma pasta nfe/ de XMLs), um único servidor atende a carteira toda; as variáveis acima valem só sem ela.
+PASTA_CLIENTES = os.environ.get("ANALISE_CLIENTES")
+CLIENTE_PADRAO = "Cliente"
+LIMITE_RAM_CLIENTES = int(os.environ.get("ANALISE_LIMITE_RAM_MB", LIMITE_PADRAO_MB)) * 2**20
+
+# Os conjuntos de dados e seus derivados têm uma única cópia no processo, compartilhada por todas as
+# sessões sem serialização. Nenhum código por sessão pode alterá-los; com copy-on-write, filtros e
+# seleções viram cópias independentes ao serem modificados.
+# As notas de cada cliente ficam num único objeto por processo, atualizado por acréscimo: linhas novas
+# da planilha (ou XMLs novos) viram partes do armazenamento particionado e só elas são lidas e reapuradas.
+# Os clientes usados mais recentemente ficam num pool com orçamento de RAM; os demais saem da memória,
+# com seus índices, cubo e validação, e voltam do cache colunar em disco quando pedidos de novo.
+def abrir_cliente(nome, carga):
+    if PASTA_CLIENTES:
+        return DadosCliente(nome, *arquivos_cliente(Path(PASTA_CLIENTES) / nome), carga)
+    return DadosCliente(nome, CAMINHO_NOTAS, CAMINHO_CONTABILIDADE, PASTA_NFE, carga)
+
+@st.cache_resource
+def pool_clientes():
+    return PoolClientes(abrir_cliente, LIMITE_RAM_CLIENTES)
+
+@st.cache_resource
+def observar_entrada(pasta, cnpj_empresa):
+    # workers=1: o parse roda na thread do observador, sem criar processos dentro do servidor
+    observador = Observador(pasta, lambda arquivos: ingerir_xml(arquivos, PASTA_NFE, cnpj_empresa, workers=1, progresso=None))
+    observador.start()
+    return observador
+
+# Uma thread do processo atualiza as notas de quem ligou a atualização automática; cada sessão só
+# espera por ela (sem sincronizar nada) e chama st.rerun quando a versão muda.
+@st.cache_resource
+def vigia_notas():
+    vigia = Vigia(INTERVALO_ATUALIZACAO)
+    vigia.start()
+    return vigia
+
+def notas_atualizadas():
+    estado = dados_cliente.notas
+    with st.spinner("Carregando notas..."):
+        estado.atualizar()
+    return estado.instantaneo()
+
+def contabilidade_com_avisos(versao):
+    with st.spinner("Carregando contabilidade..."):
+        caminho_ok = Path(dados_cliente.caminho_contabilidade).is_file()
+        caixa_df, piscofins_df, dre_df = dados_cliente.contabilidade()[1]
+    if not caminho_ok:
+        st.warning("Planilha de contabilidade não encontrada para este cliente: relatórios contábeis indisponíveis.")
+        return caixa_df, piscofins_df, dre_df
+    if caixa_df is None:
         st.warning("Aba 'Caixa' não encontrada.")
+    if piscofins_df is None or dre_df is None:
+        st.error("Erro: Aba não encontrada - 'PISCOFINS' ou 'DRE 1º Trimestre'")
+    return caixa_df, piscofins_df, dre_df
+
+# Derivados guardados no próprio cliente do pool (a versão nova substitui a antiga): saem da memória
+# junto com ele e entram na conta do orçamento de RAM
+def carregar_cubo(entradas, saidas, versao):
+    return dados_cliente.derivado("cubo", versao, lambda: montar_cubo(entradas, saidas))
+
+def carregar_indice_competencias(notas, versao, direcao):
+    return dados_cliente.derivado(("indice", direcao), versao, lambda: IndiceCompetencias(notas))
 
-try:
-    piscofins_df = pd.read_excel("Contabilidade.xlsx", sheet_name="PISCOFINS")
-    dre_df = pd.read_excel("Contabilidade.xlsx", sheet_name="DRE 1º Trimestre")
-except KeyError as e:
-    st.error(f"Erro: Aba não encontrada - {e}")
+def _comparativo_exibicao(apuracao):
+    comparativo = apuracao.copy()
+    comparativo['Mês'] = comparativo['Mês'].astype(str)
+    return comparativo
 
-@st.cache_data
-def carregar_dados():
-    return entradas, saidas, caixa_df, piscofins_df, dre_df
+def carregar_apuracao(apuracao, versao):
+    return dados_cliente.derivado("comparativo", versao, lambda: _comparativo_exibicao(apuracao))
+
+def carregar_piscofins_notas(entradas, saidas, versao, regime):
+    return dados_cliente.derivado(("piscofins", regime), versao, lambda: apurar_piscofins(entradas, saidas, regime))
+
+def carregar_indice_caixa(caixa_df, versao):
+    return dados_cliente.derivado("indice_caixa", versao, lambda: IndiceCaixa(caixa_df))
+
+def carregar_indice_dre(dre_df, versao):
+    return dados_cliente.derivado("indice_dre", versao, lambda: IndiceDRE(dre_df))
 
 # =========================
 # 7. FUNÇÕES AUXILIARES
 # =========================
-def calcular_saldo_com_acumulado(df, meses_filtrados):
-    df = df.sort_values("Data").copy()
-    df["Mês"] = df["Data"].dt.month
-    df["Ano"] = df["Data"].dt.year
-    df["Valor Líquido"] = df["Entradas"] - df["Saídas"]
-    primeiro_mes = min(meses_filtrados)
-    saldo_anterior = df[df["Mês"] < primeiro_mes]["Valor Líquido"].sum()
-    df_filtrado = df[df["Mês"].isin(meses_filtrados)].copy()
-    df_filtrado["Saldo Acumulado"] = df_filtrado["Valor Líquido"].cumsum() + saldo_anterior
-    return df_filtrado
-
-def plotar_saldo_mensal(caixa_df, meses_selecionados):
-    df = caixa_df.copy()
-    df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
-    df = df.sort_values('Data').reset_index(drop=True)
-    df['Mês'] = df['Data'].dt.month
-    df['Ano'] = df['Data'].dt.year
-    df['Valor Líquido'] = df['Entradas'] - df['Saídas']
+# Figuras prontas por (relatório, período, versão dos dados, ...), num LRU do processo com limite de bytes
+@st.cache_resource
+def cache_figuras():
+    return CacheFiguras(int(os.environ.get("ANALISE_LIMITE_FIGURAS", LIMITE_PADRAO)))
+
+def mostrar_figuras(chave, construir):
+    # construir() só roda quando a chave não está no cache; é nele que fica o trabalho do pandas
+    figuras = cache_figuras().obter(chave, construir)
+    for fig in figuras if isinstance(figuras, tuple) else (figuras,):
+        st.plotly_chart(fig, use_container_width=True)
+
+def figuras_uf(cubo, uf_cores, direcao, titulo_barras, titulo_pizza):
+    coluna = 'UF do Emitente' if direcao == "Entrada" else 'UF do Destinatário'
+    df_uf = por_uf(cubo, direcao)
+    fig = px.bar(df_uf, x=coluna, y='Valor Total', text_auto='.2s', title=titulo_barras)
+    fig_pie = px.pie(df_uf, names=coluna, values='Valor Total', title=titulo_pizza,
+                     color=coluna, color_discrete_map=uf_cores, hole=0.3)
+    fig_pie.update_traces(textinfo='label+value')
+    return fig, fig_pie
+
+def figura_comparativo_mensal(comparativo):
+    df_bar = comparativo.melt(id_vars='Mês', value_vars=['ICMS Crédito', 'ICMS Débito'])
+    return px.bar(df_bar, x='Mês', y='value', color='variable', barmode='group', text_auto='.2s')
+
+def figuras_aliquota(cubo):
+    df_final = por_aliquota(cubo)
+    df_dual = df_final.melt(id_vars='Aliquota', value_vars=['Valor Total', 'Crédito ICMS Estimado', 'Débito ICMS'],
+                            var_name='Tipo', value_name='Valor')
+    fig_aliq_bar = px.bar(df_dual, x='Aliquota', y='Valor', color='Tipo', barmode='group', text_auto='.2s',
+                          title="Comparativo por Alíquota: Compras, Crédito e Débito")
+    fig_aliq_bar.update_layout(xaxis=dict(tickmode='array', tickvals=[0, 4, 7, 12, 19]))
+    fig_pie_credito = px.pie(df_final, names='Aliquota', values='Crédito ICMS Estimado', title='% de Crédito por Alíquota',
+                             color='Aliquota', color_discrete_map=aliq_cores, hole=0.3)
+    fig_pie_credito.update_traces(textinfo='label+value')
+    fig_pie_debito = px.pie(df_final, names='Aliquota', values='Débito ICMS', title='% de Débito por Alíquota',
+                            color='Aliquota', color_discrete_map=aliq_cores, hole=0.3)
+    fig_pie_debito.update_traces(textinfo='label+value')
+    return fig_aliq_bar, fig_pie_credito, fig_pie_debito
+
+def figura_totais(tipos, valores, titulo):
+    df_bar = pd.DataFrame({'Tipo': tipos, 'Valor': valores})
+    return px.bar(df_bar, x='Tipo', y='Valor', text_auto='.2s', color='Tipo', title=titulo)
+
+def plotar_saldo_mensal(indice, competencias, diario=False):
+    if diario:
+        df_pontos = indice.saldo_diario(competencias[0].start_time, (competencias[-1] + 1).start_time)
+    else:
+        df_pontos = pontos_saldo_mensal(indice, competencias)
+    # Só a série do período escolhido é reduzida (LTTB): anos de caixa diário ficam em LIMITE_PONTOS pontos
+    df_pontos = reduzir_serie(df_pontos, "Data", "Saldo Acumulado")
+    return px.line(df_pontos, x="Data", y="Saldo Acumulado", markers=True, title="Evolução  Saldo de caixa ")
+
+def figura_saldo_piscofins(piscofins_ordenado, piscofins_filtrado, inicio, fim):
     pontos = []
-    for mes in meses_selecionados:
-        df_mes = df[df['Mês'] == mes]
-        if df_mes.empty:
-            continue
-        ano = df_mes['Ano'].dropna().iloc[0] if not df_mes['Ano'].dropna().empty else None
-        if ano is None:
-            continue
-        try:
-            data_limite = pd.Timestamp(f"{int(ano)}-{mes:02d}-01")
-        except Exception as e:
-            st.warning(f"Erro ao gerar data para o mês {mes} e ano {ano}: {e}")
-            continue
-        df_ant = df[df['Data'] < data_limite]
-        saldo_ant = df_ant['Valor Líquido'].sum() if not df_ant.empty else 0
-        if len(meses_selecionados) > 1:
-            saldo_fim = df_mes['Valor Líquido'].cumsum().iloc[-1] + saldo_ant
-            data_fim = df_mes['Data'].iloc[-1]
-            pontos.append({'Data': data_fim, 'Saldo Acumulado': saldo_fim, 'Mês': mes})
-        else:
-            data_ant = df_ant['Data'].iloc[-1] if not df_ant.empty else (data_limite - pd.Timedelta(days=1))
-            pontos.append({'Data': data_ant, 'Saldo Acumulado': saldo_ant, 'Mês': mes})
-            data_15 = pd.Timestamp(f"{int(ano)}-{mes:02d}-15")
-            df_mes_15 = df_mes[df_mes['Data'] <= data_15]
-            if not df_mes_15.empty:
-                saldo_15 = df_mes_15['Valor Líquido'].cumsum().iloc[-1] + saldo_ant
-                pontos.append({'Data': data_15, 'Saldo Acumulado': saldo_15, 'Mês': mes})
-            saldo_fim = df_mes['Valor Líquido'].cumsum().iloc[-1] + saldo_ant
-            data_fim = df_mes['Data'].iloc[-1]
-            pontos.append({'Data': data_fim, 'Saldo Acumulado': saldo_fim, 'Mês': mes})
-    df_pontos = pd.DataFrame(pontos)
-    fig = px.line(df_pontos, x="Data", y="Saldo Acumulado", markers=True, title="Evolução  Saldo de caixa ")
-    st.plotly_chart(fig, use_container_width=True)
-
-def normalize_str(s):
-    # Remove acentos e deixa minúsculo
-    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn').lower()
-
-def get_dre_val(desc, flexible=False):
-    if flexible:
-        # Busca flexível: ignora acentos, maiúsculas/minúsculas e aceita parte do texto
-        desc_norm = normalize_str(desc)
-        dre_df['desc_norm'] = dre_df['Descrição'].astype(str).apply(normalize_str)
-        row = dre_df[dre_df['desc_norm'].str.contains(desc_norm)]
+    if inicio == fim:
+        mes_nome = rotulo_mes(inicio)
+        saldo_anterior = piscofins_ordenado[piscofins_ordenado['Competência'] < inicio]['Saldo']
+        saldo_anterior = saldo_anterior.iloc[-1] if not saldo_anterior.empty else 0
+        pontos.append({'Mês': f"{mes_nome} - Início", 'Saldo': -saldo_anterior})
+        saldo_fim = piscofins_filtrado['Saldo']
+        saldo_fim = saldo_fim.iloc[-1] if not saldo_fim.empty else saldo_anterior
+        pontos.append({'Mês': f"{mes_nome} - Fim", 'Saldo': -saldo_fim})
     else:
-        row = dre_df[dre_df['Descrição'].str.strip().str.upper() == desc.strip().upper()]
-    if not row.empty:
-        val = str(row['Saldo'].values[0])
-        val = val.replace("R$", "").replace(" ", "")
-        if "," in val:
-            val_float = float(val.replace(".", "").replace(",", "."))
-        else:
-            try:
-                val_float = float(val)
-            except Exception:
-                val_float = 0.0
-        return f"R$ {val_float:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    return "R$ 0,00"
+        for competencia, saldo_fim in piscofins_filtrado.groupby('Competência', sort=True)['Saldo'].last().items():
+            pontos.append({'Mês': rotulo_mes(competencia), 'Saldo': -saldo_fim})
+    df_pontos = pd.DataFrame(pontos)
+    return px.line(
+    df_pontos, x='Mês', y='Saldo',
+        title='Evolução do Saldo Acumulado - PIS e COFINS'
+    )
+
+@st.cache_data(max_entries=8, show_spinner="Gerando arquivo...")
+def exportar_relatorio(_entradas, _saidas, _comparativo, periodo, formato, versao):
+    abas = {"Entradas": notas_para_exibicao(_entradas), "Saídas": notas_para_exibicao(_saidas), "Apuracao": _comparativo}
+    return exportar(abas, formato)
+
+@st.cache_data(max_entries=16)
+def opcoes_navegador(_df, chave, versao):
+    return opcoes_filtro(_df, DIRECOES[chave])
+
+@st.cache_data(max_entries=32)
+def posicoes_navegador(_df, chave, versao, filtros, coluna_ordem, crescente):
+    posicoes = filtrar_notas(_df, DIRECOES[chave], **dict(filtros))
+    return ordenar_posicoes(_df, posicoes, coluna_ordem, crescente)
+
+def navegador_notas(df, chave):
+    # Filtro, ordenação e paginação rodam no servidor; só a página visível vai para o navegador
+    versao = (grafo["versao_notas"], filtro_periodo)
+    opcoes = opcoes_navegador(df, chave, versao)
+    with st.expander("Filtros e busca"):
+        c1, c2, c3 = st.columns(3)
+        ufs = c1.multiselect("UF", opcoes["ufs"], key=f"{chave}_ufs")
+        aliquotas = c2.multiselect("Alíquota (%)", opcoes["aliquotas"], key=f"{chave}_aliquotas")
+        cfops = c3.multiselect("CFOP", opcoes["cfops"], key=f"{chave}_cfops", disabled=not opcoes["cfops"])
+        minimo, maximo = opcoes["faixa_valor"]
+        faixa_valor = None
+        if maximo > minimo:
+            faixa_valor = st.slider("Valor Total (R$)", minimo, maximo, (minimo, maximo), key=f"{chave}_faixa")
+            if faixa_valor == (minimo, maximo):
+                faixa_valor = None
+        busca = st.text_input("Buscar texto", key=f"{chave}_busca").strip()
+    c1, c2, c3, c4 = st.columns(4)
+    coluna_ordem = c1.selectbox("Ordenar por", [None] + list(df.columns), key=f"{chave}_ordem")
+    crescente = c2.selectbox("Ordem", ["Crescente", "Decrescente"], key=f"{chave}_sentido") == "Crescente"
+    tamanho = c3.selectbox("Linhas por página", [25, 50, 100, 500], index=1, key=f"{chave}_tamanho")
+    filtros = (("ufs", tuple(ufs)), ("aliquotas", tuple(aliquotas)), ("cfops", tuple(cfops)),
+               ("faixa_valor", faixa_valor), ("busca", busca))
+    posicoes = posicoes_navegador(df, chave, versao, filtros, coluna_ordem, crescente)
+    total_paginas = max(1, -(-len(posicoes) // tamanho))
+    numero = c4.number_input(f"Página (de {total_paginas})", 1, total_paginas, 1, key=f"{chave}_pagina")
+    st.caption(f"{len(posicoes):,} de {len(df):,} notas".replace(",", "."))
+    st.dataframe(pagina(df, posicoes, numero, tamanho), use_container_width=True)
+
+# A validação relê as notas cruas (planilha) ou as partes gravadas (XMLs) em lotes de tamanho fixo
+def _validar(dados):
+    if dados.pasta_nfe:
+        return validar_armazem(dados.pasta_nfe)
+    return validar_planilha(dados.caminho_notas)
+
+def validar_notas(dados, versao):
+    with st.spinner("Validando notas..."):
+        return dados.derivado("validacao", versao, lambda: _validar(dados))
+
+@st.cache_data(max_entries=4, show_spinner="Gerando arquivo...")
+def exportar_validacao(_dados, versao, formato):
+    validacao = validar_notas(_dados, versao)
+    return exportar({"Resumo": validacao.resumo(), "Exceções": validacao.excecoes()}, formato)
+
+# A consulta SQL enxerga os mesmos objetos em memória dos relatórios, sem cópia
+def tabelas_consulta():
+    entradas, saidas = grafo["notas"]
+    caixa_df, piscofins_df, dre_df = grafo["contabilidade"]
+    tabelas = {"entradas": entradas, "saidas": saidas, "apuracao": grafo["comparativo"],
+               "caixa": caixa_df, "piscofins": piscofins_df, "dre": dre_df}
+    return tabelas, (grafo["versao_notas"], grafo["versao_contabilidade"])
+
+@st.cache_data(max_entries=4)
+def esquema_consulta(_tabelas, versoes):
+    return consulta.esquema(_tabelas)
+
+@st.cache_resource(max_entries=16, show_spinner="Executando consulta...")
+def executar_consulta(_tabelas, sql, limite, versoes):
+    return consulta.consultar(sql, _tabelas, limite)
 
 # =========================
 # 8. FILTROS DINÂMICOS
 # =========================
+if PASTA_CLIENTES:
+    clientes = listar_clientes(PASTA_CLIENTES)
+    if not clientes:
+        st.warning(f"Nenhum cliente encontrado em {PASTA_CLIENTES}.")
+        st.stop()
+    cliente = st.sidebar.selectbox("🏢 Cliente:", clientes, key="cliente")
+else:
+    cliente = CLIENTE_PADRAO
+dados_cliente = pool_clientes().obter(cliente)
+# A pasta de entrada é observada antes de qualquer st.stop: com o armazenamento ainda vazio, as
+# primeiras notas só chegam por ela
+if PASTA_ENTRADA and not PASTA_CLIENTES:
+    observador = observar_entrada(PASTA_ENTRADA, CNPJ_EMPRESA)
+    if observador.erro:
+        st.sidebar.warning(f"Pasta de entrada: {observador.erro}")
+    if not CNPJ_EMPRESA:
+        st.sidebar.warning("Sem ANALISE_CNPJ, a direção das notas da pasta de entrada vem do tpNF: "
+                           "compras de fornecedores entram como saídas.")
+
 st.sidebar.markdown("""
 <h3 style="color:#C89D4A; margin-bottom: 0;">
     <i class="fas fa-sliders-h"></i> Filtros
 </h3>
 """, unsafe_allow_html=True)
-periodos = {
-    "Janeiro/2025": [1],
-    "Fevereiro/2025": [2],
-    "Março/2025": [3],
-    "1º Trimestre/2025": [1, 2, 3]
-}
-filtro_periodo = st.sidebar.selectbox(
-    "📅 Período:",
-    ["Janeiro/2025", "Fevereiro/2025", "Março/2025", "1º Trimestre/2025"],
-    key="periodo"
-)
-meses_filtrados = periodos[filtro_periodo]
-entradas_filtradas = entradas[entradas['Mês'].dt.month.isin(meses_filtrados)]
-saidas_filtradas = saidas[saidas['Mês'].dt.month.isin(meses_filtrados)]
+# O período só é montado depois da escolha do relatório (seção 11): as competências oferecidas dependem dele
+filtros_periodo = st.sidebar.container()
+
+def escolher_periodo(competencias_existentes):
+    if not competencias_existentes:
+        st.warning("Nenhuma competência encontrada para este relatório.")
+        st.stop()
+    periodos = opcoes_periodo(competencias_existentes)
+    with filtros_periodo:
+        filtro_periodo = st.selectbox(
+            "📅 Período:",
+            [*periodos, "Personalizado"],
+            key="periodo"
+        )
+        if filtro_periodo == "Personalizado":
+            rotulos = {rotulo_mes(c): c for c in competencias_existentes}
+            col_de, col_ate = st.columns(2)
+            de = col_de.selectbox("De", list(rotulos), key="periodo_de")
+            ate = col_ate.selectbox("Até", list(rotulos), index=len(rotulos) - 1, key="periodo_ate")
+            inicio, fim = sorted((rotulos[de], rotulos[ate]))
+            return f"{rotulo_mes(inicio)} a {rotulo_mes(fim)}", inicio, fim
+    return filtro_periodo, *periodos[filtro_periodo]
 
 # =========================
-# 9. DEMONSTRATIVO DO PERÍODO FILTRADO
+# 9. GRAFO DE DADOS DOS RELATÓRIOS
 # =========================
-creditos = entradas.groupby(entradas['Mês'].dt.to_period('M'))['Valor ICMS'].sum().reset_index(name='ICMS Crédito')
-debitos = saidas.groupby(saidas['Mês'].dt.to_period('M'))['Valor ICMS'].sum().reset_index(name='ICMS Débito')
-comparativo = pd.merge(creditos, debitos, on='Mês', how='outer').fillna(0).sort_values(by='Mês')
-comparativo['Crédito Acumulado'] = 0.0
-comparativo['ICMS Apurado Corrigido'] = 0.0
-credito_acumulado = 0
-for i, row in comparativo.iterrows():
-    credito_total = row['ICMS Crédito'] + credito_acumulado
-    apurado = row['ICMS Débito'] - credito_total
-    comparativo.at[i, 'Crédito Acumulado'] = credito_acumulado
-    comparativo.at[i, 'ICMS Apurado Corrigido'] = apurado
-    credito_acumulado = max(0, -apurado)
-comparativo['Mês'] = comparativo['Mês'].astype(str)
-comparativo_filtrado = comparativo[comparativo['Mês'].apply(lambda x: int(x[5:7]) in meses_filtrados)]
+# Planilhas -> tabelas limpas -> agregados. Cada relatório pede só os nós de que precisa,
+# então os relatórios contábeis não abrem a planilha de notas (e vice-versa).
+def filtrar_periodo(indice):
+    return indice.linhas(inicio, fim)
+
+def filtrar_comparativo(comparativo):
+    # 'Mês' vem como texto AAAA-MM, que ordena como as competências
+    return comparativo[comparativo['Mês'].between(str(inicio), str(fim))]
+
+def competencias_contabeis(contabilidade, versao):
+    caixa_df, piscofins_df, _ = contabilidade
+    competencias = set()
+    if caixa_df is not None:
+        competencias.update(carregar_indice_caixa(caixa_df, versao).competencias())
+    if piscofins_df is not None:
+        competencias.update(piscofins_df['Competência'].dropna())
+    return sorted(competencias)
+
+def cores_por_uf(cubo):
+    palette = pc.qualitative.Alphabet
+    return {uf: palette[i % len(palette)] for i, uf in enumerate(ufs_presentes(cubo))}
+
+grafo = Grafo(perfil)
+grafo.definir("notas_atualizadas", notas_atualizadas)
+grafo.definir("versao_notas", lambda notas: dados_cliente.versao_notas(notas[0]), ["notas_atualizadas"])
+grafo.definir("notas", lambda notas: notas[1:3], ["notas_atualizadas"])
+grafo.definir("versao_contabilidade", lambda: dados_cliente.contabilidade()[0])
+grafo.definir("entradas", lambda notas: notas[0], ["notas"])
+grafo.definir("saidas", lambda notas: notas[1], ["notas"])
+grafo.definir("contabilidade", contabilidade_com_avisos, ["versao_contabilidade"])
+grafo.definir("caixa_df", lambda contabilidade: contabilidade[0], ["contabilidade"])
+grafo.definir("piscofins_df", lambda contabilidade: contabilidade[1], ["contabilidade"])
+grafo.definir("dre_df", lambda contabilidade: contabilidade[2], ["contabilidade"])
+
+grafo.definir("indice_entradas", lambda notas, versao: carregar_indice_competencias(notas, versao, "Entrada"),
+              ["entradas", "versao_notas"])
+grafo.definir("indice_saidas", lambda notas, versao: carregar_indice_competencias(notas, versao, "Saída"),
+              ["saidas", "versao_notas"])
+grafo.definir("entradas_filtradas", filtrar_periodo, ["indice_entradas"])
+grafo.definir("saidas_filtradas", filtrar_periodo, ["indice_saidas"])
+grafo.definir("cubo", carregar_cubo, ["entradas", "saidas", "versao_notas"])
+grafo.definir("cubo_filtrado", lambda cubo: filtrar_cubo(cubo, inicio, fim), ["cubo"])
+grafo.definir("uf_cores", cores_por_uf, ["cubo"])
+grafo.definir("comparativo", lambda notas, versao: carregar_apuracao(notas[3], versao), ["notas_atualizadas", "versao_notas"])
+grafo.definir("comparativo_filtrado", filtrar_comparativo, ["comparativo"])
+grafo.definir("indice_caixa", carregar_indice_caixa, ["caixa_df", "versao_contabilidade"])
+grafo.definir("indice_dre", carregar_indice_dre, ["dre_df", "versao_contabilidade"])
+# Competências das partições das notas, já sincronizadas, e as do caixa e da aba PISCOFINS
+grafo.definir("competencias_notas", lambda notas: dados_cliente.notas.competencias(), ["notas_atualizadas"])
+grafo.definir("competencias_contabilidade", competencias_contabeis, ["contabilidade", "versao_contabilidade"])
 
 # =========================
 # 10. MAPA DE CORES
 # =========================
-ufs = sorted(set(entradas['UF do Emitente'].dropna().unique().tolist() + saidas['UF do Destinatário'].dropna().unique().tolist()))
-palette = pc.qualitative.Alphabet
-uf_cores = {uf: palette[i % len(palette)] for i, uf in enumerate(ufs)}
 aliq_cores = {0: '#636EFA', 4: '#EF553B', 7: '#00CC96', 12: '#AB63FA', 19: '#FFA15A'}
 
 # =========================
@@ -306,7 +520,9 @@ if aba == "📂 Fiscal":
             "Mapa por UF",
             "Comparativo de Crédito x Débito",
             "Apuração com Crédito Acumulado",
-            "Relatórios Detalhados"
+            "Relatórios Detalhados",
+            "✅ Validação das Notas",
+            "🔎 Consulta SQL"
         ]
     )
 else:
@@ -316,256 +532,285 @@ else:
             "📘 Contabilidade e Caixa",
             "📗 PIS e COFINS",
             "📘 DRE Trimestral",
-            "📑 Tabelas Contabilidade"
+            "📑 Tabelas Contabilidade",
+            "🔎 Consulta SQL"
         ]
     )
 
-if filtro_grafico == "Mapa por UF":
-    bloco_visual(
-        "Distribuição de Compras e Vendas por Estado (UF)",
-        "map-marker-alt",
-        "Visualize o volume total de compras e vendas por unidade federativa, tanto em barras quanto em pizza. <i class='fas fa-info-circle'></i>"
-    )
-    col1, col2 = st.columns(2)
-    with col1:
-        uf_compras = entradas_filtradas.groupby('UF do Emitente')['Valor Total'].sum().reset_index()
-        fig = px.bar(uf_compras, x='UF do Emitente', y='Valor Total', text_auto='.2s', title="Compras por UF (Volume Total)")
-        st.plotly_chart(fig, use_container_width=True)
-        fig_pie = px.pie(uf_compras, names='UF do Emitente', values='Valor Total', title='Distribuição % por UF - Compras',
-                         color='UF do Emitente', color_discrete_map=uf_cores, hole=0.3)
-        fig_pie.update_traces(textinfo='label+value')
-        st.plotly_chart(fig_pie, use_container_width=True)
-    with col2:
-        uf_vendas = saidas_filtradas.groupby('UF do Destinatário')['Valor Total'].sum().reset_index()
-        fig = px.bar(uf_vendas, x='UF do Destinatário', y='Valor Total', text_auto='.2s', title="Saídas por UF (Volume Total)")
-        st.plotly_chart(fig, use_container_width=True)
-        fig_pie2 = px.pie(uf_vendas, names='UF do Destinatário', values='Valor Total', title='Distribuição % por UF - Faturamento',
-                          color='UF do Destinatário', color_discrete_map=uf_cores, hole=0.3)
-        fig_pie2.update_traces(textinfo='label+value')
-        st.plotly_chart(fig_pie2, use_container_width=True)
-
-elif filtro_grafico == "Comparativo de Crédito x Débito":
-    bloco_visual(
-        "Comparativo Mensal de ICMS",
-        "balance-scale",
-        "Compare créditos e débitos de ICMS mês a mês, além da distribuição por faixa de alíquota. <i class='fas fa-info-circle'></i>"
-    )
-    df_bar = comparativo_filtrado.melt(id_vars='Mês', value_vars=['ICMS Crédito', 'ICMS Débito'])
-    fig_bar = px.bar(df_bar, x='Mês', y='value', color='variable', barmode='group', text_auto='.2s')
-    st.plotly_chart(fig_bar, use_container_width=True)
-    bloco_visual(
-        "Distribuição de ICMS por Faixa de Alíquota",
-        "percent",
-        "Veja como os créditos e débitos de ICMS se distribuem entre diferentes faixas de alíquota. <i class='fas fa-info-circle'></i>"
-    )
-    df_aliq = entradas_filtradas.copy()
-    df_aliq['Aliquota'] = (df_aliq['Alíquota ICMS'] * 100).round(0).astype(int)
-    df_aliq['Crédito ICMS Estimado'] = df_aliq['Valor ICMS']
-    df_saida = saidas_filtradas.copy()
-    df_saida['Aliquota'] = (df_saida['Alíquota ICMS'] * 100).round(0).astype(int)
-    total_compras = df_aliq.groupby('Aliquota').agg({'Valor Total': 'sum', 'Crédito ICMS Estimado': 'sum'}).reset_index()
-    total_debitos = df_saida.groupby('Aliquota')['Valor ICMS'].sum().reset_index(name='Débito ICMS')
-    df_final = pd.merge(total_compras, total_debitos, on='Aliquota', how='outer').fillna(0)
-    df_dual = df_final.melt(id_vars='Aliquota', value_vars=['Valor Total', 'Crédito ICMS Estimado', 'Débito ICMS'],
-                            var_name='Tipo', value_name='Valor')
-    fig_aliq_bar = px.bar(df_dual, x='Aliquota', y='Valor', color='Tipo', barmode='group', text_auto='.2s',
-                          title="Comparativo por Alíquota: Compras, Crédito e Débito")
-    fig_aliq_bar.update_layout(xaxis=dict(tickmode='array', tickvals=[0, 4, 7, 12, 19]))
-    st.plotly_chart(fig_aliq_bar, use_container_width=True)
-    fig_pie_credito = px.pie(df_final, names='Aliquota', values='Crédito ICMS Estimado', title='% de Crédito por Alíquota',
-                             color='Aliquota', color_discrete_map=aliq_cores, hole=0.3)
-    fig_pie_credito.update_traces(textinfo='label+value')
-    fig_pie_debito = px.pie(df_final, names='Aliquota', values='Débito ICMS', title='% de Débito por Alíquota',
-                            color='Aliquota', color_discrete_map=aliq_cores, hole=0.3)
-    fig_pie_debito.update_traces(textinfo='label+value')
-    col3, col4 = st.columns(2)
-    with col3:
-        st.plotly_chart(fig_pie_credito, use_container_width=True)
-    with col4:
-        st.plotly_chart(fig_pie_debito, use_container_width=True)
-
-elif filtro_grafico == "Relatórios Detalhados":
-    bloco_visual(
-        "Dados Fiscais Detalhados (.xlsx)",
-        "file-excel",
-        "Visualize e baixe todas as notas fiscais e apurações do período selecionado. <i class='fas fa-info-circle'></i>"
-    )
-    st.markdown("<h3><i class='fas fa-download'></i> Notas Fiscais de Entrada</h3>", unsafe_allow_html=True)
-    st.dataframe(entradas_filtradas.fillna("").astype(str), use_container_width=True)
-    st.markdown("<h3><i class='fas fa-upload'></i> Notas Fiscais de Saída</h3>", unsafe_allow_html=True)
-    st.dataframe(saidas_filtradas.fillna("").astype(str), use_container_width=True)
-    st.markdown("<h3><i class='fas fa-balance-scale'></i> Comparativo de Crédito x Débito com Crédito Acumulado</h3>", unsafe_allow_html=True)
-    st.dataframe(comparativo_filtrado.style.format({
-        'ICMS Crédito': 'R$ {:,.2f}',
-        'ICMS Débito': 'R$ {:,.2f}',
-        'Crédito Acumulado': 'R$ {:,.2f}',
-        'ICMS Apurado Corrigido': 'R$ {:,.2f}'
-    }), use_container_width=True)
-    def to_excel():
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            entradas_filtradas.to_excel(writer, sheet_name="Entradas", index=False)
-            saidas_filtradas.to_excel(writer, sheet_name="Saídas", index=False)
-            comparativo_filtrado.to_excel(writer, sheet_name="Apuracao", index=False)
-        processed_data = output.getvalue()
-        return processed_data
-    excel_bytes = to_excel()
-    st.download_button(
-        label="Baixar Relatórios Completos (.xlsx)",
-        data=excel_bytes,
-        file_name="Relatorio_ICMS_Completo.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+# Relatórios contábeis oferecem as competências do caixa e da aba PISCOFINS e não abrem a planilha
+# de notas; os demais, as das notas (sincronizadas antes, pois o relatório vai usá-las)
+RELATORIOS_CONTABEIS = {"📘 Contabilidade e Caixa", "📗 PIS e COFINS", "📘 DRE Trimestral", "📑 Tabelas Contabilidade"}
+if filtro_grafico in RELATORIOS_CONTABEIS:
+    # Sem contabilidade, as competências já gravadas das notas (sem sincronizar)
+    competencias_existentes = grafo["competencias_contabilidade"] or dados_cliente.notas.competencias()
+else:
+    competencias_existentes = grafo["competencias_notas"]
+filtro_periodo, inicio, fim = escolher_periodo(competencias_existentes)
 
-elif filtro_grafico == "📘 Contabilidade e Caixa":
-    bloco_visual(
-        "Caixa Contábil no Período",
-        "cash-register",
-        "Acompanhe entradas, saídas e saldo acumulado do caixa contábil. <i class='fas fa-info-circle'></i>"
-    )
-    caixa_df['Entradas'] = pd.to_numeric(caixa_df['Entradas'], errors='coerce').fillna(0)
-    caixa_df['Saídas'] = pd.to_numeric(caixa_df['Saídas'], errors='coerce').fillna(0)
-    caixa_df['Entrada'] = caixa_df['Entradas']
-    caixa_df['Saída'] = -caixa_df['Saídas']
-    caixa_df['Valor Líquido'] = caixa_df['Entrada'] + caixa_df['Saída']
-    caixa_df['Data'] = pd.to_datetime(caixa_df['Data'], errors='coerce')
-    caixa_df['Mês'] = caixa_df['Data'].dt.month
-    caixa_df['Ano'] = caixa_df['Data'].dt.year
-    meses_selecionados = periodos[filtro_periodo]
-    caixa_ordenado = caixa_df.sort_values('Data').copy()
-    caixa_filtrado = calcular_saldo_com_acumulado(caixa_df, meses_selecionados)
-    receita_total = caixa_filtrado['Entradas'].sum()
-    despesa_total = caixa_filtrado['Saídas'].sum()
-    saldo_final = receita_total - despesa_total
-    margem = (saldo_final / receita_total * 100) if receita_total != 0 else 0
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total de Entradas", f"R$ {receita_total:,.2f}")
-    col2.metric("Total de Saídas", f"R$ {despesa_total:,.2f}")
-    col3.metric("Saldo Final", f"R$ {saldo_final:,.2f}")
-    col4.metric("Margem (%)", f"{margem:.2f}%")
-    df_bar = caixa_filtrado[['Entradas', 'Saídas']].sum().reset_index()
-    df_bar.columns = ['Tipo', 'Valor']
-    fig_bar = px.bar(df_bar, x='Tipo', y='Valor', text_auto='.2s', color='Tipo', title="Entradas x Saídas no Período")
-    st.plotly_chart(fig_bar, use_container_width=True)
-    plotar_saldo_mensal(caixa_df, meses_selecionados)
-
-elif filtro_grafico == "📗 PIS e COFINS":
-    bloco_visual(
-        "Situação Fiscal de PIS e COFINS",
-        "file-invoice-dollar",
-        "Veja créditos, débitos e saldo acumulado de PIS e COFINS no período. <i class='fas fa-info-circle'></i>"
-    )
-    ordem_meses = {"Janeiro": 1, "Fevereiro": 2, "Março": 3}
-    meses_filtro = {
-        "Janeiro/2025": ["Janeiro"],
-        "Fevereiro/2025": ["Fevereiro"],
-        "Março/2025": ["Março"],
-        "1º Trimestre/2025": ["Janeiro", "Fevereiro", "Março"]
-    }
-    meses_selecionados = meses_filtro[filtro_periodo]
-    piscofins_ordenado = piscofins_df.copy()
-    piscofins_ordenado['Ordem'] = piscofins_ordenado['Mês'].map(ordem_meses)
-    piscofins_ordenado = piscofins_ordenado.sort_values(by="Ordem")
-    piscofins_filtrado = piscofins_ordenado[piscofins_ordenado['Mês'].isin(meses_selecionados)]
-    credito_total = piscofins_filtrado['Crédito'].sum()
-    debito_total = piscofins_filtrado['Débito'].sum()
-    saldo_final = credito_total - debito_total
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Total Créditos", f"R$ {credito_total:,.2f}")
-    col2.metric("Total Débitos", f"R$ {debito_total:,.2f}")
-    col3.metric("Saldo Final", f"R$ {saldo_final:,.2f}")
-    df_bar = pd.DataFrame({
-        'Tipo': ['Crédito', 'Débito'],
-        'Valor': [credito_total, debito_total]
-    })
-    fig_bar = px.bar(df_bar, x='Tipo', y='Valor', text_auto='.2s', color='Tipo', title="Créditos x Débitos no Período")
-    st.plotly_chart(fig_bar, use_container_width=True)
-    pontos = []
-    if len(meses_selecionados) == 1:
-        mes_nome = meses_selecionados[0]
-        mes_num = ordem_meses[mes_nome]
-        saldo_anterior = piscofins_ordenado[piscofins_ordenado['Ordem'] < mes_num]['Saldo']
-        saldo_anterior = saldo_anterior.iloc[-1] if not saldo_anterior.empty else 0
-        pontos.append({'Mês': f"{mes_nome} - Início", 'Saldo': -saldo_anterior})
-        saldo_fim = piscofins_ordenado[piscofins_ordenado['Ordem'] == mes_num]['Saldo']
-        saldo_fim = saldo_fim.iloc[-1] if not saldo_fim.empty else saldo_anterior
-        pontos.append({'Mês': f"{mes_nome} - Fim", 'Saldo': -saldo_fim})
-    else:
-        for mes_nome in meses_selecionados:
-            saldo_fim = piscofins_ordenado[piscofins_ordenado['Mês'] == mes_nome]['Saldo']
-            if saldo_fim.empty:
-                continue
-            pontos.append({'Mês': mes_nome, 'Saldo': -saldo_fim.iloc[-1]})
-    df_pontos = pd.DataFrame(pontos)
-    fig_saldo_pis = px.line(
-    df_pontos, x='Mês', y='Saldo',
-        title='Evolução do Saldo Acumulado - PIS e COFINS'
-    )
-    st.plotly_chart(fig_saldo_pis, use_container_width=True)
+# Aba da contabilidade de que cada relatório depende (clientes podem não ter a planilha)
+ABAS_RELATORIOS = {"📘 Contabilidade e Caixa": "caixa_df", "📘 DRE Trimestral": "dre_df"}
 
-elif filtro_grafico == "📘 DRE Trimestral":
-    bloco_visual(
-        "Demonstração do Resultado do Exercício (DRE)",
-        "file-contract",
-        "Resumo do resultado do exercício, com receitas, deduções, custos, despesas e lucro/prejuízo final. <i class='fas fa-info-circle'></i>"
-    )
+with perfil.etapa(f"relatório: {filtro_grafico}"):
+    if filtro_grafico in ABAS_RELATORIOS and grafo[ABAS_RELATORIOS[filtro_grafico]] is None:
+        st.info("Este cliente não tem a aba da contabilidade usada neste relatório.")
+    elif filtro_grafico == "Mapa por UF":
+        bloco_visual(
+            "Distribuição de Compras e Vendas por Estado (UF)",
+            "map-marker-alt",
+            "Visualize o volume total de compras e vendas por unidade federativa, tanto em barras quanto em pizza. <i class='fas fa-info-circle'></i>"
+        )
+        chave = (filtro_grafico, inicio, fim, grafo["versao_notas"])
+        col1, col2 = st.columns(2)
+        with col1:
+            mostrar_figuras((*chave, "Entrada"), lambda: figuras_uf(
+                grafo["cubo_filtrado"], grafo["uf_cores"], "Entrada",
+                "Compras por UF (Volume Total)", 'Distribuição % por UF - Compras'))
+        with col2:
+            mostrar_figuras((*chave, "Saída"), lambda: figuras_uf(
+                grafo["cubo_filtrado"], grafo["uf_cores"], "Saída",
+                "Saídas por UF (Volume Total)", 'Distribuição % por UF - Faturamento'))
 
-    receita_bruta = get_dre_val("VENDA DE MERCADORIAS A VISTA", flexible=True)
-    deducoes = get_dre_val("(-) Deduções das Receitas Operacionais", flexible=True)
-    receita_liquida = get_dre_val("Total das Receitas Operacionais Líquidas", flexible=True)
-    custo_mercadorias = get_dre_val("Custos das Mercadorias Vendidas", flexible=True)
-    lucro_bruto = get_dre_val("Lucro e/ou Prejuízo Operacional Bruto", flexible=True)
-    despesas = get_dre_val("Despesas Administrativas", flexible=True)
-
-    resultado_liquido = get_dre_val("Resultado Líquido do Exercício", flexible=True)
-    if resultado_liquido == "R$ 0,00":
-        resultado_liquido = get_dre_val("Lucro/Prejuízo Líquido do Exercício", flexible=True)
-    if resultado_liquido == "R$ 0,00":
-        resultado_liquido = get_dre_val("Lucro/Prejuízo Líquido Antes da CSLL", flexible=True)
-
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Receita Bruta", receita_bruta)
-    col2.metric("Receita Líquida", receita_liquida)
-    col3.metric("Lucro Bruto", lucro_bruto)
-    col4.metric("Resultado Líquido", resultado_liquido)
+    elif filtro_grafico == "Comparativo de Crédito x Débito":
+        bloco_visual(
+            "Comparativo Mensal de ICMS",
+            "balance-scale",
+            "Compare créditos e débitos de ICMS mês a mês, além da distribuição por faixa de alíquota. <i class='fas fa-info-circle'></i>"
+        )
+        chave = (filtro_grafico, inicio, fim, grafo["versao_notas"])
+        mostrar_figuras((*chave, "mensal"), lambda: figura_comparativo_mensal(grafo["comparativo_filtrado"]))
+        bloco_visual(
+            "Distribuição de ICMS por Faixa de Alíquota",
+            "percent",
+            "Veja como os créditos e débitos de ICMS se distribuem entre diferentes faixas de alíquota. <i class='fas fa-info-circle'></i>"
+        )
+        fig_aliq_bar, fig_pie_credito, fig_pie_debito = cache_figuras().obter(
+            (*chave, "aliquota"), lambda: figuras_aliquota(grafo["cubo_filtrado"]))
+        st.plotly_chart(fig_aliq_bar, use_container_width=True)
+        col3, col4 = st.columns(2)
+        with col3:
+            st.plotly_chart(fig_pie_credito, use_container_width=True)
+        with col4:
+            st.plotly_chart(fig_pie_debito, use_container_width=True)
 
-    st.markdown(f"""
-        <div style="background:#22304A; border-radius:10px; padding:24px; margin-top:20px;">
-          <ul style="list-style:none; padding-left:0; font-size:18px;">
-            <li style="padding:8px 0; color:#C89D4A;">
-              <i class="fas fa-cash-register"></i> <b>Receita Operacional Bruta:</b>
-              <span style="color:#00FFAA;">{receita_bruta}</span>
-            </li>
-            <li style="padding:8px 0; color:#C89D4A; margin-left:24px;">
-              <i class="fas fa-minus-circle"></i> (-) Deduções:
-              <span style="color:#FFA500;">{deducoes}</span>
-            </li>
-            <hr style="border: 1px dashed #C89D4A; margin: 12px 0;">
-            <li style="padding:8px 0; color:#C89D4A;">
-              <i class="fas fa-file-invoice-dollar"></i> <b>Receita Líquida:</b>
-              <span style="color:#00FFAA;">{receita_liquida}</span>
-            </li>
-            <li style="padding:8px 0; color:#C89D4A; margin-left:24px;">
-              <i class="fas fa-box"></i> (-) Custos das Mercadorias Vendidas:
-              <span style="color:#FFA500;">{custo_mercadorias}</span>
-            </li>
-            <hr style="border: 1px dashed #C89D4A; margin: 12px 0;">
-            <li style="padding:8px 0; color:#C89D4A;">
-              <i class="fas fa-chart-line"></i> <b>Lucro Bruto:</b>
-              <span style="color:{'#00FFAA' if lucro_bruto.replace('R$', '').replace('.', '').replace(',', '.').strip() and float(lucro_bruto.replace('R$', '').replace('.', '').replace(',', '.')) >= 0 else '#FF5555'};">{lucro_bruto}</span>
-            </li>
-            <li style="padding:8px 0; color:#C89D4A; margin-left:24px;">
-              <i class="fas fa-money-bill-wave"></i> (-) Despesas Administrativas:
-              <span style="color:#FFA500;">{despesas}</span>
-            </li>
-            <hr style="border: 1px dashed #C89D4A; margin: 12px 0;">
-            <li style="padding:8px 0; color:#C89D4A;">
-              <i class="fas fa-coins"></i> <b>Resultado Líquido do Exercício:</b>
-              <span style="color:{'#00FFAA' if resultado_liquido.replace('R$', '').replace('.', '').replace(',', '.').strip() and float(resultado_liquido.replace('R$', '').replace('.', '').replace(',', '.')) >= 0 else '#FF5555'};">{resultado_liquido}</span>
-            </li>
-          </ul>
-        </div>
-        """, unsafe_allow_html=True)
+    elif filtro_grafico == "Relatórios Detalhados":
+        bloco_visual(
+            "Dados Fiscais Detalhados (.xlsx)",
+            "file-excel",
+            "Visualize e baixe todas as notas fiscais e apurações do período selecionado. <i class='fas fa-info-circle'></i>"
+        )
+        st.markdown("<h3><i class='fas fa-download'></i> Notas Fiscais de Entrada</h3>", unsafe_allow_html=True)
+        entradas_filtradas, saidas_filtradas = grafo["entradas_filtradas"], grafo["saidas_filtradas"]
+        comparativo_filtrado = grafo["comparativo_filtrado"]
+        navegador_notas(entradas_filtradas, "Entrada")
+        st.markdown("<h3><i class='fas fa-upload'></i> Notas Fiscais de Saída</h3>", unsafe_allow_html=True)
+        navegador_notas(saidas_filtradas, "Saída")
+        st.markdown("<h3><i class='fas fa-balance-scale'></i> Comparativo de Crédito x Débito com Crédito Acumulado</h3>", unsafe_allow_html=True)
+        st.dataframe(comparativo_filtrado.style.format({
+            'ICMS Crédito': 'R$ {:,.2f}',
+            'ICMS Débito': 'R$ {:,.2f}',
+            'Crédito Acumulado': 'R$ {:,.2f}',
+            'ICMS Apurado Corrigido': 'R$ {:,.2f}'
+        }), use_container_width=True)
+        st.markdown("<h3><i class='fas fa-file-export'></i> Exportação</h3>", unsafe_allow_html=True)
+        formato = st.radio("Formato do arquivo:", list(FORMATOS), horizontal=True, key="formato_exportacao")
+        pedido = (filtro_periodo, formato, grafo["versao_notas"])
+        if st.button("Preparar arquivo para download"):
+            st.session_state["exportacao"] = pedido
+        # O arquivo só é gerado depois do pedido explícito e fica em cache por período/versão dos dados
+        if st.session_state.get("exportacao") == pedido:
+            with perfil.etapa("exportação", linhas=len(entradas_filtradas) + len(saidas_filtradas)):
+                dados, extensao, mime = exportar_relatorio(entradas_filtradas, saidas_filtradas, comparativo_filtrado, *pedido)
+            st.download_button(
+                label=f"Baixar Relatórios Completos ({formato})",
+                data=dados,
+                file_name=f"Relatorio_ICMS_Completo.{extensao}",
+                mime=mime
+            )
+
+    elif filtro_grafico == "📘 Contabilidade e Caixa":
+        bloco_visual(
+            "Caixa Contábil no Período",
+            "cash-register",
+            "Acompanhe entradas, saídas e saldo acumulado do caixa contábil. <i class='fas fa-info-circle'></i>"
+        )
+        indice_caixa = grafo["indice_caixa"]
+        competencias = list(pd.period_range(inicio, fim, freq='M'))
+        receita_total, despesa_total = indice_caixa.movimento(competencias[0].start_time, (competencias[-1] + 1).start_time)
+        saldo_final = receita_total - despesa_total
+        margem = (saldo_final / receita_total * 100) if receita_total != 0 else 0
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Total de Entradas", f"R$ {receita_total:,.2f}")
+        col2.metric("Total de Saídas", f"R$ {despesa_total:,.2f}")
+        col3.metric("Saldo Final", f"R$ {saldo_final:,.2f}")
+        col4.metric("Margem (%)", f"{margem:.2f}%")
+        chave = (filtro_grafico, inicio, fim, grafo["versao_contabilidade"])
+        mostrar_figuras((*chave, "totais"), lambda: figura_totais(
+            ['Entradas', 'Saídas'], [receita_total, despesa_total], "Entradas x Saídas no Período"))
+        diario = st.checkbox("Mostrar saldo diário", key="saldo_diario")
+        mostrar_figuras((*chave, "saldo", diario), lambda: plotar_saldo_mensal(indice_caixa, competencias, diario))
+
+    elif filtro_grafico == "📗 PIS e COFINS":
+        bloco_visual(
+            "Situação Fiscal de PIS e COFINS",
+            "file-invoice-dollar",
+            "Veja créditos, débitos e saldo acumulado de PIS e COFINS no período. <i class='fas fa-info-circle'></i>"
+        )
+        fontes = ["Planilha (aba PISCOFINS)", "Calculado das notas"]
+        # Sem a aba na contabilidade, a apuração só sai das notas
+        if grafo["piscofins_df"] is None:
+            fontes = fontes[1:]
+        fonte = st.radio("Fonte:", fontes, horizontal=True, key="fonte_piscofins")
+        if fonte == "Calculado das notas":
+            regime = st.selectbox("Regime da empresa:", list(REGIMES_PIS_COFINS), key="regime_piscofins")
+            versao = grafo["versao_notas"]
+            piscofins_df = carregar_piscofins_notas(*grafo["notas"], versao, regime)
+            chave = (filtro_grafico, inicio, fim, versao, regime)
+        else:
+            piscofins_df = grafo["piscofins_df"]
+            chave = (filtro_grafico, inicio, fim, grafo["versao_contabilidade"])
+        piscofins_ordenado = piscofins_df.sort_values(by="Competência")
+        piscofins_filtrado = piscofins_ordenado[piscofins_ordenado['Competência'].between(inicio, fim)]
+        credito_total = piscofins_filtrado['Crédito'].sum()
+        debito_total = piscofins_filtrado['Débito'].sum()
+        saldo_final = credito_total - debito_total
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Créditos", f"R$ {credito_total:,.2f}")
+        col2.metric("Total Débitos", f"R$ {debito_total:,.2f}")
+        col3.metric("Saldo Final", f"R$ {saldo_final:,.2f}")
+        mostrar_figuras((*chave, "totais"), lambda: figura_totais(
+            ['Crédito', 'Débito'], [credito_total, debito_total], "Créditos x Débitos no Período"))
+        mostrar_figuras((*chave, "saldo"), lambda: figura_saldo_piscofins(piscofins_ordenado, piscofins_filtrado, inicio, fim))
+
+    elif filtro_grafico == "📘 DRE Trimestral":
+        bloco_visual(
+            "Demonstração do Resultado do Exercício (DRE)",
+            "file-contract",
+            "Resumo do resultado do exercício, com receitas, deduções, custos, despesas e lucro/prejuízo final. <i class='fas fa-info-circle'></i>"
+        )
+
+        valores_dre = grafo["indice_dre"].resolver(LINHAS_DRE)
+        receita_bruta = formatar_moeda(valores_dre["receita_bruta"])
+        deducoes = formatar_moeda(valores_dre["deducoes"])
+        receita_liquida = formatar_moeda(valores_dre["receita_liquida"])
+        custo_mercadorias = formatar_moeda(valores_dre["custo_mercadorias"])
+        lucro_bruto = formatar_moeda(valores_dre["lucro_bruto"])
+        despesas = formatar_moeda(valores_dre["despesas"])
+        resultado_liquido = formatar_moeda(valores_dre["resultado_liquido"])
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Receita Bruta", receita_bruta)
+        col2.metric("Receita Líquida", receita_liquida)
+        col3.metric("Lucro Bruto", lucro_bruto)
+        col4.metric("Resultado Líquido", resultado_liquido)
+
+        st.markdown(f"""
+            <div style="background:#22304A; border-radius:10px; padding:24px; margin-top:20px;">
+              <ul style="list-style:none; padding-left:0; font-size:18px;">
+                <li style="padding:8px 0; color:#C89D4A;">
+                  <i class="fas fa-cash-register"></i> <b>Receita Operacional Bruta:</b>
+                  <span style="color:#00FFAA;">{receita_bruta}</span>
+                </li>
+                <li style="padding:8px 0; color:#C89D4A; margin-left:24px;">
+                  <i class="fas fa-minus-circle"></i> (-) Deduções:
+                  <span style="color:#FFA500;">{deducoes}</span>
+                </li>
+                <hr style="border: 1px dashed #C89D4A; margin: 12px 0;">
+                <li style="padding:8px 0; color:#C89D4A;">
+                  <i class="fas fa-file-invoice-dollar"></i> <b>Receita Líquida:</b>
+                  <span style="color:#00FFAA;">{receita_liquida}</span>
+                </li>
+                <li style="padding:8px 0; color:#C89D4A; margin-left:24px;">
+                  <i class="fas fa-box"></i> (-) Custos das Mercadorias Vendidas:
+                  <span style="color:#FFA500;">{custo_mercadorias}</span>
+                </li>
+                <hr style="border: 1px dashed #C89D4A; margin: 12px 0;">
+                <li style="padding:8px 0; color:#C89D4A;">
+                  <i class="fas fa-chart-line"></i> <b>Lucro Bruto:</b>
+                  <span style="color:{'#00FFAA' if valores_dre["lucro_bruto"] >= 0 else '#FF5555'};">{lucro_bruto}</span>
+                </li>
+                <li style="padding:8px 0; color:#C89D4A; margin-left:24px;">
+                  <i class="fas fa-money-bill-wave"></i> (-) Despesas Administrativas:
+                  <span style="color:#FFA500;">{despesas}</span>
+                </li>
+                <hr style="border: 1px dashed #C89D4A; margin: 12px 0;">
+                <li style="padding:8px 0; color:#C89D4A;">
+                  <i class="fas fa-coins"></i> <b>Resultado Líquido do Exercício:</b>
+                  <span style="color:{'#00FFAA' if valores_dre["resultado_liquido"] >= 0 else '#FF5555'};">{resultado_liquido}</span>
+                </li>
+              </ul>
+            </div>
+            """, unsafe_allow_html=True)
+
+    elif filtro_grafico == "✅ Validação das Notas":
+        bloco_visual(
+            "Validação das Notas",
+            "clipboard-check",
+            "Valores que a limpeza zera sem avisar, meses inválidos, ICMS fora de base × alíquota, alíquotas e UFs "
+            "inesperadas e notas duplicadas, em todas as notas (não só no período). <i class='fas fa-info-circle'></i>"
+        )
+        versao = grafo["versao_notas"]
+        validacao = validar_notas(dados_cliente, versao)
+        resumo = validacao.resumo()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Linhas verificadas", f"{sum(validacao.linhas.values()):,}")
+        col2.metric("Ocorrências", f"{validacao.ocorrencias:,}")
+        col3.metric("Regras com ocorrência", resumo['Regra'].nunique())
+        if resumo.empty:
+            st.success("Nenhum problema encontrado nas notas.")
+        else:
+            st.dataframe(resumo, hide_index=True, use_container_width=True)
+            excecoes = validacao.excecoes()
+            st.markdown("<h3><i class='fas fa-list'></i> Exceções</h3>", unsafe_allow_html=True)
+            st.dataframe(excecoes.head(1_000), hide_index=True, use_container_width=True)
+            st.caption(f"Mostrando {min(len(excecoes), 1_000):,} de {len(excecoes):,} exceções"
+                       + (f" (lista cortada em {len(excecoes):,}; as contagens acima são completas)" if validacao.truncada else ""))
+            formato = st.radio("Formato do arquivo:", list(FORMATOS), horizontal=True, key="formato_validacao")
+            dados, extensao, mime = exportar_validacao(dados_cliente, versao, formato)
+            st.download_button(f"Baixar lista de exceções ({formato})", dados,
+                               file_name=f"Excecoes_Notas.{extensao}", mime=mime)
+
+    elif filtro_grafico == "🔎 Consulta SQL":
+        bloco_visual(
+            "Consulta SQL",
+            "database",
+            "Consultas livres sobre as notas e a contabilidade já carregadas: valores em reais, no máximo "
+            "o limite de linhas escolhido. <i class='fas fa-info-circle'></i>"
+        )
+        if not consulta.disponivel():
+            st.info("Consulta SQL indisponível: instale o pacote duckdb.")
+        else:
+            tabelas, versoes = tabelas_consulta()
+            with st.expander("Tabelas disponíveis"):
+                for nome, colunas in esquema_consulta(tabelas, versoes).items():
+                    st.markdown(f"**{nome}**: " + ", ".join(f"`{coluna}` {tipo}" for coluna, tipo in colunas))
+            sql = st.text_area("SQL:", key="sql", height=150,
+                               value='SELECT "CFOP", "UF do Destinatário", SUM("Valor Total") AS total\n'
+                                     'FROM saidas GROUP BY ALL ORDER BY total DESC')
+            limite = st.number_input("Limite de linhas:", min_value=1, max_value=1_000_000,
+                                     value=consulta.LIMITE_LINHAS, step=1_000, key="sql_limite")
+            pedido = (sql, int(limite), versoes)
+            if st.button("Executar consulta"):
+                st.session_state["consulta_sql"] = pedido
+            # Resultados em cache por (SQL, limite, versões dos dados): repetir a consulta não reexecuta
+            if st.session_state.get("consulta_sql") == pedido:
+                try:
+                    with perfil.etapa("consulta SQL"):
+                        resultado, truncado, segundos = executar_consulta(tabelas, *pedido)
+                except (consulta.ErroConsulta, TimeoutError) as erro:
+                    st.error(str(erro))
+                else:
+                    st.caption(f"{resultado.num_rows:,} linhas em {segundos:.2f} s"
+                               + (f" · resultado cortado em {int(limite):,} linhas" if truncado else ""))
+                    st.dataframe(resultado, use_container_width=True)
+                    st.download_button("Baixar resultado (.parquet)", consulta.para_parquet(resultado),
+                                       file_name="consulta.parquet", mime="application/octet-stream")
+                    if st.checkbox("Converter para pandas (resumo e exportação)", key="sql_pandas"):
+                        df_consulta = resultado.to_pandas()
+                        st.dataframe(df_consulta.describe(), use_container_width=True)
+                        formato_sql = st.radio("Formato do arquivo:", list(FORMATOS), horizontal=True, key="sql_formato")
+                        dados, extensao, mime = exportar({"Consulta": df_consulta}, formato_sql)
+                        st.download_button(f"Baixar resultado ({formato_sql})", dados,
+                                           file_name=f"consulta.{extensao}", mime=mime)
 
 # =========================
 # 13. RODAPÉ INSTITUCIONAL
@@ -574,4 +819,49 @@ st.markdown("""
 <div class="rodape">
     <i class="fas fa-building"></i> Neto Contabilidade &nbsp;|&nbsp; Powered by GH Sistemas
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# =========================
+# 14. PAINEL DE DESEMPENHO
+# =========================
+CAMINHO_PERFIL = PASTA_CACHE / "perfil.jsonl"
+# Com os dados do cliente já carregados nesta execução, o pool mede o tamanho e descarta o excedente
+pool_clientes().medir(cliente)
+with st.sidebar.expander("⏱️ Desempenho"):
+    st.checkbox("Medir pico de memória", key="perfil_memoria",
+                help="Usa tracemalloc; deixa o dashboard mais lento enquanto ligado. O pico é do processo "
+                     "todo durante a etapa, incluindo outras sessões abertas ao mesmo tempo.")
+    gravar_perfil = st.checkbox("Gravar medições em perfil.jsonl", key="perfil_gravar")
+    st.dataframe(perfil.tabela(), hide_index=True, use_container_width=True)
+    if perfil.medir_memoria:
+        st.caption("pico_mb: pico de memória do processo durante a etapa (todas as sessões).")
+    st.caption("Nós calculados: " + ", ".join(grafo.calculados()))
+    pool = pool_clientes().estatisticas()
+    st.caption(f"Clientes em memória: {', '.join(pool['clientes'])} ({pool['bytes'] / 2**20:.1f} de "
+               f"{pool['limite'] / 2**20:.0f} MB) · acertos {pool['acertos']} · faltas {pool['faltas']} · "
+               f"descartes {pool['descartes']}")
+    cache = cache_figuras().estatisticas()
+    st.caption(f"Figuras em cache: {cache['itens']} ({cache['bytes'] / 2**20:.1f} de {cache['limite'] / 2**20:.0f} MB) · "
+               f"acertos {cache['acertos']} · faltas {cache['faltas']} · descartes {cache['descartes']}")
+    if gravar_perfil:
+        sessao = st.session_state.setdefault("sessao", uuid.uuid4().hex[:8])
+        perfil.gravar(CAMINHO_PERFIL, relatorio=filtro_grafico, periodo=filtro_periodo, sessao=sessao)
+        st.caption("p50 / p95 por relatório (todas as sessões)")
+        st.dataframe(resumo_percentis(CAMINHO_PERFIL), hide_index=True, use_container_width=True)
+perfil.encerrar()
+
+# =========================
+# 15. ATUALIZAÇÃO AUTOMÁTICA
+# =========================
+if st.sidebar.checkbox("🔄 Atualização automática", key="auto_atualizar",
+                       help="Recarrega os relatórios assim que chegam notas novas."):
+    # Versão das notas exibidas nesta execução (relatórios contábeis não chegam a carregá-las)
+    versao_exibida = grafo["notas_atualizadas"][0] if "notas_atualizadas" in grafo.calculados() else dados_cliente.notas.versao
+    atualizado = f"Atualizado às {datetime.now():%H:%M:%S}; aguardando notas novas."
+    aviso = st.sidebar.empty()
+    while True:
+        # Cada escrita na tela devolve o controle ao Streamlit: um clique do usuário ou o fechamento da
+        # sessão interrompem a espera aqui
+        aviso.caption(atualizado)
+        if vigia_notas().esperar(dados_cliente.notas, versao_exibida, INTERVALO_ATUALIZACAO):
+            st.rerun()
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Índice por competência (ano-mês) e períodos de seleção montados a partir das competências existentes."""
+import numpy as np
+import pandas as pd
+
+from ingestao import ORDEM_MESES, ordenar_por_competencia
+
+MESES = list(ORDEM_MESES)
+
+
+def rotulo_mes(competencia):
+    return f"{MESES[competencia.month - 1]}/{competencia.year}"
+
+def _ordinais(datas):
+    # Meses desde 1970-01, o mesmo número que Period('AAAA-MM', 'M').ordinal
+    return datas.to_numpy(dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+
+class IndiceCompetencias:
+    # Com as linhas ordenadas por competência, qualquer período (mês, trimestre, anos, intervalo livre)
+    # é uma fatia contígua achada por busca binária: o custo é o tamanho da fatia, não da tabela.
+    def __init__(self, df, coluna='Mês'):
+        datas = df[coluna]
+        validas = int(datas.notna().sum())
+        if not (datas.iloc[:validas].notna().all() and datas.iloc[:validas].is_monotonic_increasing):
+            df = ordenar_por_competencia(df)
+            datas = df[coluna]
+        self.df = df
+        self._ordinais = _ordinais(datas.iloc[:validas])
+
+    def __len__(self):
+        return len(self.df)
+
+    def linhas(self, inicio, fim):
+        """Linhas das competências de `inicio` a `fim` (Periods mensais, inclusive)."""
+        a = np.searchsorted(self._ordinais, inicio.ordinal, side="left")
+        b = np.searchsorted(self._ordinais, fim.ordinal, side="right")
+        return self.df.iloc[a:b]
+
+    def competencias(self):
+        return list(pd.PeriodIndex.from_ordinals(np.unique(self._ordinais), freq='M'))
+
+
+def opcoes_periodo(competencias):
+    """{rótulo: (início, fim)}: meses, trimestres, anos e o período todo, só com o que existe nos dados."""
+    competencias = sorted(set(competencias))
+    opcoes = {rotulo_mes(c): (c, c) for c in competencias}
+    for ano, trimestre in sorted({(c.year, c.quarter) for c in competencias}):
+        inicio = pd.Period(year=ano, month=3 * trimestre - 2, freq='M')
+        opcoes[f"{trimestre}º Trimestre/{ano}"] = (inicio, inicio + 2)
+    anos = sorted({c.year for c in competencias})
+    for ano in anos:
+        # O ano só acrescenta algo quando tem mais de um trimestre com dados
+        if len({c.quarter for c in competencias if c.year == ano}) > 1:
+            opcoes[f"Ano/{ano}"] = (pd.Period(year=ano, month=1, freq='M'), pd.Period(year=ano, month=12, freq='M'))
+    if len(anos) > 1:
+        opcoes[f"Todo o período ({anos[0]}-{anos[-1]})"] = (competencias[0], competencias[-1])
+    return opcoes
@@ -0,0 +1,109 @@
+"""Consultas SQL livres sobre as notas e a contabilidade já carregadas, com DuckDB em processo."""
+import threading
+import time
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import duckdb
+except ImportError:  # dependência opcional: sem ela o dashboard só não oferece a consulta SQL
+    duckdb = None
+
+# Erros de SQL (sintaxe, tabela ou coluna inexistente, permissão) que o dashboard mostra ao usuário
+ErroConsulta = duckdb.Error if duckdb is not None else RuntimeError
+
+LIMITE_LINHAS = 10_000
+TEMPO_LIMITE = 30.0
+
+# Notas guardam centavos e pontos-base; as visões mostram reais e fração, como a exportação
+VISOES_NOTAS = {
+    "entradas": "_entradas",
+    "saidas": "_saidas",
+}
+CONVERSOES_NOTAS = {'Valor Total': 100, 'Valor ICMS': 100, 'Alíquota ICMS': 10_000}
+
+
+def disponivel():
+    return duckdb is not None
+
+def _compativel(df):
+    # DuckDB não lê Period: competências vão como texto AAAA-MM (só essas colunas são copiadas)
+    colunas = [col for col in df.columns if isinstance(df[col].dtype, pd.PeriodDtype)]
+    return df.astype({col: str for col in colunas}) if colunas else df
+
+def _visao_notas(nome, origem, df):
+    conversoes = [f'"{col}" / {divisor}.0 AS "{col}"' for col, divisor in CONVERSOES_NOTAS.items() if col in df.columns]
+    substituir = f" REPLACE ({', '.join(conversoes)})" if conversoes else ""
+    return f'CREATE VIEW {nome} AS SELECT *{substituir} FROM {origem}'
+
+def _indices_com_sinal(tabela):
+    # Categóricas voltam como ENUM -> dictionary com índices uint8, que pandas e Streamlit não convertem
+    for i, campo in enumerate(tabela.schema):
+        if pa.types.is_dictionary(campo.type) and not pa.types.is_signed_integer(campo.type.index_type):
+            tipo = pa.dictionary(pa.int32(), campo.type.value_type)
+            tabela = tabela.set_column(i, campo.name, tabela.column(i).cast(tipo))
+    return tabela
+
+def conectar(tabelas):
+    """Conexão em memória com cada DataFrame de `tabelas` visível pelo nome, sem cópia.
+
+    Acesso a arquivos e extensões fica desligado e travado: a consulta só enxerga essas tabelas.
+    """
+    conexao = duckdb.connect(config={'enable_external_access': False, 'lock_configuration': True})
+    for nome, df in tabelas.items():
+        if df is None:
+            continue
+        if nome in VISOES_NOTAS:
+            conexao.register(VISOES_NOTAS[nome], _compativel(df))
+            conexao.execute(_visao_notas(nome, VISOES_NOTAS[nome], df))
+        else:
+            conexao.register(nome, _compativel(df))
+    return conexao
+
+def consultar(sql, tabelas, limite=LIMITE_LINHAS, tempo_limite=TEMPO_LIMITE):
+    """Executa `sql` e devolve (pyarrow.Table, truncado, segundos).
+
+    O resultado fica em Arrow; passar para pandas é decisão de quem chama. Acima de `tempo_limite`
+    segundos a consulta é interrompida com TimeoutError.
+    """
+    if duckdb is None:
+        raise RuntimeError("Consulta SQL indisponível: instale o pacote duckdb.")
+    conexao = conectar(tabelas)
+    relogio = threading.Timer(tempo_limite, conexao.interrupt)
+    inicio = time.perf_counter()
+    relogio.start()
+    try:
+        relacao = conexao.sql(sql.strip().rstrip(";"))
+        if relacao is None:  # comando sem resultado (CREATE, SET...)
+            relacao = conexao.sql("SELECT 'ok' AS resultado")
+        resultado = relacao.limit(limite + 1).fetch_arrow_table()
+    except duckdb.InterruptException:
+        raise TimeoutError(f"Consulta interrompida após {tempo_limite:g} s.") from None
+    finally:
+        relogio.cancel()
+        conexao.close()
+    truncado = resultado.num_rows > limite
+    resultado = _indices_com_sinal(resultado.slice(0, limite) if truncado else resultado)
+    return resultado, truncado, time.perf_counter() - inicio
+
+def esquema(tabelas):
+    """Colunas e tipos de cada tabela, como o SQL as enxerga."""
+    if duckdb is None:
+        return {}
+    conexao = conectar(tabelas)
+    try:
+        # ENUM lista todas as categorias no tipo: basta saber que é texto categórico
+        return {nome: [(coluna, "ENUM" if tipo.startswith("ENUM") else tipo)
+                       for coluna, tipo, *_ in conexao.sql(f'DESCRIBE {nome}').fetchall()]
+                for nome, df in tabelas.items() if df is not None}
+    finally:
+        conexao.close()
+
+def para_parquet(tabela):
+    # Direto do Arrow, sem passar por pandas
+    saida = BytesIO()
+    pq.write_table(tabela, saida, compression="zstd")
+    return saida.getvalue()
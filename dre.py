@@ -0,0 +1,100 @@
+"""Índice das linhas da DRE por descrição normalizada, com consulta em lote."""
+import math
+import numbers
+import unicodedata
+
+import pandas as pd
+
+
+def normalize_str(s):
+    # Remove acentos, deixa minúsculo e colapsa espaços
+    s = ''.join(c for c in unicodedata.normalize('NFD', str(s)) if unicodedata.category(c) != 'Mn').lower()
+    return ' '.join(s.split())
+
+def valor_numerico(val):
+    # Aceita número ou texto no formato "R$ 1.234,56" / "1234.56"
+    if isinstance(val, numbers.Real):
+        return 0.0 if math.isnan(val) else float(val)
+    val = str(val).replace("R$", "").replace(" ", "")
+    try:
+        if "," in val:
+            return float(val.replace(".", "").replace(",", "."))
+        return float(val)
+    except ValueError:
+        return 0.0
+
+def formatar_moeda(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+# Linhas exibidas na DRE; alternativas são tentadas em ordem
+LINHAS_DRE = {
+    "receita_bruta": "VENDA DE MERCADORIAS A VISTA",
+    "deducoes": "(-) Deduções das Receitas Operacionais",
+    "receita_liquida": "Total das Receitas Operacionais Líquidas",
+    "custo_mercadorias": "Custos das Mercadorias Vendidas",
+    "lucro_bruto": "Lucro e/ou Prejuízo Operacional Bruto",
+    "despesas": "Despesas Administrativas",
+    "resultado_liquido": [
+        "Resultado Líquido do Exercício",
+        "Lucro/Prejuízo Líquido do Exercício",
+        "Lucro/Prejuízo Líquido Antes da CSLL",
+    ],
+}
+
+
+class IndiceDRE:
+    # Uma DRE (DataFrame com 'Descrição' e 'Saldo') ou várias, em um dict {chave: DataFrame},
+    # ex.: {("CNPJ", "2025T1"): dre_df}. Descrições são normalizadas e valores convertidos uma única vez.
+    def __init__(self, dres):
+        if isinstance(dres, pd.DataFrame):
+            dres = {None: dres}
+        self.linhas = {}
+        self._exatas = {}
+        for chave, df in dres.items():
+            df = df.dropna(subset=['Descrição'])
+            linhas = [(normalize_str(desc), valor_numerico(saldo)) for desc, saldo in zip(df['Descrição'], df['Saldo'])]
+            self.linhas[chave] = linhas
+            exatas = {}
+            for desc, valor in linhas:
+                exatas.setdefault(desc, valor)
+            self._exatas[chave] = exatas
+        self._memo = {}
+
+    @property
+    def chaves(self):
+        return list(self.linhas)
+
+    def valor(self, descricao, chave=None):
+        # Exata, depois prefixo, depois trecho da descrição; None se a linha não existe
+        alvo = normalize_str(descricao)
+        memo = (chave, alvo)
+        if memo not in self._memo:
+            valor = self._exatas[chave].get(alvo)
+            if valor is None:
+                linhas = self.linhas[chave]
+                valor = next((v for desc, v in linhas if desc.startswith(alvo)), None)
+                if valor is None:
+                    valor = next((v for desc, v in linhas if alvo in desc), None)
+            self._memo[memo] = valor
+        return self._memo[memo]
+
+    def resolver(self, pedidas, chave=None):
+        """Resolve {nome: descrição ou [alternativas]} de uma vez.
+
+        Entre alternativas vale a primeira encontrada com saldo diferente de zero; linhas ausentes valem 0.0.
+        """
+        resultado = {}
+        for nome, alternativas in pedidas.items():
+            if isinstance(alternativas, str):
+                alternativas = [alternativas]
+            resultado[nome] = 0.0
+            for descricao in alternativas:
+                valor = self.valor(descricao, chave)
+                if valor:
+                    resultado[nome] = valor
+                    break
+        return resultado
+
+    def resolver_todas(self, pedidas):
+        # Uma linha por chave (empresa/trimestre), uma coluna por linha pedida
+        return pd.DataFrame.from_dict({chave: self.resolver(pedidas, chave) for chave in self.chaves}, orient='index')
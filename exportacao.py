@@ -0,0 +1,74 @@
+"""Exportação dos relatórios em lotes: xlsx em modo de memória constante, CSV ou Parquet compactados."""
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+import xlsxwriter
+
+TAMANHO_LOTE = 20_000
+
+
+def _lotes(df, tamanho=TAMANHO_LOTE):
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+def _sem_periodos(df):
+    # Competências (Period) são gravadas como texto "AAAA-MM"
+    colunas = [col for col in df.columns if isinstance(df[col].dtype, pd.PeriodDtype)]
+    return df.astype({col: str for col in colunas}) if colunas else df
+
+def _celulas(lote):
+    # astype(object) converte para tipos Python (int, float, Timestamp) que o xlsxwriter entende
+    lote = _sem_periodos(lote).astype(object)
+    return lote.where(lote.notna(), None).itertuples(index=False, name=None)
+
+def gravar_xlsx(saida, abas, linha_cabecalho=None):
+    # saida: caminho ou arquivo binário; linha_cabecalho: {aba: linha} para abas com linhas em branco no topo
+    linha_cabecalho = linha_cabecalho or {}
+    # constant_memory grava cada linha em arquivo temporário assim que a próxima começa
+    workbook = xlsxwriter.Workbook(saida, {'constant_memory': True, 'default_date_format': 'dd/mm/yyyy'})
+    cabecalho = workbook.add_format({'bold': True})
+    for nome, df in abas.items():
+        sheet = workbook.add_worksheet(nome[:31])
+        linha = linha_cabecalho.get(nome, 0)
+        sheet.write_row(linha, 0, [str(col) for col in df.columns], cabecalho)
+        linha += 1
+        for lote in _lotes(df):
+            for valores in _celulas(lote):
+                sheet.write_row(linha, 0, valores)
+                linha += 1
+    workbook.close()
+
+def gerar_xlsx(abas):
+    output = BytesIO()
+    gravar_xlsx(output, abas)
+    return output.getvalue()
+
+def gerar_csv_zip(abas):
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as pacote:
+        for nome, df in abas.items():
+            with pacote.open(f"{nome}.csv", "w") as arquivo:
+                for i, lote in enumerate(_lotes(df)):
+                    arquivo.write(lote.to_csv(index=False, header=(i == 0), sep=";", decimal=",").encode("utf-8-sig" if i == 0 else "utf-8"))
+                if len(df) == 0:
+                    arquivo.write(df.to_csv(index=False, sep=";").encode("utf-8-sig"))
+    return output.getvalue()
+
+def gerar_parquet_zip(abas):
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as pacote:
+        for nome, df in abas.items():
+            with pacote.open(f"{nome}.parquet", "w") as arquivo:
+                _sem_periodos(df).to_parquet(arquivo, index=False, compression="zstd")
+    return output.getvalue()
+
+FORMATOS = {
+    "Excel (.xlsx)": (gerar_xlsx, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV compactado (.zip)": (gerar_csv_zip, "csv.zip", "application/zip"),
+    "Parquet compactado (.zip)": (gerar_parquet_zip, "parquet.zip", "application/zip"),
+}
+
+def exportar(abas, formato):
+    gerador, extensao, mime = FORMATOS[formato]
+    return gerador(abas), extensao, mime
@@ -0,0 +1,70 @@
+"""Cache LRU de figuras prontas do dashboard, com limite de tamanho em bytes."""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+LIMITE_PADRAO = 64 * 2**20
+
+
+def _bytes(valor):
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sum(len(chave) + _bytes(item) for chave, item in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sum(_bytes(item) for item in valor)
+    if isinstance(valor, str):
+        return len(valor)
+    return 8
+
+def tamanho_figuras(valor):
+    # Estimativa do que a figura ocupa (arrays, textos, números dos traços e do layout), medida uma vez
+    # quando ela entra no cache, sem serializar para JSON
+    figuras = valor if isinstance(valor, tuple) else (valor,)
+    return sum(_bytes(figura.to_dict()) for figura in figuras)
+
+
+class CacheFiguras:
+    # Um por processo, compartilhado pelas sessões. A chave leva relatório, período e versão dos dados,
+    # então voltar a uma tela já vista não refaz as agregações nem a montagem da figura; a conversão
+    # para JSON continua a cada exibição, no st.plotly_chart. As figuras guardadas não são alteradas
+    # depois de entrarem: st.plotly_chart só lê (to_dict devolve uma cópia).
+    def __init__(self, limite_bytes=LIMITE_PADRAO):
+        self.limite_bytes = limite_bytes
+        self.tamanho = 0
+        self.acertos = self.faltas = self.descartes = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construir):
+        """Figura (ou tupla de figuras) da chave; chama construir() só se ela não estiver no cache."""
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave][0]
+            self.faltas += 1
+        # Construção fora da trava: outras sessões seguem atendidas enquanto isso
+        valor = construir()
+        tamanho = tamanho_figuras(valor)
+        with self._trava:
+            if chave in self._itens or tamanho > self.limite_bytes:
+                return valor
+            self._itens[chave] = (valor, tamanho)
+            self.tamanho += tamanho
+            while self.tamanho > self.limite_bytes:
+                _, (_, descartado) = self._itens.popitem(last=False)
+                self.tamanho -= descartado
+                self.descartes += 1
+        return valor
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.tamanho = 0
+
+    def estatisticas(self):
+        with self._trava:
+            return {'itens': len(self._itens), 'bytes': self.tamanho, 'limite': self.limite_bytes,
+                    'acertos': self.acertos, 'faltas': self.faltas, 'descartes': self.descartes}
@@ -0,0 +1,163 @@
+"""Gera planilhas sintéticas de notas e contabilidade no mesmo layout das planilhas reais.
+
+    python gerador_dados.py dados_sinteticos --linhas 10000 100000 1000000
+
+Cada tamanho vira uma subpasta (10k/, 100k/, 1M/) com notas_processadas1.xlsx e Contabilidade.xlsx,
+no formato esperado pelo dashboard e por lote.py.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from exportacao import gravar_xlsx
+
+UF_EMPRESA = "GO"
+UFS = np.array(["SP", "GO", "PE", "MA", "RJ", "MG", "BA", "PR", "DF", "SC", "RS", "ES", "CE", "PA", "MT", "MS"])
+PESOS_UF = np.array([30, 20, 10, 8, 6, 6, 4, 3, 3, 2, 2, 2, 1, 1, 1, 1], dtype=float)
+ALIQUOTAS_ENTRADA = np.array([0.0, 0.04, 0.07, 0.12, 0.19])
+PRODUTOS = np.array([
+    "GESSO FUNDICAO", "PLACA DE GESSO", "CHAPA CIMENTICIA 06MM DECORLIT", "MONTANTE DE 90MM 3M",
+    "CHAPA ST 12,5MM 1,20X3,00M TREVO", "PERFIL GUIA 48MM", "PARAFUSO TRONCONICO 25MM", "FITA DE PAPEL 150M",
+])
+NCMS = np.array([25202090, 68091100, 68118200, 72166190, 68091100, 72166190, 73181500, 48239099])
+REGIMES = np.array(["Normal", "Simples Nacional"])
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto",
+         "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+
+def rotulo_linhas(linhas):
+    if linhas >= 1_000_000 and linhas % 1_000_000 == 0:
+        return f"{linhas // 1_000_000}M"
+    if linhas >= 1_000 and linhas % 1_000 == 0:
+        return f"{linhas // 1_000}k"
+    return str(linhas)
+
+def _datas(rng, n, competencias):
+    inicio = competencias[0].start_time
+    dias = ((competencias[-1] + 1).start_time - inicio).days
+    return (inicio + pd.to_timedelta(np.sort(rng.integers(0, dias, n)), unit="D")).to_series(index=range(n))
+
+def _notas(rng, n, competencias, direcao):
+    datas = _datas(rng, n, competencias)
+    produto = rng.integers(0, len(PRODUTOS), n)
+    quantidade = rng.integers(1, 200, n)
+    unitario = np.round(rng.lognormal(3.5, 1.0, n), 2)
+    valor_total = np.round(quantidade * unitario, 2)
+    uf = rng.choice(UFS, n, p=PESOS_UF / PESOS_UF.sum())
+    if direcao == "Entrada":
+        aliquota = rng.choice(ALIQUOTAS_ENTRADA, n)
+    else:
+        aliquota = np.where(uf == UF_EMPRESA, 0.19, 0.12)
+    participantes = rng.integers(0, max(10, n // 50), n)
+    # Itens da mesma nota compartilham número e data: em média 5 itens por nota
+    numero = np.cumsum(rng.random(n) < 0.2) + 1
+    df = pd.DataFrame({
+        'Número NF': numero,
+        'Mês': datas.dt.strftime("%m/%Y").to_numpy(),
+        'Data de Emissão': datas.dt.strftime("%d/%m/%Y").to_numpy(),
+    })
+    if direcao == "Entrada":
+        df['Regime '] = rng.choice(REGIMES, n, p=[0.85, 0.15])
+        df['CNPJ Emitente'] = 10_000_000_000_000 + participantes * 1_000_117
+        df['Nome Emitente'] = [f"FORNECEDOR {p:05d} LTDA" for p in participantes]
+        df['UF do Emitente'] = uf
+        df = df[['Número NF', 'Regime ', 'Mês', 'Data de Emissão', 'CNPJ Emitente', 'Nome Emitente', 'UF do Emitente']]
+    else:
+        df['Nome Emitente'] = "GH SISTEMAS CONSTRUTIVOS LTDA"
+        df['CNPJ Destinatário'] = 20_000_000_000_000 + participantes * 1_000_117
+        df['Nome Destinatário'] = [f"CLIENTE {p:05d} LTDA" for p in participantes]
+        df['UF do Destinatário'] = uf
+    df['Produto'] = PRODUTOS[produto]
+    df['NCM'] = NCMS[produto]
+    if direcao == "Saída":
+        df['CFOP'] = np.where(uf == UF_EMPRESA, 5102, 6102)
+        df['Valor Unitário'] = unitario
+    df['Valor Total'] = valor_total
+    if direcao == "Entrada":
+        df['Alíquota ICMS'] = aliquota
+        df['Valor ICMS'] = np.round(valor_total * aliquota, 2)
+    else:
+        df['Valor ICMS'] = np.round(valor_total * aliquota, 2)
+        df['Alíquota ICMS'] = aliquota
+    return df
+
+def gerar_notas(linhas, competencias, seed=42):
+    rng = np.random.default_rng(seed)
+    n_entradas = int(linhas * 0.4)
+    return _notas(rng, n_entradas, competencias, "Entrada"), _notas(rng, linhas - n_entradas, competencias, "Saída")
+
+def gerar_contabilidade(entradas, saidas, competencias, seed=42):
+    rng = np.random.default_rng(seed + 1)
+    # Caixa: um lançamento por dia com vendas e outro com compras
+    dias = pd.date_range(competencias[0].start_time, (competencias[-1] + 1).start_time - pd.Timedelta(days=1), freq="D")
+    vendas = pd.DataFrame({'Data': dias, 'Descricao': "VENDAS DE MERCADORIAS NESTA DATA",
+                           'Entradas': np.round(rng.gamma(2.0, 4000, len(dias)), 2), 'Saídas': 0.0})
+    compras = pd.DataFrame({'Data': dias, 'Descricao': "COMPRAS DE MERCADORIAS NESTA DATA",
+                            'Entradas': 0.0, 'Saídas': np.round(rng.gamma(2.0, 4200, len(dias)), 2)})
+    caixa = pd.concat([vendas, compras]).sort_values('Data', kind="stable", ignore_index=True)
+    caixa['Saldo'] = np.round((caixa['Entradas'] - caixa['Saídas']).cumsum(), 2)
+
+    # PIS/COFINS no regime não cumulativo (1,65% + 7,6%) sobre o valor das notas do mês
+    credito = entradas.groupby('Mês', sort=False)['Valor Total'].sum() * 0.0925
+    debito = saidas.groupby('Mês', sort=False)['Valor Total'].sum() * 0.0925
+    rotulos = [c.strftime("%m/%Y") for c in competencias]
+    credito, debito = credito.reindex(rotulos, fill_value=0).round(2), debito.reindex(rotulos, fill_value=0).round(2)
+    piscofins = pd.DataFrame({
+        'Mês': [MESES[c.month - 1] for c in competencias],
+        'Imposto': "PIS/COFINS",
+        'Crédito': credito.to_numpy(),
+        'Débito': debito.to_numpy(),
+        'Saldo': (debito - credito).cumsum().round(2).to_numpy(),
+    })
+
+    receita = round(saidas['Valor Total'].sum(), 2)
+    compras_total = round(entradas['Valor Total'].sum(), 2)
+    deducoes = round(-receita * 0.2, 2)
+    custo = round(-compras_total * 0.8, 2)
+    despesas = round(-receita * 0.05, 2)
+    lucro_bruto = round(receita + deducoes + custo, 2)
+    resultado = round(lucro_bruto + despesas, 2)
+    linhas_dre = [
+        ("Receita Operacional", 0.0),
+        ("VENDA DE MERCADORIAS A VISTA", receita),
+        ("(-) Deduções das Receitas Operacionais", deducoes),
+        ("Total das Receitas Operacionais Líquidas", round(receita + deducoes, 2)),
+        ("Custos das Mercadorias Vendidas", custo),
+        ("Lucro e/ou Prejuízo Operacional Bruto", lucro_bruto),
+        ("Despesas Administrativas", despesas),
+        ("Resultado Operacional", resultado),
+        ("Lucro/Prejuízo Líquido do Exercício", resultado),
+        ("Resultado Líquido do Exercício", resultado),
+    ]
+    dre = pd.DataFrame(linhas_dre, columns=['Descrição', 'Saldo'])
+    dre.insert(1, 'Valor', dre['Saldo'])
+    return caixa, piscofins, dre
+
+def gravar_planilhas(destino, linhas, competencias, seed=42):
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    entradas, saidas = gerar_notas(linhas, competencias, seed)
+    caixa, piscofins, dre = gerar_contabilidade(entradas, saidas, competencias, seed)
+    # A aba de entradas real tem uma linha em branco antes do cabeçalho
+    gravar_xlsx(destino / "notas_processadas1.xlsx", {"Todas Entradas": entradas, "Todas Saídas": saidas},
+                linha_cabecalho={"Todas Entradas": 1})
+    gravar_xlsx(destino / "Contabilidade.xlsx", {"Caixa": caixa, "PISCOFINS": piscofins, "DRE 1º Trimestre": dre})
+    return destino
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera planilhas sintéticas de notas e contabilidade.")
+    parser.add_argument("destino")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--inicio", default="2025-01", help="primeira competência (AAAA-MM)")
+    parser.add_argument("--meses", type=int, default=3, help="quantidade de competências")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    competencias = list(pd.period_range(args.inicio, periods=args.meses, freq="M"))
+    for linhas in args.linhas:
+        pasta = gravar_planilhas(Path(args.destino) / rotulo_linhas(linhas), linhas, competencias, args.seed)
+        print(f"{linhas} linhas em {pasta}")
+
+if __name__ == "__main__":
+    main()
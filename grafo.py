@@ -0,0 +1,29 @@
+"""Grafo de dependências com avaliação preguiçosa para os relatórios do dashboard."""
+from contextlib import nullcontext
+
+
+class Grafo:
+    # Cada nó é uma função das saídas de outros nós. Nada é calculado até alguém pedir um nó,
+    # e cada nó é calculado no máximo uma vez por execução do script.
+    def __init__(self, perfil=None):
+        self.perfil = perfil
+        self._nos = {}
+        self._valores = {}
+
+    def definir(self, nome, funcao, depende=()):
+        self._nos[nome] = (funcao, tuple(depende))
+
+    def __getitem__(self, nome):
+        if nome not in self._valores:
+            funcao, depende = self._nos[nome]
+            argumentos = [self[dep] for dep in depende]
+            medicao = self.perfil.etapa(nome) if self.perfil else nullcontext({})
+            with medicao as etapa:
+                valor = funcao(*argumentos)
+                if hasattr(valor, "__len__") and not isinstance(valor, (tuple, dict, str)):
+                    etapa['linhas'] = len(valor)
+            self._valores[nome] = valor
+        return self._valores[nome]
+
+    def calculados(self):
+        return list(self._valores)
@@ -0,0 +1,211 @@
+"""Notas mantidas em memória e atualizadas por acréscimo, e observação de uma pasta de entrada."""
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from apuracao import apurar_icms, carregar_checkpoints, reapurar, salvar_checkpoints
+from ingestao import (competencias_armazenadas, concatenar_notas, geracao_armazem, intercalar_notas, ler_direcao,
+                      ordenar_por_competencia, partes_gravadas)
+
+ARQUIVO_CHECKPOINTS = "apuracao.parquet"
+
+
+def _alterados(arquivos):
+    # Competências tocadas por partes do armazenamento, pelo nome da partição
+    competencias = {arquivo.parent.name.split("=", 1)[1] for arquivo in arquivos} - {"sem_data"}
+    return pd.DataFrame({'Mês': pd.PeriodIndex(sorted(competencias), freq='M')})
+
+
+class NotasIncrementais:
+    # Uma instância por processo, compartilhada pelas sessões do dashboard. Cada atualizar() lê só as
+    # partes novas do armazenamento particionado e reapura só as competências que elas tocam.
+    # A apuração fica gravada junto do armazenamento (ARQUIVO_CHECKPOINTS) com a lista das partes de
+    # que saiu: ao abrir de novo, só as competências das partes que chegaram depois são reapuradas.
+    def __init__(self, pasta, sincronizar=None, colunas=None):
+        self.pasta = Path(pasta)
+        self.sincronizar = sincronizar
+        self.colunas = colunas
+        self.versao = 0
+        self._trava = threading.Lock()
+        self._limpar()
+
+    def _limpar(self):
+        self.geracao = None
+        self.entradas = self.saidas = self.apuracao = None
+        self._lidas = set()
+
+    def atualizar(self):
+        """Incorpora as partes novas; devolve True se algo mudou."""
+        with self._trava:
+            if self.sincronizar:
+                self.sincronizar()
+            geracao = geracao_armazem(self.pasta)
+            if geracao != self.geracao:
+                # Armazenamento refeito (planilha editada no meio): recarrega tudo
+                self._limpar()
+                self.geracao = geracao
+                self.entradas = ler_direcao(self.pasta / "entradas", self.colunas)
+                self.saidas = ler_direcao(self.pasta / "saidas", self.colunas)
+                self._lidas = set(self._partes())
+                if self.entradas is not None and self.saidas is not None:
+                    self.apuracao = self._apuracao_gravada()
+                    self._gravar_apuracao()
+                self.versao += 1
+                return True
+
+            novas = [arquivo for arquivo in self._partes() if arquivo not in self._lidas]
+            if not novas:
+                return False
+            for direcao in ("entradas", "saidas"):
+                arquivos = [arquivo for arquivo in novas if arquivo.parent.parent.name == direcao]
+                if not arquivos:
+                    continue
+                lidas = ordenar_por_competencia(concatenar_notas([pd.read_parquet(arquivo) for arquivo in arquivos]))
+                atual = getattr(self, direcao)
+                # Só as notas novas são ordenadas; a tabela existente recebe as linhas no lugar
+                setattr(self, direcao, lidas if atual is None else intercalar_notas(atual, lidas))
+            self._lidas.update(novas)
+            if self.entradas is not None and self.saidas is not None:
+                if self.apuracao is None:
+                    self.apuracao = apurar_icms(self.entradas, self.saidas)
+                else:
+                    self.apuracao = reapurar(self.apuracao, self.entradas, self.saidas, _alterados(novas))
+                self._gravar_apuracao()
+            self.versao += 1
+            return True
+
+    def _estado_partes(self):
+        # Partes só são acrescentadas; tamanho e data pegam uma parte regravada com o mesmo nome
+        return {arquivo.relative_to(self.pasta).as_posix(): [info.st_size, info.st_mtime_ns]
+                for arquivo in sorted(self._lidas) for info in [arquivo.stat()]}
+
+    def _apuracao_gravada(self):
+        # Checkpoints da mesma geração, com todas as suas partes intactas, valem até a última parte que
+        # cobriam; qualquer divergência (ou arquivo ausente ou ilegível) volta à apuração completa.
+        try:
+            checkpoints, metadados = carregar_checkpoints(self.pasta / ARQUIVO_CHECKPOINTS)
+        except (OSError, ValueError):
+            return apurar_icms(self.entradas, self.saidas)
+        partes = self._estado_partes()
+        anteriores = (metadados or {}).get("partes", {})
+        if (metadados or {}).get("geracao") != self.geracao or any(partes.get(nome) != estado for nome, estado in anteriores.items()):
+            return apurar_icms(self.entradas, self.saidas)
+        novas = [self.pasta / nome for nome in partes if nome not in anteriores]
+        return reapurar(checkpoints, self.entradas, self.saidas, _alterados(novas))
+
+    def _gravar_apuracao(self):
+        try:
+            salvar_checkpoints(self.apuracao, self.pasta / ARQUIVO_CHECKPOINTS,
+                               {"geracao": self.geracao, "partes": self._estado_partes()})
+        except OSError:
+            pass  # sem permissão de escrita: a próxima abertura só apura tudo de novo
+
+    def competencias(self):
+        # Pelos nomes das partições, sem sincronizar nem ler notas: quem precisa delas em dia chama atualizar() antes
+        return competencias_armazenadas(self.pasta)
+
+    def _partes(self):
+        return [*partes_gravadas(self.pasta / "entradas"), *partes_gravadas(self.pasta / "saidas")]
+
+    def instantaneo(self):
+        # Versão e tabelas lidas juntas: outra sessão pode atualizar no meio de uma execução
+        with self._trava:
+            return self.versao, self.entradas, self.saidas, self.apuracao
+
+
+class Observador(threading.Thread):
+    """Consulta a pasta a cada `intervalo` segundos e chama ao_chegar(arquivos) com os arquivos novos ou alterados.
+
+    Um arquivo só é entregue quando tamanho e data de modificação ficam iguais entre duas consultas,
+    para não pegar uma cópia ainda em andamento.
+    """
+
+    def __init__(self, pasta, ao_chegar, intervalo=1.0, extensoes=(".xml", ".zip")):
+        super().__init__(daemon=True, name=f"observador:{pasta}")
+        self.pasta = Path(pasta)
+        self.ao_chegar = ao_chegar
+        self.intervalo = intervalo
+        self.extensoes = extensoes
+        self.erro = None
+        self._parar = threading.Event()
+        self._vistos, self._entregues = {}, {}
+
+    def consultar(self):
+        atuais = {}
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and entrada.name.lower().endswith(self.extensoes):
+                    info = entrada.stat()
+                    atuais[entrada.path] = (info.st_size, info.st_mtime_ns)
+        prontos = [caminho for caminho, estado in atuais.items()
+                   if self._vistos.get(caminho) == estado and self._entregues.get(caminho) != estado]
+        self._vistos = atuais
+        if prontos:
+            self.ao_chegar(sorted(prontos))
+            self._entregues.update({caminho: atuais[caminho] for caminho in prontos})
+        return prontos
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                self.consultar()
+                self.erro = None
+            except Exception as e:
+                # Falha no callback não derruba a observação; o arquivo é tentado de novo
+                self.erro = f"{type(e).__name__}: {e}"
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+
+
+class Vigia(threading.Thread):
+    """Chama atualizar() das notas que alguma sessão está esperando, a cada `intervalo` segundos.
+
+    Uma só thread para o processo: cada objeto de notas é atualizado uma vez por volta, mesmo com
+    várias sessões esperando por ele. Quem chama esperar() só acorda quando a versão muda ou o tempo
+    acaba; notas que ninguém espera há algumas voltas deixam de ser consultadas.
+    """
+
+    VOLTAS_SEM_ESPERA = 5
+
+    def __init__(self, intervalo=1.0):
+        super().__init__(daemon=True, name="vigia:notas")
+        self.intervalo = intervalo
+        self._esperadas = {}
+        self._mudou = threading.Condition()
+        self._parar = threading.Event()
+
+    def esperar(self, notas, versao, tempo):
+        """Espera até `tempo` segundos; devolve True se as notas passaram da `versao`."""
+        with self._mudou:
+            self._esperadas[id(notas)] = (notas, time.monotonic())
+            return self._mudou.wait_for(lambda: notas.versao != versao, tempo)
+
+    def verificar(self):
+        limite = time.monotonic() - self.VOLTAS_SEM_ESPERA * self.intervalo
+        with self._mudou:
+            self._esperadas = {chave: item for chave, item in self._esperadas.items() if item[1] >= limite}
+            esperadas = [notas for notas, _ in self._esperadas.values()]
+        # Fora da trava: uma sincronização demorada não segura quem está esperando
+        mudaram = 0
+        for notas in esperadas:
+            try:
+                mudaram += bool(notas.atualizar())
+            except Exception:
+                pass  # planilha em gravação, arquivo preso: tenta de novo na próxima volta
+        if mudaram:
+            with self._mudou:
+                self._mudou.notify_all()
+        return mudaram
+
+    def run(self):
+        while not self._parar.is_set():
+            self.verificar()
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
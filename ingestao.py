@@ -0,0 +1,386 @@
+"""Leitura das planilhas com cache colunar (Parquet) em disco."""
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PASTA_CACHE = Path(os.environ.get("ANALISE_CACHE", ".cache_dados"))
+# Incrementar sempre que as regras de limpeza mudarem, para invalidar o cache antigo
+VERSAO_LIMPEZA = 6
+
+
+# =========================
+# LIMPEZA DAS ABAS
+# =========================
+def limpar_colunas(df):
+    df = df.loc[:, ~df.columns.to_series().isna()]
+    df.columns = [str(col).strip() for col in df.columns]
+    return df.loc[:, ~df.columns.str.contains("Unnamed|^\\d+$", na=False)]
+
+# Esquema compacto das notas: textos repetidos viram categoria, a alíquota fica em pontos-base
+# (1900 = 19%) e o dinheiro em centavos inteiros. Somas em centavos são exatas; a conversão para
+# reais acontece só na exibição e na exportação (notas_para_exibicao).
+COLUNAS_CATEGORICAS = [
+    'Regime', 'Data de Emissão', 'CNPJ Emitente', 'Nome Emitente', 'UF do Emitente',
+    'CNPJ Destinatário', 'Nome Destinatário', 'UF do Destinatário', 'Produto', 'NCM', 'CFOP',
+]
+# Códigos numéricos viram texto com zeros à esquerda: o Parquet só preserva categorias de texto
+DIGITOS_CODIGOS = {'CNPJ Emitente': 14, 'CNPJ Destinatário': 14, 'NCM': 8, 'CFOP': 4}
+COLUNAS_CENTAVOS = ['Valor Total', 'Valor ICMS']
+
+def para_centavos(serie):
+    # Arredondamento decimal, meio para cima como o ARRED do Excel: 1,005 vira 101 centavos. O produto
+    # em float traz o erro binário (1,005 x 100 = 100,4999...), descartado ao arredondar em 6 casas.
+    centavos = (pd.to_numeric(serie, errors='coerce').fillna(0) * 100).round(6)
+    return (np.sign(centavos) * np.floor(centavos.abs() + 0.5)).astype('int64')
+
+def para_pontos_base(serie):
+    # int32, não int16: uma planilha com a alíquota em percentual (18 em vez de 0,18) daria a volta em
+    # silêncio. O valor fica como veio e a validação das notas aponta a alíquota fora da faixa.
+    pontos = (pd.to_numeric(serie, errors='coerce').fillna(0) * 10_000).round()
+    limites = np.iinfo(np.int32)
+    fora = ~pontos.between(limites.min, limites.max)
+    if fora.any():
+        raise ValueError(f"Alíquota ICMS fora da faixa: {serie[fora].iloc[0]!r} ({int(fora.sum())} linhas)")
+    return pontos.astype('int32')
+
+def para_categoria(serie, digitos=None):
+    if digitos and pd.api.types.is_numeric_dtype(serie):
+        serie = serie.map({valor: str(int(valor)).zfill(digitos) for valor in serie.dropna().unique()})
+    return serie.astype('category')
+
+def converter_mes(serie):
+    # Competência das planilhas ("01/2025"); células de data e colunas já convertidas passam como estão
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    return pd.to_datetime(serie, format="%m/%Y", errors='coerce')
+
+def limpar_notas(df):
+    df = _compativel_parquet(limpar_colunas(df))
+    df['Mês'] = converter_mes(df['Mês'])
+    for col in COLUNAS_CENTAVOS:
+        df[col] = para_centavos(df[col])
+    df['Alíquota ICMS'] = para_pontos_base(df['Alíquota ICMS'])
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = para_categoria(df[col], DIGITOS_CODIGOS.get(col))
+    return df
+
+def notas_para_exibicao(df):
+    # Centavos -> reais e pontos-base -> fração, como nas planilhas de origem
+    convertidas = {col: df[col] / 100 for col in COLUNAS_CENTAVOS if col in df.columns}
+    if 'Alíquota ICMS' in df.columns:
+        convertidas['Alíquota ICMS'] = df['Alíquota ICMS'] / 10_000
+    return df.assign(**convertidas)
+
+def limpar_caixa(df):
+    df = limpar_colunas(df)
+    df['Entradas'] = pd.to_numeric(df['Entradas'], errors='coerce').fillna(0)
+    df['Saídas'] = pd.to_numeric(df['Saídas'], errors='coerce').fillna(0)
+    df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
+    df['Valor Líquido'] = df['Entradas'] - df['Saídas']
+    return df
+
+ORDEM_MESES = {
+    "Janeiro": 1, "Fevereiro": 2, "Março": 3, "Abril": 4, "Maio": 5, "Junho": 6,
+    "Julho": 7, "Agosto": 8, "Setembro": 9, "Outubro": 10, "Novembro": 11, "Dezembro": 12,
+}
+
+def limpar_piscofins(df):
+    df = limpar_colunas(df)
+    df['Ordem'] = df['Mês'].map(ORDEM_MESES)
+    return df
+
+ABAS_NOTAS = {
+    "Todas Entradas": {"skiprows": 1, "limpeza": limpar_notas, "direcao": "entradas"},
+    "Todas Saídas": {"limpeza": limpar_notas, "direcao": "saidas"},
+}
+ABAS_CONTABILIDADE = {
+    "Caixa": {"limpeza": limpar_caixa},
+    "PISCOFINS": {"limpeza": limpar_piscofins},
+    "DRE 1º Trimestre": {"limpeza": limpar_colunas},
+}
+
+
+# =========================
+# IMPRESSÃO DIGITAL DOS ARQUIVOS
+# =========================
+def _ler_manifesto():
+    try:
+        with open(PASTA_CACHE / "manifesto.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _gravar_manifesto(manifesto):
+    PASTA_CACHE.mkdir(parents=True, exist_ok=True)
+    # Sufixo com o pid: vários processos (lote.py) podem gravar ao mesmo tempo
+    temporario = PASTA_CACHE / f"manifesto.json.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=1)
+    os.replace(temporario, PASTA_CACHE / "manifesto.json")
+
+def _hash_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def impressao_digital(caminho):
+    # O hash do conteúdo só é recalculado quando mtime ou tamanho mudam
+    caminho = os.path.abspath(caminho)
+    info = os.stat(caminho)
+    manifesto = _ler_manifesto()
+    entrada = manifesto.get(caminho)
+    if entrada and entrada["mtime_ns"] == info.st_mtime_ns and entrada["tamanho"] == info.st_size:
+        return entrada["hash"]
+    conteudo = _hash_arquivo(caminho)
+    abas = entrada.get("abas") if entrada and entrada["hash"] == conteudo else None
+    manifesto[caminho] = {"mtime_ns": info.st_mtime_ns, "tamanho": info.st_size, "hash": conteudo, "abas": abas}
+    _gravar_manifesto(manifesto)
+    return conteudo
+
+
+# =========================
+# CACHE PARQUET POR ABA
+# =========================
+def _slug(texto):
+    return re.sub(r"[^0-9A-Za-z]+", "_", texto).strip("_")
+
+def _prefixo_cache(caminho, aba):
+    caminho = os.path.abspath(caminho)
+    chave_caminho = hashlib.sha1(caminho.encode("utf-8")).hexdigest()[:8]
+    return f"{_slug(Path(caminho).stem)}-{chave_caminho}-{_slug(aba)}-"
+
+def _arquivo_cache(caminho, aba, conteudo):
+    return PASTA_CACHE / f"{_prefixo_cache(caminho, aba)}{conteudo[:16]}-v{VERSAO_LIMPEZA}.parquet"
+
+def _compativel_parquet(df):
+    # Colunas object com tipos misturados (ex.: NCM numérico e texto) viram texto
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ("mixed", "mixed-integer"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def _gravar_cache(caminho, aba, conteudo, df):
+    PASTA_CACHE.mkdir(parents=True, exist_ok=True)
+    destino = _arquivo_cache(caminho, aba, conteudo)
+    for antigo in PASTA_CACHE.glob(_prefixo_cache(caminho, aba) + "*.parquet"):
+        if antigo != destino:
+            antigo.unlink(missing_ok=True)
+    temporario = destino.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, destino)
+
+def carregar_planilha(caminho, abas):
+    """Retorna {aba: DataFrame limpo}, com None para abas inexistentes na planilha."""
+    conteudo = impressao_digital(caminho)
+    manifesto = _ler_manifesto()
+    entrada = manifesto.get(os.path.abspath(caminho), {})
+    abas_existentes = entrada.get("abas")
+
+    resultado = {}
+    pendentes = []
+    for aba in abas:
+        if abas_existentes is not None and aba not in abas_existentes:
+            resultado[aba] = None
+            continue
+        arquivo = _arquivo_cache(caminho, aba, conteudo)
+        if arquivo.exists():
+            resultado[aba] = pd.read_parquet(arquivo)
+        else:
+            pendentes.append(aba)
+
+    if pendentes:
+        # Abre a planilha uma única vez para todas as abas que faltam no cache
+        with pd.ExcelFile(caminho) as xls:
+            for aba in pendentes:
+                if aba not in xls.sheet_names:
+                    resultado[aba] = None
+                    continue
+                espec = abas[aba]
+                df = pd.read_excel(xls, sheet_name=aba, skiprows=espec.get("skiprows"))
+                df = _compativel_parquet(espec.get("limpeza", limpar_colunas)(df))
+                _gravar_cache(caminho, aba, conteudo, df)
+                resultado[aba] = df
+            entrada["abas"] = list(xls.sheet_names)
+        manifesto[os.path.abspath(caminho)] = entrada
+        _gravar_manifesto(manifesto)
+    return resultado
+
+def ler_notas(caminho):
+    pasta = sincronizar_notas(caminho)
+    abas = _ler_json(pasta / "manifesto.json").get("abas", {})
+    return tuple(ler_direcao(pasta / espec["direcao"], abas[aba]["colunas"]) if aba in abas else None
+                 for aba, espec in ABAS_NOTAS.items())
+
+def ler_contabilidade(caminho):
+    abas = carregar_planilha(caminho, ABAS_CONTABILIDADE)
+    caixa, piscofins = abas["Caixa"], abas["PISCOFINS"]
+    if piscofins is not None:
+        piscofins = datar_piscofins(piscofins, caixa)
+    return caixa, piscofins, abas["DRE 1º Trimestre"]
+
+def datar_piscofins(piscofins, caixa=None):
+    # A aba traz só o nome do mês; o ano vem do caixa da mesma planilha (mesmo exercício)
+    anos = caixa['Data'].dt.year.dropna() if caixa is not None else pd.Series(dtype=float)
+    ano = int(anos.mode().iloc[0]) if len(anos) else pd.Timestamp.today().year
+    por_nome = pd.to_datetime(pd.DataFrame({'year': ano, 'month': piscofins['Ordem'], 'day': 1}), errors='coerce')
+    # Meses já com ano ("01/2025", datas) dispensam o nome
+    outros = pd.to_datetime(piscofins['Mês'].where(piscofins['Ordem'].isna()), errors='coerce', dayfirst=True)
+    return piscofins.assign(**{'Competência': por_nome.fillna(outros).dt.to_period('M')})
+
+
+# =========================
+# ARMAZENAMENTO PARTICIONADO DAS NOTAS
+# =========================
+# pasta/<entradas|saidas>/competencia=AAAA-MM/parte-NNNNN.parquet. As partes só são acrescentadas:
+# cada lote de notas novas vira uma parte em cada competência que ele toca.
+def gravar_partes(pasta, notas, numero):
+    competencia = notas['Mês'].dt.strftime("%Y-%m").fillna("sem_data")
+    for rotulo, parte in notas.groupby(competencia.to_numpy(), sort=True):
+        destino = Path(pasta) / f"competencia={rotulo}" / f"parte-{numero:05d}.parquet"
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        temporario = destino.with_suffix(f".{os.getpid()}.tmp")
+        parte.to_parquet(temporario, index=False)
+        os.replace(temporario, destino)
+
+def partes_gravadas(pasta):
+    return sorted(Path(pasta).glob("competencia=*/parte-*.parquet"), key=lambda p: (p.name, p.parent.name))
+
+def numero_da_parte(arquivo):
+    return int(Path(arquivo).stem.split("-")[1])
+
+def concatenar_notas(frames):
+    # Cada parte tem suas próprias categorias: union_categoricals junta os dicionários sem voltar a texto,
+    # em ordem alfabética (a ordem de chegada dependeria de quais partes foram lidas primeiro)
+    notas = pd.concat(frames, ignore_index=True)
+    for col in COLUNAS_CATEGORICAS:
+        if col not in notas.columns or isinstance(notas[col].dtype, pd.CategoricalDtype):
+            continue
+        try:
+            notas[col] = pd.api.types.union_categoricals([f[col] for f in frames], sort_categories=True, ignore_order=True)
+        except (KeyError, TypeError):
+            notas[col] = para_categoria(notas[col].astype(object), DIGITOS_CODIGOS.get(col))
+    return notas
+
+def ordenar_por_competencia(notas):
+    # Ordem estável por competência, notas sem data no fim: cada período vira uma fatia contígua
+    return notas.sort_values('Mês', kind="stable", na_position="last", ignore_index=True)
+
+def _chave_competencia(notas):
+    # Inteiros na ordem de ordenar_por_competencia: NaT vira o maior, como no na_position="last"
+    return np.where(notas['Mês'].isna().to_numpy(), np.iinfo(np.int64).max,
+                    notas['Mês'].to_numpy(dtype='datetime64[ns]').view('int64'))
+
+def intercalar_notas(atual, novas):
+    """`atual` (já ordenada por competência) com as notas novas no lugar, sem reordenar a tabela toda.
+
+    Só o trecho de `atual` a partir da data mais antiga das novas é reordenado junto com elas; notas
+    posteriores a todas as existentes (o caso comum) só são acrescentadas ao fim. O resultado é o
+    mesmo da ordenação estável da tabela concatenada.
+    """
+    if novas.empty:
+        return atual
+    corte = int(np.searchsorted(_chave_competencia(atual), _chave_competencia(novas).min(), side="right"))
+    cauda = [atual.iloc[corte:]] if corte < len(atual) else []
+    cauda = ordenar_por_competencia(concatenar_notas([*cauda, novas]))
+    return concatenar_notas([atual.iloc[:corte], cauda]) if corte else cauda
+
+def ler_direcao(pasta, colunas=None):
+    partes = [pd.read_parquet(arquivo) for arquivo in partes_gravadas(pasta)]
+    if partes:
+        return ordenar_por_competencia(concatenar_notas(partes))
+    return limpar_notas(pd.DataFrame(columns=colunas)) if colunas else None
+
+def competencias_armazenadas(pasta):
+    # Competências presentes, pelos nomes das partições (sem abrir os arquivos)
+    rotulos = {arquivo.parent.name.split("=", 1)[1] for direcao in ("entradas", "saidas")
+               for arquivo in partes_gravadas(Path(pasta) / direcao)}
+    return sorted(pd.Period(rotulo, freq='M') for rotulo in rotulos - {"sem_data"})
+
+
+# =========================
+# INGESTÃO INCREMENTAL DA PLANILHA DE NOTAS
+# =========================
+# Durante o mês a planilha só recebe notas no fim das abas. O xlsx precisa ser lido inteiro, mas o
+# manifesto guarda, por aba, quantas linhas já foram ingeridas e um resumo (hash) delas: se esse
+# trecho não mudou, só as linhas seguintes são limpas e gravadas. Qualquer outra mudança (edição no
+# meio, linhas apagadas, colunas novas) refaz o armazenamento numa nova geração.
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _gravar_json(caminho, dados):
+    temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=1)
+    os.replace(temporario, caminho)
+
+def geracao_armazem(pasta):
+    # Muda quando o armazenamento é refeito; leitores incrementais precisam recomeçar do zero
+    return _ler_json(Path(pasta) / "manifesto.json").get("geracao", 0)
+
+def pasta_notas(caminho):
+    return PASTA_CACHE / "notas" / _prefixo_cache(caminho, "")[:-2]
+
+def hash_linhas(df):
+    # Números como float: com linhas novas uma coluna inteira pode virar float (1 x 1.0)
+    normal = pd.DataFrame({i: df[col].astype('float64') if pd.api.types.is_numeric_dtype(df[col]) else df[col].astype(str)
+                           for i, col in enumerate(df.columns)})
+    return pd.util.hash_pandas_object(normal, index=False).to_numpy()
+
+def _resumo(hashes):
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+def sincronizar_notas(caminho):
+    """Acrescenta ao armazenamento particionado as linhas novas da planilha de notas e devolve a pasta."""
+    pasta = pasta_notas(caminho)
+    conteudo = impressao_digital(caminho)
+    manifesto = _ler_json(pasta / "manifesto.json")
+    if manifesto.get("hash") == conteudo and manifesto.get("versao") == VERSAO_LIMPEZA:
+        return pasta
+
+    with pd.ExcelFile(caminho) as xls:
+        lidas = {aba: pd.read_excel(xls, sheet_name=aba, skiprows=espec.get("skiprows"))
+                 for aba, espec in ABAS_NOTAS.items() if aba in xls.sheet_names}
+    hashes = {aba: hash_linhas(df) for aba, df in lidas.items()}
+    abas = manifesto.get("abas", {})
+    acrescimo = manifesto.get("versao", VERSAO_LIMPEZA) == VERSAO_LIMPEZA and all(
+        aba in lidas
+        and [str(col) for col in lidas[aba].columns] == anterior["colunas"]
+        and len(lidas[aba]) >= anterior["linhas"]
+        and _resumo(hashes[aba][:anterior["linhas"]]) == anterior["resumo"]
+        for aba, anterior in abas.items()
+    )
+    if not acrescimo:
+        manifesto, abas = {"geracao": manifesto.get("geracao", 0) + 1}, {}
+        shutil.rmtree(pasta, ignore_errors=True)
+    pasta.mkdir(parents=True, exist_ok=True)
+
+    # Partes com número acima do manifesto são de uma execução interrompida antes de gravá-lo
+    numero = manifesto.get("partes", 0)
+    for espec in ABAS_NOTAS.values():
+        for arquivo in partes_gravadas(pasta / espec["direcao"]):
+            if numero_da_parte(arquivo) >= numero:
+                arquivo.unlink()
+
+    for aba, df in lidas.items():
+        espec = ABAS_NOTAS[aba]
+        novas = df.iloc[abas.get(aba, {}).get("linhas", 0):]
+        if len(novas):
+            gravar_partes(pasta / espec["direcao"], espec["limpeza"](novas.copy()), numero)
+        abas[aba] = {"linhas": len(df), "colunas": [str(col) for col in df.columns], "resumo": _resumo(hashes[aba])}
+    manifesto.update({"abas": abas, "partes": numero + 1, "hash": conteudo, "versao": VERSAO_LIMPEZA})
+    _gravar_json(pasta / "manifesto.json", manifesto)
+    return pasta
@@ -0,0 +1,94 @@
+"""Geração dos relatórios de toda a carteira de clientes, sem interface.
+
+Cada subpasta da pasta de clientes é um cliente, pelo mesmo critério do dashboard (clientes.listar_clientes):
+a planilha de notas (notas_processadas1.xlsx) e/ou uma pasta nfe/ de XMLs e, opcionalmente, a
+contabilidade (Contabilidade.xlsx):
+
+    python lote.py clientes/ saida/ --workers 4 --formato xlsx
+"""
+import argparse
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from clientes import arquivos_cliente, listar_clientes
+from exportacao import gerar_parquet_zip, gerar_xlsx
+from relatorios import processar_cliente, resumo_cliente
+
+
+def descobrir_clientes(pasta):
+    clientes = []
+    for nome in listar_clientes(pasta):
+        notas, contabilidade, pasta_nfe = arquivos_cliente(Path(pasta) / nome)
+        clientes.append((nome, str(notas), str(contabilidade) if contabilidade.is_file() else None,
+                         str(pasta_nfe) if pasta_nfe else None))
+    return clientes
+
+def _falha(nome, inicio, erro, detalhe):
+    return {'Cliente': nome, 'Status': "falha", 'Tempo (s)': time.perf_counter() - inicio,
+            'Erro': f"{type(erro).__name__}: {erro}", 'Detalhe': detalhe}
+
+def processar(nome, caminho_notas, caminho_contabilidade, pasta_nfe, destino, formato):
+    # Roda no processo filho: nunca levanta exceção, devolve o status para o resumo
+    inicio = time.perf_counter()
+    try:
+        relatorios = processar_cliente(caminho_notas, caminho_contabilidade, pasta_nfe)
+        if formato == "xlsx":
+            dados, arquivo = gerar_xlsx(relatorios), Path(destino) / f"{nome}.xlsx"
+        else:
+            dados, arquivo = gerar_parquet_zip(relatorios), Path(destino) / f"{nome}.parquet.zip"
+        arquivo.write_bytes(dados)
+        return {'Cliente': nome, 'Status': "ok", 'Tempo (s)': time.perf_counter() - inicio, 'Erro': "",
+                **resumo_cliente(relatorios)}
+    except Exception as e:
+        return _falha(nome, inicio, e, traceback.format_exc())
+
+def processar_carteira(pasta_clientes, destino, workers=None, formato="xlsx"):
+    Path(destino).mkdir(parents=True, exist_ok=True)
+    clientes = descobrir_clientes(pasta_clientes)
+    resultados = []
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = {executor.submit(processar, nome, notas, contabilidade, pasta_nfe, destino, formato): nome
+                   for nome, notas, contabilidade, pasta_nfe in clientes}
+        for futuro in as_completed(futuros):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                # Processo filho morto (BrokenProcessPool, falta de memória): a falha fica no resumo do cliente
+                resultado = _falha(futuros[futuro], inicio, e, traceback.format_exc())
+            resultados.append(resultado)
+            print(f"[{resultado['Status']:>5}] {resultado['Cliente']} em {resultado['Tempo (s)']:.2f}s"
+                  + (f" - {resultado['Erro']}" if resultado['Erro'] else ""), flush=True)
+            if 'Detalhe' in resultado:
+                print(resultado['Detalhe'], file=sys.stderr)
+    resumo = pd.DataFrame(resultados, columns=list(dict.fromkeys(
+        ['Cliente', 'Status', 'Tempo (s)', 'Erro'] + [col for r in resultados for col in r if col != 'Detalhe'])))
+    resumo = resumo.sort_values('Cliente', ignore_index=True)
+    if formato == "xlsx":
+        (Path(destino) / "resumo_carteira.xlsx").write_bytes(gerar_xlsx({"Resumo": resumo}))
+    else:
+        resumo.to_parquet(Path(destino) / "resumo_carteira.parquet", index=False)
+    return resumo
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatórios fiscais e contábeis de toda a carteira.")
+    parser.add_argument("pasta_clientes", help="pasta com uma subpasta por cliente")
+    parser.add_argument("destino", help="pasta de saída dos relatórios")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processos em paralelo")
+    parser.add_argument("--formato", choices=["xlsx", "parquet"], default="xlsx")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    resumo = processar_carteira(args.pasta_clientes, args.destino, args.workers, args.formato)
+    falhas = (resumo['Status'] != "ok").sum() if len(resumo) else 0
+    print(f"{len(resumo)} clientes, {falhas} falhas, {time.perf_counter() - inicio:.2f}s no total")
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
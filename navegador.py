@@ -0,0 +1,59 @@
+"""Filtro, ordenação e paginação das notas no servidor para o navegador de notas."""
+import numpy as np
+import pandas as pd
+
+from agregacoes import aliquota_percentual
+from ingestao import notas_para_exibicao, para_centavos
+
+
+def opcoes_filtro(df, coluna_uf):
+    opcoes = {
+        "ufs": sorted(df[coluna_uf].dropna().unique().tolist()),
+        "aliquotas": sorted(aliquota_percentual(df).unique().tolist()),
+        "cfops": sorted(df['CFOP'].dropna().unique().tolist()) if 'CFOP' in df.columns else [],
+    }
+    # Faixa em reais para o slider; as notas guardam centavos
+    valores = df['Valor Total']
+    opcoes["faixa_valor"] = (float(valores.min()) / 100, float(valores.max()) / 100) if len(valores) else (0.0, 0.0)
+    return opcoes
+
+def filtrar_notas(df, coluna_uf=None, ufs=(), aliquotas=(), cfops=(), faixa_valor=None, busca=""):
+    # Retorna as posições (iloc) das notas que passam nos filtros
+    mascara = np.ones(len(df), dtype=bool)
+    if ufs:
+        mascara &= df[coluna_uf].isin(ufs).to_numpy()
+    if aliquotas:
+        mascara &= aliquota_percentual(df).isin(aliquotas).to_numpy()
+    if cfops and 'CFOP' in df.columns:
+        mascara &= df['CFOP'].isin(cfops).to_numpy()
+    if faixa_valor:
+        minimo, maximo = para_centavos(pd.Series(faixa_valor)).tolist()
+        mascara &= df['Valor Total'].between(minimo, maximo).to_numpy()
+    if busca:
+        encontrou = np.zeros(len(df), dtype=bool)
+        for col in df.columns:
+            serie = df[col]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                # Busca só nas categorias distintas e marca as linhas pelos códigos
+                categorias = serie.cat.categories.astype(str).str.contains(busca, case=False, regex=False)
+                encontrou |= np.isin(serie.cat.codes.to_numpy(), np.flatnonzero(categorias))
+            elif serie.dtype == object or isinstance(serie.dtype, pd.StringDtype):
+                encontrou |= serie.astype(str).str.contains(busca, case=False, regex=False, na=False).to_numpy()
+        mascara &= encontrou
+    return np.flatnonzero(mascara)
+
+def ordenar_posicoes(df, posicoes, coluna=None, crescente=True):
+    if not coluna or len(posicoes) == 0:
+        return posicoes
+    valores = df[coluna].iloc[posicoes]
+    if isinstance(valores.dtype, pd.CategoricalDtype) and not valores.cat.ordered:
+        # sort_values usaria os códigos (ordem das categorias); aqui vale o texto de cada categoria
+        posto = pd.Series(valores.cat.categories.astype(str)).rank(method="dense").to_numpy()
+        # Código -1 (sem valor) cai no NaN acrescentado ao fim
+        valores = pd.Series(np.append(posto, np.nan)[valores.cat.codes.to_numpy()])
+    ordem = valores.reset_index(drop=True).sort_values(ascending=crescente, kind="stable", na_position="last").index
+    return posicoes[ordem.to_numpy()]
+
+def pagina(df, posicoes, numero, tamanho):
+    inicio = (numero - 1) * tamanho
+    return notas_para_exibicao(df.iloc[posicoes[inicio:inicio + tamanho]])
@@ -0,0 +1,258 @@
+"""Ingestão direta dos XMLs de NF-e/NFC-e (pastas ou .zip) para o armazenamento Parquet do dashboard.
+
+    python nfe.py xmls/ notas_2025.zip --cnpj 12345678000199 --workers 4
+
+Os arquivos são lidos em lotes por um pool de processos, com parser em fluxo (iterparse). Cada lote
+concluído vira partes Parquet no armazenamento particionado de ingestao (entradas/saidas por competência)
+e é registrado no manifesto: uma execução interrompida recomeça dos arquivos que faltam. Notas repetidas (mesma chave de acesso) entram
+uma única vez, pelo primeiro arquivo na ordem dos caminhos.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+import ingestao
+from ingestao import gravar_partes, ler_direcao, limpar_notas, numero_da_parte, partes_gravadas
+
+TAMANHO_LOTE = 500
+# (elemento pai, elemento) -> coluna das notas
+CAMPOS_NOTA = {
+    ("ide", "nNF"): 'Número NF',
+    ("ide", "dhEmi"): 'Emissão',
+    ("ide", "dEmi"): 'Emissão',
+    ("ide", "tpNF"): 'tpNF',
+    ("emit", "CNPJ"): 'CNPJ Emitente',
+    ("emit", "CPF"): 'CNPJ Emitente',
+    ("emit", "xNome"): 'Nome Emitente',
+    ("emit", "CRT"): 'CRT',
+    ("enderEmit", "UF"): 'UF do Emitente',
+    ("dest", "CNPJ"): 'CNPJ Destinatário',
+    ("dest", "CPF"): 'CNPJ Destinatário',
+    ("dest", "xNome"): 'Nome Destinatário',
+    ("enderDest", "UF"): 'UF do Destinatário',
+}
+CAMPOS_ITEM = {
+    ("prod", "xProd"): 'Produto',
+    ("prod", "NCM"): 'NCM',
+    ("prod", "CFOP"): 'CFOP',
+    ("prod", "vUnCom"): 'Valor Unitário',
+    ("prod", "vProd"): 'Valor Total',
+}
+COLUNAS = ['Chave de Acesso', *dict.fromkeys(CAMPOS_NOTA.values()), *CAMPOS_ITEM.values(), 'Alíquota ICMS', 'Valor ICMS']
+# Colunas de um armazenamento ainda vazio
+COLUNAS_NOTAS = [*COLUNAS, 'Mês']
+REGIMES = {"1": "Simples Nacional", "2": "Simples Nacional", "3": "Normal", "4": "Simples Nacional"}
+
+
+# =========================
+# LEITURA DE UM XML
+# =========================
+def _local(tag):
+    return tag.rpartition("}")[2]
+
+def ler_xml(fonte):
+    """Itens de uma NF-e (uma linha por item), ou [] se o XML não for uma nota (ex.: evento)."""
+    nota, itens, item, caminho = {}, [], None, []
+    for evento, elem in ET.iterparse(fonte, events=("start", "end")):
+        tag = _local(elem.tag)
+        if evento == "start":
+            caminho.append(tag)
+            if tag == "infNFe":
+                nota['Chave de Acesso'] = elem.get("Id", "")[-44:]
+            elif tag == "det":
+                item = {}
+            continue
+        caminho.pop()
+        pai = caminho[-1] if caminho else None
+        if item is not None:
+            if (pai, tag) in CAMPOS_ITEM:
+                item[CAMPOS_ITEM[pai, tag]] = elem.text
+            elif pai.startswith("ICMS") and tag in ("pICMS", "vICMS"):
+                item['Alíquota ICMS' if tag == "pICMS" else 'Valor ICMS'] = elem.text
+            elif tag == "det":
+                itens.append(item)
+                item = None
+                elem.clear()
+        elif (pai, tag) in CAMPOS_NOTA:
+            nota.setdefault(CAMPOS_NOTA[pai, tag], elem.text)
+    if 'Chave de Acesso' not in nota:
+        return []
+    return [{**nota, **item} for item in itens]
+
+
+# =========================
+# ARQUIVOS DE ORIGEM
+# =========================
+def listar_fontes(origens):
+    # Identificador estável de cada XML: caminho do arquivo ou "arquivo.zip::membro"
+    fontes = []
+    for origem in map(Path, origens):
+        arquivos = sorted(origem.rglob("*")) if origem.is_dir() else [origem]
+        for arquivo in arquivos:
+            sufixo = arquivo.suffix.lower()
+            if sufixo == ".xml":
+                fontes.append(str(arquivo.resolve()))
+            elif sufixo == ".zip":
+                with zipfile.ZipFile(arquivo) as pacote:
+                    fontes.extend(f"{arquivo.resolve()}::{membro}" for membro in sorted(pacote.namelist())
+                                  if membro.lower().endswith(".xml"))
+    return fontes
+
+def _processar_lote(fontes):
+    # Roda no processo filho; cada zip é aberto uma vez por lote
+    linhas, ignorados, erros, pacotes = [], 0, {}, {}
+    try:
+        for fonte in fontes:
+            try:
+                if "::" in fonte:
+                    caminho, membro = fonte.split("::", 1)
+                    if caminho not in pacotes:
+                        pacotes[caminho] = zipfile.ZipFile(caminho)
+                    with pacotes[caminho].open(membro) as arquivo:
+                        itens = ler_xml(arquivo)
+                else:
+                    itens = ler_xml(fonte)
+            except (ET.ParseError, OSError, KeyError) as e:
+                erros[fonte] = f"{type(e).__name__}: {e}"
+                continue
+            if not itens:
+                ignorados += 1
+            for item in itens:
+                item['Arquivo'] = fonte
+            linhas.extend(itens)
+    finally:
+        for pacote in pacotes.values():
+            pacote.close()
+    return fontes, linhas, ignorados, erros
+
+
+# =========================
+# ARMAZENAMENTO E RETOMADA
+# =========================
+def pasta_padrao():
+    return ingestao.PASTA_CACHE / "nfe"
+
+def _ler_manifesto(destino):
+    try:
+        with open(destino / "manifesto.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"arquivos": [], "erros": {}}
+
+def _gravar_manifesto(destino, manifesto):
+    temporario = destino / f"manifesto.json.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False)
+    os.replace(temporario, destino / "manifesto.json")
+
+def _partes(destino):
+    return [*partes_gravadas(Path(destino) / "entradas"), *partes_gravadas(Path(destino) / "saidas")]
+
+def _montar_notas(linhas, cnpj_empresa):
+    df = pd.DataFrame(linhas).reindex(columns=COLUNAS)
+    # Como texto: sem nenhuma emissão preenchida a coluna vem só com NaN (float) e .str falharia
+    emissao = pd.to_datetime(df['Emissão'].astype("string").str[:10], format="%Y-%m-%d", errors='coerce')
+    df['Mês'] = emissao.dt.to_period('M').dt.start_time
+    df['Data de Emissão'] = emissao.dt.strftime("%d/%m/%Y")
+    df['Número NF'] = pd.to_numeric(df['Número NF'], errors='coerce')
+    df['Valor Unitário'] = pd.to_numeric(df['Valor Unitário'], errors='coerce')
+    df['Alíquota ICMS'] = pd.to_numeric(df['Alíquota ICMS'], errors='coerce') / 100
+    df['Regime'] = df['CRT'].map(REGIMES)
+    if cnpj_empresa:
+        saida = df['CNPJ Emitente'] == "".join(filter(str.isdigit, cnpj_empresa))
+    else:
+        # Sem o CNPJ da empresa, vale o tipo da nota do ponto de vista do emitente (1 = saída)
+        saida = df['tpNF'] == "1"
+    df['Direção'] = saida.map({True: "Saída", False: "Entrada"})
+    return limpar_notas(df.drop(columns=['Emissão', 'tpNF', 'CRT']))
+
+def _lotes_processados(lotes, workers):
+    # Com um worker só o parse roda na própria thread: o observador da pasta de entrada vive numa
+    # thread do servidor do Streamlit, e não deve criar processos a partir dela
+    if workers == 1:
+        yield from map(_processar_lote, lotes)
+        return
+    # Resultados na ordem dos lotes (não na de conclusão): a nota repetida que fica é sempre a
+    # do primeiro arquivo, com qualquer número de workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_processar_lote, lotes)
+
+def ingerir_xml(origens, destino=None, cnpj_empresa=None, workers=None, tamanho_lote=TAMANHO_LOTE, progresso=print):
+    """Ingere os XMLs ainda não processados em `destino` e devolve as estatísticas da execução."""
+    destino = Path(destino or pasta_padrao())
+    destino.mkdir(parents=True, exist_ok=True)
+    manifesto = _ler_manifesto(destino)
+    processados = set(manifesto["arquivos"])
+    pendentes = sorted(fonte for fonte in listar_fontes(origens) if fonte not in processados)
+    # Partes gravadas por uma execução interrompida antes do manifesto também contam para as chaves
+    chaves, partes = set(), _partes(destino)
+    for parte in partes:
+        chaves.update(pd.read_parquet(parte, columns=['Chave de Acesso'])['Chave de Acesso'].unique())
+    numero = max(map(numero_da_parte, partes), default=-1) + 1
+
+    inicio = time.perf_counter()
+    estatisticas = {'arquivos': len(pendentes), 'notas': 0, 'itens': 0, 'duplicadas': 0, 'ignorados': 0, 'erros': 0}
+    lotes = [pendentes[i:i + tamanho_lote] for i in range(0, len(pendentes), tamanho_lote)]
+    for fontes, linhas, ignorados, erros in _lotes_processados(lotes, workers):
+        estatisticas['ignorados'] += ignorados
+        estatisticas['erros'] += len(erros)
+        if linhas:
+            df = pd.DataFrame(linhas)
+            # Uma chave de acesso vale só para o primeiro arquivo (na ordem dos caminhos) em que aparece
+            primeiro = df.groupby('Chave de Acesso', sort=False)['Arquivo'].transform('first')
+            repetida = df['Chave de Acesso'].isin(chaves) | (df['Arquivo'] != primeiro)
+            estatisticas['duplicadas'] += df.loc[repetida, 'Chave de Acesso'].nunique()
+            df = df[~repetida]
+            if len(df):
+                notas = _montar_notas(df.drop(columns='Arquivo').to_dict("records"), cnpj_empresa)
+                for direcao, grupo in notas.groupby('Direção', sort=False):
+                    pasta = destino / ("saidas" if direcao == "Saída" else "entradas")
+                    gravar_partes(pasta, grupo.drop(columns='Direção'), numero)
+                numero += 1
+                chaves.update(df['Chave de Acesso'].unique())
+                estatisticas['notas'] += df['Chave de Acesso'].nunique()
+                estatisticas['itens'] += len(df)
+        # Arquivos com erro ficam fora do manifesto e são tentados de novo na próxima execução
+        manifesto["arquivos"].extend(fonte for fonte in fontes if fonte not in erros)
+        manifesto["erros"] = {**{k: v for k, v in manifesto["erros"].items() if k not in fontes}, **erros}
+        _gravar_manifesto(destino, manifesto)
+        decorrido = time.perf_counter() - inicio
+        if progresso:
+            progresso(f"{estatisticas['notas']} notas ({estatisticas['notas'] / decorrido:,.0f} notas/s)")
+    estatisticas['segundos'] = time.perf_counter() - inicio
+    estatisticas['notas_por_segundo'] = estatisticas['notas'] / estatisticas['segundos'] if estatisticas['segundos'] else 0.0
+    return estatisticas
+
+
+# =========================
+# LEITURA PELO DASHBOARD
+# =========================
+def ler_notas_nfe(destino=None):
+    """(entradas, saídas) no mesmo esquema de ingestao.ler_notas, a partir das partes gravadas."""
+    destino = Path(destino or pasta_padrao())
+    return ler_direcao(destino / "entradas", COLUNAS_NOTAS), ler_direcao(destino / "saidas", COLUNAS_NOTAS)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestão de XMLs de NF-e/NFC-e.")
+    parser.add_argument("origens", nargs="+", help="pastas ou arquivos .zip/.xml")
+    parser.add_argument("--destino", default=None, help="pasta do armazenamento (padrão: <cache>/nfe)")
+    parser.add_argument("--cnpj", default=None, help="CNPJ da empresa, para separar entradas de saídas")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processos em paralelo")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="arquivos por lote")
+    args = parser.parse_args(argv)
+    estatisticas = ingerir_xml(args.origens, args.destino, args.cnpj, args.workers, args.lote)
+    print(f"{estatisticas['arquivos']} arquivos, {estatisticas['notas']} notas novas ({estatisticas['itens']} itens), "
+          f"{estatisticas['duplicadas']} duplicadas, {estatisticas['ignorados']} ignorados, {estatisticas['erros']} com erro "
+          f"em {estatisticas['segundos']:.2f}s ({estatisticas['notas_por_segundo']:,.0f} notas/s)")
+    return 1 if estatisticas['erros'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
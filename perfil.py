@@ -0,0 +1,123 @@
+"""Medição de tempo, pico de memória e linhas por etapa de cada execução do dashboard."""
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+
+class _Memoria:
+    # O tracemalloc é um só para o processo, e as sessões rodam em threads dele. Ele fica ligado
+    # enquanto houver alguma execução medindo (contagem de referências) e só esta classe reinicia o
+    # pico: antes de cada reinício, o pico corrente é repassado a todos os intervalos abertos, de
+    # qualquer sessão. O pico de um intervalo é, portanto, o do processo inteiro durante ele.
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._medindo = 0
+        self._ligado_aqui = False
+        self._abertos = []
+
+    def ligar(self):
+        with self._trava:
+            if self._medindo == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._ligado_aqui = True
+            self._medindo += 1
+
+    def desligar(self):
+        with self._trava:
+            self._medindo -= 1
+            # Rastreamento ligado por fora (python -X tracemalloc) continua ligado
+            if self._medindo == 0 and self._ligado_aqui:
+                tracemalloc.stop()
+                self._ligado_aqui = False
+
+    def abrir(self):
+        with self._trava:
+            pico = tracemalloc.get_traced_memory()[1]
+            for intervalo in self._abertos:
+                intervalo[0] = max(intervalo[0], pico)
+            tracemalloc.reset_peak()
+            intervalo = [0]
+            self._abertos.append(intervalo)
+            return intervalo
+
+    def fechar(self, intervalo):
+        with self._trava:
+            self._abertos = [aberto for aberto in self._abertos if aberto is not intervalo]
+            return max(intervalo[0], tracemalloc.get_traced_memory()[1])
+
+_memoria = _Memoria()
+
+
+class Perfil:
+    # Um Perfil por execução (rerun). Com medir_memoria, o pico vem do tracemalloc, que deixa o
+    # processo mais lento; por isso fica desligado por padrão. O pico é do processo (inclui o que
+    # outras sessões alocaram ao mesmo tempo), não só desta execução.
+    def __init__(self, medir_memoria=False):
+        self.medir_memoria = medir_memoria
+        self.etapas = []
+        self._nivel = 0
+        self._encerrar = None
+        if medir_memoria:
+            _memoria.ligar()
+            # Execuções interrompidas (st.stop, rerun) também devolvem a referência
+            self._encerrar = weakref.finalize(self, _memoria.desligar)
+
+    def encerrar(self):
+        """Libera o tracemalloc desta execução; chamado no fim do script."""
+        if self._encerrar:
+            self._encerrar()
+
+    @contextmanager
+    def etapa(self, nome, linhas=None):
+        # O registro é devolvido para que a etapa possa informar as linhas depois de calculá-las
+        registro = {'etapa': nome, 'nivel': self._nivel, 'linhas': linhas}
+        intervalo = _memoria.abrir() if self.medir_memoria else None
+        self._nivel += 1
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['tempo_ms'] = (time.perf_counter() - inicio) * 1000
+            self._nivel -= 1
+            if intervalo is not None:
+                registro['pico_mb'] = _memoria.fechar(intervalo) / 1e6
+            self.etapas.append(registro)
+
+    def tabela(self):
+        colunas = ['etapa', 'nivel', 'tempo_ms', 'pico_mb', 'linhas']
+        df = pd.DataFrame(self.etapas).reindex(columns=colunas)
+        df['etapa'] = ["  " * int(nivel) + etapa for etapa, nivel in zip(df['etapa'], df['nivel'])]
+        return df.drop(columns='nivel')
+
+    def gravar(self, caminho, **contexto):
+        # Uma linha JSON por execução, com o contexto (relatório, período, sessão...)
+        registro = {'instante': datetime.now().isoformat(timespec="seconds"), **contexto, 'etapas': self.etapas}
+        with open(caminho, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+
+
+def resumo_percentis(caminho, por="relatorio"):
+    # p50/p95 do tempo de cada etapa, agrupado por tipo de relatório, a partir do log JSON-lines
+    linhas = []
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            for texto in f:
+                registro = json.loads(texto)
+                for etapa in registro.get('etapas', []):
+                    linhas.append({por: registro.get(por), 'etapa': etapa['etapa'], 'tempo_ms': etapa['tempo_ms']})
+    except FileNotFoundError:
+        pass
+    if not linhas:
+        return pd.DataFrame(columns=[por, 'etapa', 'execuções', 'p50_ms', 'p95_ms'])
+    grupos = pd.DataFrame(linhas).groupby([por, 'etapa'])['tempo_ms']
+    return pd.DataFrame({
+        'execuções': grupos.size(),
+        'p50_ms': grupos.quantile(0.5),
+        'p95_ms': grupos.quantile(0.95),
+    }).reset_index()
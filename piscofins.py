@@ -0,0 +1,60 @@
+"""Apuração de PIS e COFINS calculada das notas, vetorizada por competência."""
+import pandas as pd
+
+from apuracao import acumular_credito
+from competencias import MESES
+
+# Alíquotas em pontos-base, como a 'Alíquota ICMS' das notas. No regime cumulativo não há crédito.
+REGIMES_PIS_COFINS = {
+    "Não cumulativo": {"PIS": 165, "COFINS": 760, "credito": True},
+    "Cumulativo": {"PIS": 65, "COFINS": 300, "credito": False},
+}
+
+
+def bases_mensais(notas, chave=None, excluir_icms=True):
+    """Base de cálculo em centavos por [chave,] competência, numa única agregação.
+
+    As alíquotas dependem só do regime da empresa apurada, não do regime de quem emitiu a nota.
+    """
+    base = notas['Valor Total'] - notas['Valor ICMS'] if excluir_icms else notas['Valor Total']
+    grupos = ([notas[chave]] if chave else []) + [notas['Mês'].dt.to_period('M').rename('Competência')]
+    # Notas sem competência ficam de fora da apuração
+    return base.groupby(grupos, observed=True).sum().rename('Base').reset_index()
+
+def _imposto(bases, aliquotas, nome):
+    # Alíquota aplicada sobre a base já somada: arredondamento só no total do grupo
+    por_imposto = {imposto: (bases['Base'] * aliquotas[imposto] + 5_000) // 10_000 for imposto in ("PIS", "COFINS")}
+    return bases.assign(**{f"{nome} {imposto}": valor for imposto, valor in por_imposto.items()})
+
+def apurar_piscofins(entradas, saidas, regime="Não cumulativo", chave=None, excluir_icms=True):
+    """Crédito (entradas), débito (saídas) e saldo acumulado de PIS e COFINS por competência.
+
+    Sai no formato da aba PISCOFINS (uma linha 'PIS/COFINS' por mês) para servir ao mesmo gráfico;
+    'Saldo' negativo é crédito a transportar, como na planilha. O transporte do crédito é o mesmo
+    da apuração do ICMS.
+    """
+    aliquotas = REGIMES_PIS_COFINS[regime]
+    indice = ([chave] if chave else []) + ['Competência']
+    debitos = _imposto(bases_mensais(saidas, chave, excluir_icms), aliquotas, "Débito")
+    debitos = debitos.set_index(indice)[["Débito PIS", "Débito COFINS"]]
+    creditos = _imposto(bases_mensais(entradas, chave, excluir_icms), aliquotas, "Crédito")
+    creditos = creditos.set_index(indice)[["Crédito PIS", "Crédito COFINS"]]
+    if not aliquotas["credito"]:
+        creditos = creditos * 0
+    totais = pd.concat([creditos, debitos], axis=1).fillna(0).sort_index() / 100
+    # acumular_credito trabalha com os nomes de coluna da apuração do ICMS
+    totais['ICMS Crédito'] = totais['Crédito PIS'] + totais['Crédito COFINS']
+    totais['ICMS Débito'] = totais['Débito PIS'] + totais['Débito COFINS']
+    totais = acumular_credito(totais.reset_index(), chave)
+    competencia = totais['Competência']
+    return pd.DataFrame({
+        **({chave: totais[chave]} if chave else {}),
+        'Mês': [MESES[m - 1] for m in competencia.dt.month],
+        'Imposto': "PIS/COFINS",
+        'Crédito': totais['ICMS Crédito'],
+        'Débito': totais['ICMS Débito'],
+        'Saldo': totais['ICMS Apurado Corrigido'],
+        'Ordem': competencia.dt.month,
+        'Competência': competencia,
+        **{coluna: totais[coluna] for coluna in ("Crédito PIS", "Crédito COFINS", "Débito PIS", "Débito COFINS")},
+    })
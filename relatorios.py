@@ -0,0 +1,52 @@
+"""API sem Streamlit: todos os relatórios de um cliente a partir das planilhas."""
+import pandas as pd
+
+from agregacoes import montar_cubo, por_aliquota, por_uf
+from apuracao import apurar_icms
+from caixa import IndiceCaixa, resumo_mensal
+from dre import LINHAS_DRE, IndiceDRE
+from ingestao import ler_contabilidade, ler_notas
+from nfe import ler_notas_nfe
+
+
+def processar_cliente(caminho_notas, caminho_contabilidade=None, pasta_nfe=None):
+    """Retorna {nome da aba: DataFrame} com apuração, UF, alíquotas, caixa, PIS/COFINS e DRE.
+
+    Com `pasta_nfe` (armazenamento gerado por nfe.py) as notas vêm dos XMLs, como no dashboard.
+    """
+    entradas, saidas = ler_notas_nfe(pasta_nfe) if pasta_nfe else ler_notas(caminho_notas)
+    cubo = montar_cubo(entradas, saidas)
+    apuracao = apurar_icms(entradas, saidas)
+    apuracao['Mês'] = apuracao['Mês'].astype(str)
+    relatorios = {
+        "Apuracao": apuracao,
+        "Compras por UF": por_uf(cubo, "Entrada"),
+        "Saídas por UF": por_uf(cubo, "Saída"),
+        "Aliquotas": por_aliquota(cubo),
+    }
+    if caminho_contabilidade:
+        caixa_df, piscofins_df, dre_df = ler_contabilidade(caminho_contabilidade)
+        if caixa_df is not None:
+            relatorios["Caixa"] = resumo_mensal(IndiceCaixa(caixa_df))
+        if piscofins_df is not None:
+            relatorios["PIS e COFINS"] = piscofins_df
+        if dre_df is not None:
+            valores = IndiceDRE(dre_df).resolver(LINHAS_DRE)
+            relatorios["DRE"] = pd.DataFrame({'Linha': list(valores), 'Valor': list(valores.values())})
+    return relatorios
+
+def resumo_cliente(relatorios):
+    # Uma linha do resumo da carteira
+    apuracao = relatorios["Apuracao"]
+    resumo = {
+        'ICMS Crédito': apuracao['ICMS Crédito'].sum(),
+        'ICMS Débito': apuracao['ICMS Débito'].sum(),
+        'ICMS Apurado (último mês)': apuracao['ICMS Apurado Corrigido'].iloc[-1] if len(apuracao) else 0.0,
+        'Compras': relatorios["Compras por UF"]['Valor Total'].sum(),
+        'Saídas': relatorios["Saídas por UF"]['Valor Total'].sum(),
+    }
+    if "Caixa" in relatorios and len(relatorios["Caixa"]):
+        resumo['Saldo de Caixa'] = relatorios["Caixa"]['Saldo Final'].iloc[-1]
+    if "DRE" in relatorios:
+        resumo['Resultado Líquido'] = relatorios["DRE"].set_index('Linha').loc["resultado_liquido", 'Valor']
+    return resumo
@@ -0,0 +1,40 @@
+"""Redução de séries longas por LTTB."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from amostragem import indices_lttb, reduzir_serie
+
+
+def serie(n, semente=0):
+    gerador = np.random.default_rng(semente)
+    return pd.DataFrame({'Data': pd.date_range("2015-01-01", periods=n, freq="D"),
+                         'Saldo Acumulado': gerador.normal(0, 1, n).cumsum()})
+
+@pytest.mark.parametrize("n, limite", [(10, 3), (5_000, 1_500), (4_000, 50)])
+def test_lttb_tamanho_e_pontas(n, limite):
+    x = np.arange(n, dtype=float)
+    indices = indices_lttb(x, np.sin(x / 7), limite)
+    assert len(indices) == limite
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert (np.diff(indices) > 0).all()
+
+def test_lttb_mantem_picos_e_vales():
+    y = np.zeros(10_000)
+    y[1_234], y[7_777] = 50.0, -80.0
+    indices = indices_lttb(np.arange(len(y), dtype=float), y, 100)
+    assert {1_234, 7_777} <= set(indices)
+
+def test_reduzir_serie_longa_por_data():
+    df = serie(3_650)
+    df.loc[2_000, 'Saldo Acumulado'] = df['Saldo Acumulado'].max() + 1_000
+    reduzida = reduzir_serie(df, "Data", "Saldo Acumulado", limite=500)
+    assert len(reduzida) == 500
+    assert reduzida['Data'].is_monotonic_increasing
+    assert reduzida.index[0] == 0 and reduzida.index[-1] == len(df) - 1
+    assert 2_000 in reduzida.index
+
+def test_reduzir_serie_curta_volta_inteira():
+    df = serie(100)
+    assert reduzir_serie(df, "Data", "Saldo Acumulado", limite=500) is df
+    assert len(reduzir_serie(df, None, "Saldo Acumulado", limite=20)) == 20
@@ -0,0 +1,158 @@
+"""Apuração vetorizada (acumular_credito) e reapuração incremental contra o laço original."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from apuracao import acumular_credito, apurar_icms, reapurar, totais_mensais
+
+COLUNAS = ['ICMS Crédito', 'ICMS Débito', 'Crédito Acumulado', 'ICMS Apurado Corrigido']
+
+
+def apuracao_laco(totais, chave=None, credito_inicial=0.0):
+    # O laço com iterrows que o dashboard usava, repetido empresa a empresa
+    grupos = totais.groupby(chave, sort=False) if chave else [(None, totais)]
+    resultado = []
+    for empresa, comparativo in grupos:
+        comparativo = comparativo.copy()
+        comparativo['Crédito Acumulado'] = 0.0
+        comparativo['ICMS Apurado Corrigido'] = 0.0
+        credito_acumulado = credito_inicial.get(empresa, 0.0) if isinstance(credito_inicial, dict) else credito_inicial
+        for i, row in comparativo.iterrows():
+            credito_total = row['ICMS Crédito'] + credito_acumulado
+            apurado = row['ICMS Débito'] - credito_total
+            comparativo.at[i, 'Crédito Acumulado'] = credito_acumulado
+            comparativo.at[i, 'ICMS Apurado Corrigido'] = apurado
+            credito_acumulado = max(0, -apurado)
+        resultado.append(comparativo)
+    return pd.concat(resultado).sort_index()
+
+def notas(meses, valores, empresas=None):
+    # Notas em centavos, como no esquema compacto
+    df = pd.DataFrame({'Mês': pd.to_datetime(meses), 'Valor ICMS': np.asarray(valores, dtype='int64')})
+    if empresas is not None:
+        df['CNPJ'] = empresas
+    return df
+
+def notas_aleatorias(gerador, n, empresas, meses):
+    datas = pd.period_range("2023-01", periods=meses, freq='M').to_timestamp()
+    return notas(gerador.choice(datas, n), gerador.integers(0, 500_000, n), gerador.choice(empresas, n))
+
+def comparar(obtido, esperado):
+    pd.testing.assert_frame_equal(obtido.reset_index(drop=True)[COLUNAS],
+                                  esperado.reset_index(drop=True)[COLUNAS], check_exact=False, atol=1e-6)
+
+
+# =========================
+# APURAÇÃO VETORIZADA
+# =========================
+def test_uma_empresa_igual_ao_laco():
+    # Meses com saldo credor (crédito transportado) e devedor (crédito consumido)
+    entradas = notas(["2024-01-05", "2024-02-10", "2024-03-01", "2024-04-20"], [90_000, 10_000, 500_000, 0])
+    saidas = notas(["2024-01-07", "2024-02-11", "2024-03-02", "2024-04-21"], [30_000, 120_000, 100_000, 350_000])
+    totais = totais_mensais(entradas, saidas)
+    apuracao = apurar_icms(entradas, saidas)
+    comparar(apuracao, apuracao_laco(totais))
+    assert list(apuracao['Crédito Acumulado']) == pytest.approx([0, 600, 0, 4_000])
+
+def test_varias_empresas_igual_ao_laco():
+    gerador = np.random.default_rng(7)
+    empresas = [f"{i:014d}" for i in range(25)]
+    entradas = notas_aleatorias(gerador, 5_000, empresas, 36)
+    saidas = notas_aleatorias(gerador, 5_000, empresas, 36)
+    totais = totais_mensais(entradas, saidas, 'CNPJ')
+    apuracao = apurar_icms(entradas, saidas, 'CNPJ')
+    comparar(apuracao, apuracao_laco(totais, 'CNPJ'))
+    # O crédito de uma empresa não passa para a seguinte
+    primeiros = apuracao.groupby('CNPJ').head(1)
+    assert (primeiros['Crédito Acumulado'] == 0).all()
+
+def test_mes_so_com_credito_ou_so_com_debito():
+    entradas = notas(["2024-01-01", "2024-03-01"], [80_000, 20_000])
+    saidas = notas(["2024-02-01", "2024-04-01"], [50_000, 70_000])
+    totais = totais_mensais(entradas, saidas)
+    comparar(apurar_icms(entradas, saidas), apuracao_laco(totais))
+
+@pytest.mark.parametrize("credito_inicial", [0.0, 150.0, 5_000.0])
+def test_credito_inicial(credito_inicial):
+    gerador = np.random.default_rng(3)
+    entradas = notas_aleatorias(gerador, 300, ["A"], 12).drop(columns='CNPJ')
+    saidas = notas_aleatorias(gerador, 300, ["A"], 12).drop(columns='CNPJ')
+    totais = totais_mensais(entradas, saidas)
+    comparar(acumular_credito(totais, credito_inicial=credito_inicial), apuracao_laco(totais, credito_inicial=credito_inicial))
+
+def test_credito_inicial_por_empresa():
+    gerador = np.random.default_rng(11)
+    entradas = notas_aleatorias(gerador, 2_000, ["A", "B", "C"], 18)
+    saidas = notas_aleatorias(gerador, 2_000, ["A", "B", "C"], 18)
+    totais = totais_mensais(entradas, saidas, 'CNPJ')
+    iniciais = {"A": 0.0, "B": 1_000.0, "C": 25_000.0}
+    obtido = acumular_credito(totais, 'CNPJ', totais['CNPJ'].map(iniciais))
+    comparar(obtido, apuracao_laco(totais, 'CNPJ', iniciais))
+
+
+# =========================
+# REAPURAÇÃO INCREMENTAL
+# =========================
+def _meses_alterados(antes, depois, chave=None):
+    # Pares [empresa,] competência cujas notas mudaram entre as duas versões
+    colunas = ([chave] if chave else []) + ['Mês']
+    def por_mes(df):
+        grupos = ([df[chave]] if chave else []) + [df['Mês'].dt.to_period('M')]
+        return df.groupby(grupos)['Valor ICMS'].agg(['sum', 'size'])
+    a, b = por_mes(antes), por_mes(depois)
+    indice = a.index.union(b.index)
+    diferentes = a.reindex(indice).ne(b.reindex(indice)).any(axis=1)
+    return pd.DataFrame(indice[diferentes].tolist() if chave else {'Mês': indice[diferentes]}, columns=colunas)
+
+def _reapurar_e_comparar(entradas, saidas, novas_entradas, novas_saidas, chave=None):
+    checkpoints = apurar_icms(entradas, saidas, chave)
+    alterados = [_meses_alterados(entradas, novas_entradas, chave), _meses_alterados(saidas, novas_saidas, chave)]
+    alterados = pd.concat([df for df in alterados if not df.empty]).drop_duplicates()
+    obtido = reapurar(checkpoints, novas_entradas, novas_saidas, alterados, chave)
+    esperado = apurar_icms(novas_entradas, novas_saidas, chave)
+    colunas = ([chave] if chave else []) + ['Mês']
+    pd.testing.assert_frame_equal(obtido[colunas].reset_index(drop=True), esperado[colunas].reset_index(drop=True))
+    comparar(obtido, esperado)
+    return obtido
+
+@pytest.fixture
+def historico():
+    gerador = np.random.default_rng(5)
+    empresas = ["A", "B", "C", "D"]
+    return notas_aleatorias(gerador, 3_000, empresas, 24), notas_aleatorias(gerador, 3_000, empresas, 24)
+
+def test_reapurar_correcao_no_meio(historico):
+    entradas, saidas = historico
+    novas_saidas = saidas.copy()
+    corrigidas = (novas_saidas['CNPJ'] == "B") & (novas_saidas['Mês'].dt.to_period('M') == pd.Period("2023-06", 'M'))
+    novas_saidas.loc[corrigidas, 'Valor ICMS'] *= 3
+    _reapurar_e_comparar(entradas, saidas, entradas, novas_saidas, 'CNPJ')
+
+def test_reapurar_novo_mes_no_fim(historico):
+    entradas, saidas = historico
+    novas_entradas = pd.concat([entradas, notas(["2025-01-15", "2025-01-20"], [1_000, 2_000], ["A", "C"])], ignore_index=True)
+    novas_saidas = pd.concat([saidas, notas(["2025-01-16", "2025-02-03"], [90_000, 4_000], ["A", "D"])], ignore_index=True)
+    obtido = _reapurar_e_comparar(entradas, saidas, novas_entradas, novas_saidas, 'CNPJ')
+    assert pd.Period("2025-02", 'M') in set(obtido['Mês'])
+
+def test_reapurar_mes_removido(historico):
+    entradas, saidas = historico
+    removido = pd.Period("2023-09", 'M')
+    novas_entradas = entradas[~((entradas['CNPJ'] == "C") & (entradas['Mês'].dt.to_period('M') == removido))]
+    novas_saidas = saidas[~((saidas['CNPJ'] == "C") & (saidas['Mês'].dt.to_period('M') == removido))]
+    obtido = _reapurar_e_comparar(entradas, saidas, novas_entradas, novas_saidas, 'CNPJ')
+    assert not ((obtido['CNPJ'] == "C") & (obtido['Mês'] == removido)).any()
+
+def test_reapurar_uma_empresa():
+    gerador = np.random.default_rng(9)
+    entradas = notas_aleatorias(gerador, 500, ["A"], 12).drop(columns='CNPJ')
+    saidas = notas_aleatorias(gerador, 500, ["A"], 12).drop(columns='CNPJ')
+    # Um mês corrigido, o último removido e um novo no fim
+    novas_entradas = entradas.assign(**{'Valor ICMS': entradas['Valor ICMS'].where(entradas['Mês'].dt.month != 4, 0)})
+    novas_saidas = pd.concat([saidas[saidas['Mês'].dt.month != 12], notas(["2024-03-01"], [10_000])], ignore_index=True)
+    _reapurar_e_comparar(entradas, saidas, novas_entradas, novas_saidas)
+
+def test_reapurar_sem_alteracoes_devolve_checkpoints(historico):
+    entradas, saidas = historico
+    checkpoints = apurar_icms(entradas, saidas, 'CNPJ')
+    assert reapurar(checkpoints, entradas, saidas, pd.DataFrame({'CNPJ': [], 'Mês': []}), 'CNPJ') is checkpoints
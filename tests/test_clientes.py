@@ -0,0 +1,49 @@
+"""Pool de clientes: orçamento de RAM com os derivados de cada cliente."""
+import gc
+import weakref
+
+import numpy as np
+
+from clientes import DadosCliente, PoolClientes
+
+
+class Grande:
+    def __init__(self, n):
+        self.valores = np.zeros(n, dtype=np.int64)
+
+def abrir(tmp_path):
+    def abrir_cliente(nome, carga):
+        (tmp_path / nome / "nfe").mkdir(parents=True, exist_ok=True)
+        return DadosCliente(nome, tmp_path / nome / "notas.xlsx", tmp_path / nome / "contabilidade.xlsx",
+                            tmp_path / nome / "nfe", carga)
+    return abrir_cliente
+
+def test_derivados_entram_no_tamanho(tmp_path):
+    dados = abrir(tmp_path)("a", 1)
+    vazio = dados.tamanho()
+    indice = dados.derivado("indice", "v1", lambda: Grande(1_000_000))
+    assert dados.derivado("indice", "v1", lambda: Grande(1)) is indice
+    assert dados.tamanho() - vazio == 8_000_000
+    # Versão nova substitui a antiga
+    dados.derivado("indice", "v2", lambda: Grande(10))
+    assert dados.tamanho() - vazio == 80
+
+def test_descarte_leva_os_derivados_junto(tmp_path):
+    pool = PoolClientes(abrir(tmp_path), limite_bytes=10_000_000)
+    pool.obter("a").derivado("cubo", "v1", lambda: Grande(1_000_000))
+    pool.medir("a")
+    referencia = weakref.ref(pool.obter("a")._derivados["cubo"][1])
+    pool.obter("b").derivado("cubo", "v1", lambda: Grande(1_000_000))
+    pool.medir("b")
+    assert pool.estatisticas()['clientes'] == ["b"]
+    gc.collect()
+    assert referencia() is None
+
+def test_obter_descarta_ao_carregar_cliente(tmp_path):
+    pool = PoolClientes(abrir(tmp_path), limite_bytes=1_000_000)
+    pool.obter("a").derivado("cubo", "v1", lambda: Grande(1_000_000))
+    pool.medir("a")
+    # O excedente sai já na carga do próximo cliente, sem esperar a medição do fim da execução
+    pool.obter("b")
+    assert pool.estatisticas()['clientes'] == ["b"]
+    assert pool.descartes == 1
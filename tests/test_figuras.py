@@ -0,0 +1,28 @@
+"""Cache de figuras: tamanho estimado sem JSON e descarte pelo limite de bytes."""
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from figuras import CacheFiguras, tamanho_figuras
+
+
+def figura(n):
+    return go.Figure(go.Scatter(x=np.arange(n, dtype=float), y=np.zeros(n)))
+
+def test_tamanho_sem_serializar(monkeypatch):
+    def sem_json(*args, **kwargs):
+        raise AssertionError("figura serializada só para medir")
+    monkeypatch.setattr(pio, "to_json", sem_json)
+    # Dois arrays float64 de 10.000 pontos
+    assert 160_000 <= tamanho_figuras(figura(10_000)) < 170_000
+    assert tamanho_figuras((figura(10), figura(10_000))) > tamanho_figuras(figura(10_000))
+
+def test_descarta_as_menos_usadas_pelo_limite():
+    cache = CacheFiguras(limite_bytes=400_000)
+    cache.obter("a", lambda: figura(10_000))
+    cache.obter("b", lambda: figura(10_000))
+    cache.obter("a", lambda: figura(1))
+    cache.obter("c", lambda: figura(10_000))
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['itens'], estatisticas['acertos'], estatisticas['descartes']) == (2, 1, 1)
+    assert cache.obter("a", lambda: None) is not None
@@ -0,0 +1,119 @@
+"""Checkpoints da apuração gravados pelo NotasIncrementais, notas novas intercaladas e a vigia das notas."""
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import incremental
+from apuracao import apurar_icms
+from incremental import ARQUIVO_CHECKPOINTS, NotasIncrementais
+from ingestao import gravar_partes
+
+
+def notas(meses, valores):
+    return pd.DataFrame({'Mês': pd.to_datetime(meses), 'Valor ICMS': pd.Series(valores, dtype='int64')})
+
+@pytest.fixture
+def armazem(tmp_path):
+    gravar_partes(tmp_path / "entradas", notas(["2024-01-10", "2024-02-10", "2024-03-10"], [90_000, 10_000, 5_000]), 0)
+    gravar_partes(tmp_path / "saidas", notas(["2024-01-11", "2024-02-11", "2024-03-11"], [30_000, 120_000, 1_000]), 0)
+    return tmp_path
+
+def apuracao_completa(estado):
+    return apurar_icms(estado.entradas, estado.saidas)
+
+def test_checkpoints_gravados_e_reaproveitados(armazem, monkeypatch):
+    NotasIncrementais(armazem).atualizar()
+    assert (armazem / ARQUIVO_CHECKPOINTS).is_file()
+
+    # Parte nova depois da gravação: ao abrir de novo só a competência dela é reapurada
+    gravar_partes(armazem / "saidas", notas(["2024-03-20", "2024-04-02"], [50_000, 7_000]), 1)
+    def sem_apuracao_completa(*args, **kwargs):
+        raise AssertionError("apuração completa com checkpoints válidos")
+    monkeypatch.setattr(incremental, "apurar_icms", sem_apuracao_completa)
+    estado = NotasIncrementais(armazem)
+    estado.atualizar()
+    monkeypatch.undo()
+    pd.testing.assert_frame_equal(estado.apuracao, apuracao_completa(estado))
+
+def test_checkpoints_de_outras_partes_sao_ignorados(armazem):
+    NotasIncrementais(armazem).atualizar()
+    # Parte já coberta pelo checkpoint regravada com outro conteúdo: a apuração é refeita do zero
+    parte = next((armazem / "entradas").glob("competencia=2024-02/*.parquet"))
+    notas(["2024-02-10"], [999_999]).to_parquet(parte, index=False)
+    estado = NotasIncrementais(armazem)
+    estado.atualizar()
+    pd.testing.assert_frame_equal(estado.apuracao, apuracao_completa(estado))
+    assert estado.apuracao.loc[estado.apuracao['Mês'] == pd.Period("2024-02", 'M'), 'ICMS Crédito'].item() == 9_999.99
+
+def test_atualizar_grava_checkpoint_da_reapuracao(armazem):
+    estado = NotasIncrementais(armazem)
+    estado.atualizar()
+    gravar_partes(armazem / "entradas", notas(["2024-05-01"], [3_000]), 1)
+    assert estado.atualizar()
+    reaberto = NotasIncrementais(armazem)
+    reaberto.atualizar()
+    pd.testing.assert_frame_equal(reaberto.apuracao, estado.apuracao)
+
+def test_partes_novas_entram_no_lugar(armazem):
+    estado = NotasIncrementais(armazem)
+    estado.atualizar()
+    # Uma nota no meio (fevereiro), uma depois de todas e uma sem data
+    novas = notas(["2024-02-10", "2024-06-01", None], [1, 2, 3])
+    gravar_partes(armazem / "entradas", novas, 1)
+    assert estado.atualizar()
+    assert list(estado.entradas['Valor ICMS']) == [90_000, 10_000, 1, 5_000, 2, 3]
+    # Mesmo resultado de uma carga completa, que ordena tudo
+    completo = NotasIncrementais(armazem)
+    completo.atualizar()
+    pd.testing.assert_frame_equal(estado.entradas, completo.entradas)
+
+
+class NotasFalsas:
+    def __init__(self, mudancas):
+        self.mudancas = list(mudancas)
+        self.chamadas = 0
+        self.versao = 0
+
+    def atualizar(self):
+        self.chamadas += 1
+        mudou = self.mudancas.pop(0) if self.mudancas else False
+        self.versao += mudou
+        return mudou
+
+def test_vigia_acorda_quem_espera_quando_as_notas_mudam():
+    vigia = incremental.Vigia(intervalo=60)
+    notas = NotasFalsas([False, True])
+    resultados = []
+    sessoes = [threading.Thread(target=lambda: resultados.append(vigia.esperar(notas, 0, 5))) for _ in range(3)]
+    for sessao in sessoes:
+        sessao.start()
+    while len(vigia._esperadas) < 1:
+        time.sleep(0.01)
+    vigia.verificar()
+    vigia.verificar()
+    for sessao in sessoes:
+        sessao.join()
+    # Três sessões esperando as mesmas notas: uma atualização por volta
+    assert notas.chamadas == 2
+    assert resultados == [True, True, True]
+
+def test_vigia_esperar_sem_mudanca_e_notas_esquecidas(monkeypatch):
+    vigia = incremental.Vigia(intervalo=0.01)
+    notas = NotasFalsas([True])
+    assert vigia.esperar(notas, notas.versao, 0.01) is False
+    # Ninguém mais esperou por VOLTAS_SEM_ESPERA voltas: as notas deixam de ser consultadas
+    time.sleep(vigia.VOLTAS_SEM_ESPERA * vigia.intervalo + 0.05)
+    assert vigia.verificar() == 0
+    assert notas.chamadas == 0
+
+def test_vigia_segue_com_notas_que_falham():
+    class Quebradas(NotasFalsas):
+        def atualizar(self):
+            raise OSError("planilha em gravação")
+    vigia = incremental.Vigia(intervalo=60)
+    vigia.esperar(Quebradas([]), 0, 0)
+    boas = NotasFalsas([True])
+    vigia.esperar(boas, 0, 0)
+    assert vigia.verificar() == 1
@@ -0,0 +1,38 @@
+"""Conversões do esquema compacto das notas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestao import concatenar_notas, intercalar_notas, ordenar_por_competencia, para_centavos, para_pontos_base
+
+
+def test_pontos_base():
+    pontos = para_pontos_base(pd.Series([0.18, 0.07, None, "x", 0.045]))
+    assert pontos.dtype == 'int32'
+    assert pontos.tolist() == [1800, 700, 0, 0, 450]
+
+def test_aliquota_em_percentual_nao_da_a_volta():
+    # 18 (percentual) no lugar de 0,18: no int16 virava -16608
+    assert para_pontos_base(pd.Series([18, 0.18])).tolist() == [180_000, 1_800]
+
+def test_aliquota_fora_do_int32():
+    with pytest.raises(ValueError, match="fora da faixa"):
+        para_pontos_base(pd.Series([0.18, 1e6]))
+
+def test_centavos():
+    assert para_centavos(pd.Series([1.005, "2,5", 10])).tolist() == [101, 0, 1_000]
+    # Meio centavo sobe (para longe do zero), sem o arredondamento para o par do round()
+    assert para_centavos(pd.Series([0.125, -1.005, 19.99, 0.1 + 0.2])).tolist() == [13, -101, 1_999, 30]
+
+@pytest.mark.parametrize("dias_novas", [(40, 60), (0, 59), (-5, 3)])
+def test_intercalar_igual_a_ordenar_tudo(dias_novas):
+    gerador = np.random.default_rng(sum(dias_novas) + 100)
+    def notas(n, dias):
+        datas = pd.Series(pd.Timestamp("2024-01-01") + pd.to_timedelta(gerador.integers(*dias, n), "D"))
+        datas[gerador.random(n) < 0.1] = pd.NaT
+        return pd.DataFrame({'Mês': datas, 'Valor ICMS': np.arange(n, dtype='int64'),
+                             'UF do Emitente': pd.Categorical(gerador.choice(["SP", "MG", "AC", "BA"], n))})
+    atual = ordenar_por_competencia(notas(2_000, (0, 50)))
+    novas = notas(300, dias_novas).assign(**{'Valor ICMS': lambda df: df['Valor ICMS'] + 10_000})
+    esperado = ordenar_por_competencia(concatenar_notas([atual, novas]))
+    pd.testing.assert_frame_equal(intercalar_notas(atual, novas), esperado)
@@ -0,0 +1,26 @@
+"""Ordenação do navegador de notas com colunas categóricas vindas de partes diferentes."""
+import numpy as np
+import pandas as pd
+
+from ingestao import concatenar_notas
+from navegador import ordenar_posicoes
+
+
+def parte(ufs):
+    return pd.DataFrame({'UF do Emitente': pd.Categorical(ufs), 'Valor Total': np.arange(len(ufs), dtype='int64')})
+
+def test_partes_com_categorias_diferentes_ordenam_pelo_texto():
+    notas = concatenar_notas([parte(["SP", "SP"]), parte(["AC", "MG"])])
+    assert list(notas['UF do Emitente'].cat.categories) == ["AC", "MG", "SP"]
+    posicoes = ordenar_posicoes(notas, np.arange(len(notas)), 'UF do Emitente')
+    assert list(notas['UF do Emitente'].iloc[posicoes]) == ["AC", "MG", "SP", "SP"]
+
+def test_categorias_fora_de_ordem_e_vazias():
+    notas = pd.DataFrame({'UF do Emitente': pd.Categorical(["SP", None, "AC", "MG"], categories=["SP", "AC", "MG"])})
+    posicoes = np.arange(len(notas))
+    crescente = notas['UF do Emitente'].iloc[ordenar_posicoes(notas, posicoes, 'UF do Emitente')]
+    assert list(crescente.astype(object).fillna("-")) == ["AC", "MG", "SP", "-"]
+    decrescente = notas['UF do Emitente'].iloc[ordenar_posicoes(notas, posicoes, 'UF do Emitente', crescente=False)]
+    assert list(decrescente.astype(object).fillna("-")) == ["SP", "MG", "AC", "-"]
+    vazia = pd.DataFrame({'UF do Emitente': pd.Categorical([None, None])})
+    assert list(ordenar_posicoes(vazia, np.arange(2), 'UF do Emitente')) == [0, 1]
@@ -0,0 +1,37 @@
+"""Montagem das notas a partir dos XMLs e escolha determinística entre notas repetidas."""
+from nfe import _montar_notas, ingerir_xml, ler_notas_nfe
+
+NS = "http://www.portalfiscal.inf.br/nfe"
+
+
+def xml_nota(chave, produto):
+    return (f'<nfeProc xmlns="{NS}"><NFe><infNFe Id="NFe{chave}">'
+            f'<ide><nNF>1</nNF><dhEmi>2025-02-10T10:00:00-03:00</dhEmi><tpNF>1</tpNF></ide>'
+            f'<emit><CNPJ>12345678000199</CNPJ><xNome>EMPRESA</xNome><enderEmit><UF>GO</UF></enderEmit><CRT>3</CRT></emit>'
+            f'<dest><CNPJ>98765432000111</CNPJ><xNome>CLIENTE</xNome><enderDest><UF>SP</UF></enderDest></dest>'
+            f'<det nItem="1"><prod><xProd>{produto}</xProd><NCM>68091100</NCM><CFOP>6102</CFOP>'
+            f'<vUnCom>100.00</vUnCom><vProd>100.00</vProd></prod>'
+            f'<imposto><ICMS><ICMS00><pICMS>12.00</pICMS><vICMS>12.00</vICMS></ICMS00></ICMS></imposto></det>'
+            f'</infNFe></NFe></nfeProc>')
+
+def test_notas_sem_nenhuma_emissao():
+    linhas = [{'Chave de Acesso': "1" * 44, 'tpNF': "1", 'Valor Total': "10.00"},
+              {'Chave de Acesso': "2" * 44, 'tpNF': "0", 'Valor Total': "20.00"}]
+    notas = _montar_notas(linhas, None)
+    assert len(notas) == 2
+    assert notas['Mês'].isna().all()
+
+def test_nota_repetida_fica_com_o_primeiro_arquivo(tmp_path):
+    origem = tmp_path / "xmls"
+    origem.mkdir()
+    # A mesma chave em vários arquivos, cada um num lote, processados em paralelo
+    for nome in ["e", "c", "a", "d", "b"]:
+        (origem / f"{nome}.xml").write_text(xml_nota("5" * 44, f"PRODUTO {nome}"), encoding="utf-8")
+    (origem / "f.xml").write_text(xml_nota("6" * 44, "OUTRO"), encoding="utf-8")
+
+    estatisticas = ingerir_xml([origem], tmp_path / "armazem", workers=2, tamanho_lote=1, progresso=None)
+    _, saidas = ler_notas_nfe(tmp_path / "armazem")
+    assert estatisticas['notas'] == 2 and estatisticas['duplicadas'] == 4
+    produtos = saidas.set_index(saidas['Chave de Acesso'].astype(str))['Produto'].astype(str)
+    assert produtos["5" * 44] == "PRODUTO a"
+    assert saidas['Mês'].notna().all()
@@ -0,0 +1,44 @@
+"""Pico de memória por etapa com várias execuções medindo ao mesmo tempo."""
+import tracemalloc
+
+import pytest
+
+from perfil import Perfil
+
+
+@pytest.fixture(autouse=True)
+def sem_rastreamento():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc ligado por fora")
+    yield
+    assert not tracemalloc.is_tracing()
+
+def test_outra_execucao_nao_apaga_o_pico():
+    a, b = Perfil(medir_memoria=True), Perfil(medir_memoria=True)
+    with a.etapa("a"):
+        bloco = bytearray(20_000_000)
+        del bloco
+        # A outra sessão abre uma etapa (e reinicia o pico) no meio da etapa de a
+        with b.etapa("b"):
+            pass
+    a.encerrar()
+    b.encerrar()
+    assert a.etapas[0]['pico_mb'] >= 20
+    assert b.etapas[0]['pico_mb'] < 20
+
+def test_rastreamento_fica_ligado_enquanto_alguem_mede():
+    a, b = Perfil(medir_memoria=True), Perfil(medir_memoria=True)
+    a.encerrar()
+    assert tracemalloc.is_tracing()
+    with b.etapa("b"):
+        pass
+    b.encerrar()
+    b.encerrar()  # idempotente
+    assert not tracemalloc.is_tracing()
+
+def test_execucao_sem_medir_nao_desliga_as_outras():
+    a = Perfil(medir_memoria=True)
+    Perfil(medir_memoria=False)
+    assert tracemalloc.is_tracing()
+    del a  # execução interrompida: a referência volta quando o Perfil é descartado
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,33 @@
+"""Apuração de PIS e COFINS a partir das notas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from piscofins import apurar_piscofins
+
+
+def notas(meses, totais, icms, regimes):
+    # Valores em centavos, como no esquema compacto
+    return pd.DataFrame({
+        'Mês': pd.to_datetime(meses),
+        'Valor Total': np.asarray(totais, dtype='int64'),
+        'Valor ICMS': np.asarray(icms, dtype='int64'),
+        'Regime': pd.Categorical(regimes),
+    })
+
+def test_regime_do_emitente_nao_muda_as_aliquotas():
+    entradas = notas(["2024-01-05", "2024-01-20"], [1_000_000, 1_000_000], [0, 0], ["Simples Nacional", "Normal"])
+    saidas = notas(["2024-01-10"], [5_000_000], [0], ["Normal"])
+    apuracao = apurar_piscofins(entradas, saidas)
+    # 1,65% e 7,6% sobre toda a base de entradas, qualquer que seja o regime de quem emitiu
+    assert apuracao['Crédito PIS'].item() == pytest.approx(330.0)
+    assert apuracao['Crédito COFINS'].item() == pytest.approx(1_520.0)
+    assert apuracao['Débito PIS'].item() == pytest.approx(825.0)
+
+def test_cumulativo_sem_credito_e_base_sem_icms():
+    entradas = notas(["2024-01-05"], [1_000_000], [180_000], ["Normal"])
+    saidas = notas(["2024-01-10", "2024-02-10"], [2_000_000, 1_000_000], [360_000, 0], ["Normal", "Normal"])
+    apuracao = apurar_piscofins(entradas, saidas, "Cumulativo")
+    assert (apuracao['Crédito'] == 0).all()
+    # 0,65% + 3% sobre 16.400,00 (total menos ICMS) e sobre 10.000,00
+    assert list(apuracao['Débito']) == pytest.approx([598.6, 365.0])
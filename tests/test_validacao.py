@@ -0,0 +1,59 @@
+"""Validação em lotes: número da linha na planilha, duplicadas entre lotes e notas do armazenamento."""
+import warnings
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from ingestao import gravar_partes, limpar_notas
+from validacao import Validacao, lotes_planilha, validar_armazem
+
+
+def planilha(caminho, linhas):
+    livro = openpyxl.Workbook()
+    aba = livro.active
+    aba.title = "Entradas"
+    aba.append(["Número NF", "Valor Total", "Valor ICMS", "Alíquota ICMS", "Mês"])
+    for linha in linhas:
+        aba.append(linha)
+    livro.save(caminho)
+    return caminho
+
+def test_linhas_vazias_nao_deslocam_a_numeracao(tmp_path):
+    boa = [1, 100.0, 12.0, 0.12, "01/2024"]
+    linhas = [boa, [None] * 5, [2, 100.0, 12.0, 0.12, "mês"], [None] * 5, [None] * 5, boa, [3, 100.0, 99.0, 0.12, "01/2024"]]
+    caminho = planilha(tmp_path / "notas.xlsx", linhas)
+    validacao = Validacao()
+    for lote, numeros in lotes_planilha(caminho, "Entradas", tamanho=2):
+        validacao.verificar(lote, "Entradas", numeros)
+    excecoes = validacao.excecoes().set_index('Regra')
+    # Cabeçalho na linha 1: as notas estão nas linhas 2, 4, 7 e 8 do Excel
+    assert excecoes.loc["Mês vazio ou inválido (nota fora da apuração)", 'Linha'] == 4
+    assert excecoes.loc["Nota duplicada", 'Linha'] == 7
+    assert excecoes.loc["ICMS diferente de base × alíquota", 'Linha'] == 8
+    assert validacao.linhas["Entradas"] == 4
+
+def test_duplicadas_entre_muitos_lotes():
+    gerador = np.random.default_rng(1)
+    notas = pd.DataFrame({'Número NF': gerador.integers(0, 3_000, 20_000), 'Valor Total': 10.0})
+    validacao = Validacao()
+    for inicio in range(0, len(notas), 700):
+        lote = notas.iloc[inicio:inicio + 700]
+        validacao.verificar(lote, "Saídas", np.arange(inicio, inicio + len(lote)))
+    duplicadas = validacao.excecoes().query("Regra == 'Nota duplicada'")['Linha']
+    assert list(duplicadas) == list(np.flatnonzero(notas.duplicated()))
+
+def test_armazem_sem_regras_de_valor_cru(tmp_path):
+    notas = limpar_notas(pd.DataFrame({
+        'Número NF': [1, 2, 3], 'Mês': ["01/2024", "01/2024", "02/2024"], 'UF do Emitente': ["GO", None, "XX"],
+        'Valor Total': [100.0, None, 100.0], 'Valor ICMS': [12.0, 0.0, 12.0], 'Alíquota ICMS': [0.12, 0.12, 0.12]}))
+    gravar_partes(tmp_path / "entradas", notas, 0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        validacao = validar_armazem(tmp_path, tamanho=1)
+    excecoes = validacao.excecoes()
+    # O valor vazio já virou zero na limpeza; a UF sem valor aparece como "vazio", não "nan"
+    assert not excecoes['Regra'].str.startswith("Valor").any()
+    uf = excecoes[excecoes['Regra'] == "UF fora da lista do IBGE"]
+    assert sorted(uf['Valor']) == ["XX", "vazio"]
+    assert sum(validacao.linhas.values()) == 3
@@ -0,0 +1,240 @@
+"""Validação das notas em lotes de tamanho fixo: valores convertidos à força, ICMS x base x alíquota, UFs e duplicadas.
+
+A limpeza (ingestao.limpar_notas) transforma valores inválidos em zero e datas inválidas em NaT sem
+avisar; aqui as mesmas linhas são lidas cruas, lote a lote, e cada problema vira uma exceção.
+
+Uso: python validacao.py notas_processadas1.xlsx --saida excecoes.csv
+     python validacao.py --armazem .cache_dados/nfe
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from ingestao import ABAS_NOTAS, converter_mes, hash_linhas, limpar_colunas, notas_para_exibicao, partes_gravadas
+
+TAMANHO_LOTE = 50_000
+LIMITE_EXCECOES = 200_000
+# |ICMS - base x alíquota| aceito: um centavo de arredondamento ou 0,1% do esperado
+TOLERANCIA_ICMS = 0.01
+TOLERANCIA_RELATIVA = 0.001
+ALIQUOTAS_VALIDAS = {0, 400, 700, 1200}  # pontos-base; de 1700 a 2000 também valem (alíquotas internas)
+UFS_IBGE = {
+    'RO', 'AC', 'AM', 'RR', 'PA', 'AP', 'TO', 'MA', 'PI', 'CE', 'RN', 'PB', 'PE', 'AL', 'SE', 'BA',
+    'MG', 'ES', 'RJ', 'SP', 'PR', 'SC', 'RS', 'MS', 'MT', 'GO', 'DF',
+}
+COLUNAS_VALORES = ['Valor Total', 'Valor ICMS', 'Alíquota ICMS']
+COLUNAS_UF = ['UF do Emitente', 'UF do Destinatário']
+COLUNAS_EXCECOES = ['Origem', 'Linha', 'Número NF', 'Regra', 'Coluna', 'Valor']
+
+
+def _vazio(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.isna()
+    return serie.isna() | serie.map(lambda valor: isinstance(valor, str) and not valor.strip())
+
+def _texto(serie):
+    # Valor como aparece na lista de exceções; faltante (NaN, None, categoria sem valor) vira "vazio"
+    return serie.astype(str).where(serie.notna(), "vazio")
+
+def _problemas(lote, crus=True):
+    """[(máscara, regra, coluna)] de um lote, todas as verificações vetorizadas.
+
+    Com `crus=False` (notas já limpas, como as do armazenamento) as regras de valores vazios ou não
+    numéricos ficam de fora: a limpeza já os trocou por zero.
+    """
+    problemas = []
+    numeros = {}
+    for col in COLUNAS_VALORES:
+        if col not in lote.columns:
+            continue
+        numeros[col] = pd.to_numeric(lote[col], errors='coerce')
+        if crus:
+            vazio = _vazio(lote[col])
+            problemas.append((vazio, "Valor vazio (virou 0)", col))
+            problemas.append((numeros[col].isna() & ~vazio, "Valor não numérico (virou 0)", col))
+
+    if 'Mês' in lote.columns:
+        # Mesma conversão da limpeza: o que vira NaT fica fora de todas as competências
+        problemas.append((converter_mes(lote['Mês']).isna(), "Mês vazio ou inválido (nota fora da apuração)", 'Mês'))
+
+    if 'Alíquota ICMS' in numeros:
+        pontos = (numeros['Alíquota ICMS'] * 10_000).round()
+        valida = pontos.isin(ALIQUOTAS_VALIDAS) | pontos.between(1700, 2000)
+        problemas.append((pontos.notna() & ~valida, "Alíquota fora de 0/4/7/12/17–20%", 'Alíquota ICMS'))
+        if 'Valor Total' in numeros and 'Valor ICMS' in numeros:
+            esperado = numeros['Valor Total'] * numeros['Alíquota ICMS']
+            tolerancia = np.maximum(TOLERANCIA_ICMS, TOLERANCIA_RELATIVA * esperado.abs())
+            # Comparação com NaN dá False: linhas com valor inválido já aparecem na regra acima
+            divergente = (numeros['Valor ICMS'] - esperado).abs() > tolerancia
+            problemas.append((divergente, "ICMS diferente de base × alíquota", 'Valor ICMS'))
+
+    for col in COLUNAS_UF:
+        if col in lote.columns:
+            uf = _texto(lote[col]).str.strip().str.upper()
+            problemas.append((~uf.isin(UFS_IBGE), "UF fora da lista do IBGE", col))
+    return problemas
+
+
+class _HashesVistos:
+    # Hashes já vistos em sequências ordenadas de tamanhos decrescentes (como um contador binário):
+    # cada hash passa por O(log n) intercalações e a busca é um searchsorted por sequência.
+    def __init__(self):
+        self._sequencias = []
+
+    def contem(self, hashes):
+        vistos = np.zeros(len(hashes), dtype=bool)
+        for sequencia in self._sequencias:
+            posicao = np.minimum(np.searchsorted(sequencia, hashes), len(sequencia) - 1)
+            vistos |= sequencia[posicao] == hashes
+        return vistos
+
+    def adicionar(self, hashes):
+        nova = np.unique(hashes)
+        while self._sequencias and len(self._sequencias[-1]) <= len(nova):
+            nova = np.union1d(self._sequencias.pop(), nova)
+        self._sequencias.append(nova)
+
+
+class Validacao:
+    # Acumula o resultado lote a lote: as contagens são completas, a lista de exceções para em
+    # limite_excecoes linhas e as duplicadas são achadas por hash (8 bytes por linha já vista).
+    def __init__(self, limite_excecoes=LIMITE_EXCECOES):
+        self.limite_excecoes = limite_excecoes
+        self.linhas = {}
+        self._contagens = {}
+        self._excecoes = []
+        self._guardadas = 0
+        self._vistos = {}
+
+    def verificar(self, lote, origem, linhas, grupo=None, crus=True):
+        """Verifica um lote; `linhas` traz o número (na origem) de cada linha do lote."""
+        grupo = grupo or origem
+        linhas = np.asarray(linhas)
+        lote = lote.reset_index(drop=True)
+        self.linhas[origem] = self.linhas.get(origem, 0) + len(lote)
+        problemas = _problemas(lote, crus)
+
+        # Duplicadas: iguais a uma linha de um lote anterior do mesmo grupo ou anterior no próprio lote
+        hashes = hash_linhas(lote)
+        vistos = self._vistos.setdefault(grupo, _HashesVistos())
+        duplicada = pd.Series(hashes).duplicated().to_numpy() | vistos.contem(hashes)
+        problemas.append((pd.Series(duplicada), "Nota duplicada", None))
+        vistos.adicionar(hashes)
+
+        for mascara, regra, coluna in problemas:
+            posicoes = np.flatnonzero(np.asarray(mascara, dtype=bool))
+            if not len(posicoes):
+                continue
+            chave = (origem, regra)
+            self._contagens[chave] = self._contagens.get(chave, 0) + len(posicoes)
+            posicoes = posicoes[:max(self.limite_excecoes - self._guardadas, 0)]
+            if not len(posicoes):
+                continue
+            self._guardadas += len(posicoes)
+            self._excecoes.append(pd.DataFrame({
+                'Origem': origem,
+                'Linha': linhas[posicoes],
+                'Número NF': lote['Número NF'].iloc[posicoes].to_numpy() if 'Número NF' in lote.columns else None,
+                'Regra': regra,
+                'Coluna': coluna,
+                'Valor': _texto(lote[coluna].iloc[posicoes]).to_numpy() if coluna else None,
+            }))
+        return self
+
+    def resumo(self):
+        linhas = [{'Origem': origem, 'Regra': regra, 'Ocorrências': n} for (origem, regra), n in self._contagens.items()]
+        return pd.DataFrame(linhas, columns=['Origem', 'Regra', 'Ocorrências'])
+
+    def excecoes(self):
+        if not self._excecoes:
+            return pd.DataFrame(columns=COLUNAS_EXCECOES)
+        return pd.concat(self._excecoes, ignore_index=True).sort_values(['Origem', 'Linha'], kind='stable', ignore_index=True)
+
+    @property
+    def ocorrencias(self):
+        return sum(self._contagens.values())
+
+    @property
+    def truncada(self):
+        return self.ocorrencias > self._guardadas
+
+
+# =========================
+# ORIGENS DOS LOTES
+# =========================
+def lotes_planilha(caminho, aba, skiprows=None, tamanho=TAMANHO_LOTE):
+    """(lote cru, linha da planilha de cada linha do lote), lendo a aba em streaming (openpyxl read_only)."""
+    import openpyxl
+    # data_only: valores calculados das fórmulas, como o pandas lê
+    livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        # Numeradas como no Excel: o read_only devolve também as linhas vazias, a partir da 1
+        linhas = enumerate(livro[aba].iter_rows(min_row=1, values_only=True), start=1)
+        for _ in range(skiprows or 0):
+            next(linhas, None)
+        _, cabecalho = next(linhas, (None, None))
+        if cabecalho is None:
+            return
+        # Mesmos nomes que o pandas dá às colunas sem título, para limpar_colunas descartá-las
+        cabecalho = [f"Unnamed: {i}" if nome is None else nome for i, nome in enumerate(cabecalho)]
+        bloco, numeros = [], []
+        for numero, linha in linhas:
+            if all(valor is None for valor in linha):
+                continue
+            bloco.append(linha)
+            numeros.append(numero)
+            if len(bloco) == tamanho:
+                yield limpar_colunas(pd.DataFrame.from_records(bloco, columns=cabecalho)), np.array(numeros)
+                bloco, numeros = [], []
+        if bloco:
+            yield limpar_colunas(pd.DataFrame.from_records(bloco, columns=cabecalho)), np.array(numeros)
+    finally:
+        livro.close()
+
+def lotes_armazem(pasta, direcao, tamanho=TAMANHO_LOTE):
+    """(lote, linha de cada nota na parte, parte) de uma direção do armazenamento, em reais e fração como na planilha."""
+    for arquivo in partes_gravadas(Path(pasta) / direcao):
+        primeira = 1
+        for lote in pq.ParquetFile(arquivo).iter_batches(batch_size=tamanho):
+            lote = notas_para_exibicao(lote.to_pandas())
+            yield lote, np.arange(primeira, primeira + len(lote)), str(arquivo.relative_to(pasta))
+            primeira += len(lote)
+
+def validar_planilha(caminho, tamanho=TAMANHO_LOTE, limite_excecoes=LIMITE_EXCECOES):
+    validacao = Validacao(limite_excecoes)
+    for aba, espec in ABAS_NOTAS.items():
+        for lote, linhas in lotes_planilha(caminho, aba, espec.get("skiprows"), tamanho):
+            validacao.verificar(lote, aba, linhas)
+    return validacao
+
+def validar_armazem(pasta, tamanho=TAMANHO_LOTE, limite_excecoes=LIMITE_EXCECOES):
+    # Notas já gravadas (XMLs) passaram pela limpeza: só valem as regras que não olham o valor cru
+    validacao = Validacao(limite_excecoes)
+    for direcao in ("entradas", "saidas"):
+        for lote, linhas, origem in lotes_armazem(pasta, direcao, tamanho):
+            validacao.verificar(lote, origem, linhas, grupo=direcao, crus=False)
+    return validacao
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida as notas e lista as exceções.")
+    parser.add_argument("planilha", nargs="?", help="planilha de notas (.xlsx)")
+    parser.add_argument("--armazem", help="armazenamento particionado (ex.: gerado por nfe.py)")
+    parser.add_argument("--saida", help="grava a lista de exceções neste CSV")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    args = parser.parse_args(argv)
+    if bool(args.planilha) == bool(args.armazem):
+        parser.error("informe a planilha ou --armazem")
+    validacao = validar_armazem(args.armazem, args.lote) if args.armazem else validar_planilha(args.planilha, args.lote)
+    print(f"{sum(validacao.linhas.values())} linhas verificadas, {validacao.ocorrencias} ocorrências")
+    print(validacao.resumo().to_string(index=False))
+    if args.saida:
+        validacao.excecoes().to_csv(args.saida, index=False, sep=";", decimal=",", encoding="utf-8-sig")
+        print(f"Exceções gravadas em {args.saida}" + (" (lista cortada no limite)" if validacao.truncada else ""))
+
+
+if __name__ == "__main__":
+    main()